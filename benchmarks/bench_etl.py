@@ -0,0 +1,315 @@
+# benchmarks/bench_etl.py
+"""
+Rendimiento del ETL por endpoint con payloads sintéticos (benchmarks.payloads), sin tocar
+la API real.
+
+Cada caso (endpoint × filas) corre en un proceso aparte, así su pico de memoria (ru_maxrss)
+no arrastra lo que dejaron los casos anteriores. El proceso:
+1. lee el endpoint en streaming desde benchmarks.stub_server (api_client.iter_records),
+2. transforma cada lote con su transform_* (con --transform-processes, en el pool de
+   etl_script.transform_pool, como en el pipeline),
+3. lo carga con load_data en un esquema temporal del PostgreSQL de `--dsn`, que se borra
+   al terminar (usar una base desechable; con --no-load se omite la carga).
+
+Se informa filas/s por etapa, registros rechazados y pico de memoria (del proceso del caso;
+con el pool no incluye a los procesos de transformación). Cada caso se agrega
+como una línea JSON a `--results` junto con el commit (`<sha>+dirty` si hay cambios sin
+commitear); con `--compare REF` se compara contra la última medición guardada del commit
+REF y el código de salida es 1 si alguna etapa empeora más que `--threshold`.
+
+Uso:
+    python -m benchmarks.bench_etl --rows 10000 100000
+    python -m benchmarks.bench_etl --endpoints listTicketsActivities --rows 1000000 --malformed 0.02
+    python -m benchmarks.bench_etl --dsn postgresql+psycopg2://postgres@localhost/bench --compare HEAD~1
+    python -m benchmarks.bench_etl --no-load --rows 10000000
+    python -m benchmarks.bench_etl --no-load --endpoints listTicketsActivities --rows 1000000 --transform-processes 4
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.payloads import iter_json
+
+REPO_ROOT = Path(__file__).parent.parent
+
+# Endpoint -> (función de etl_script.transformations, tabla destino)
+CASES = {
+    "listTicketStatus": ("transform_ticket_status", "ticket_status"),
+    "showTicketsByStatus": ("transform_tickets", "tickets"),
+    "showTicketsPerPeriod": ("transform_tickets_per_period", "tickets_per_period"),
+    "openedVersusClosedMonthly": ("transform_opened_closed_monthly", "opened_closed_monthly"),
+    "ticketsByOpeningTime": ("transform_tickets_by_hour", "tickets_by_hour"),
+    "activitiesHoursByDepartment": ("transform_activities_hours_by_department", "activities_hours_by_department"),
+    "monthlySatisfactionAverage": ("transform_monthly_satisfaction_average", "monthly_satisfaction_average"),
+    "listTicketsActivities": ("transform_ticket_activities", "ticket_activities"),
+    "activitiesHoursToCharge": ("transform_activities_hours_to_charge", "activities_hours_to_charge"),
+}
+
+STAGES = ("fetch", "transform", "load")
+
+def git_commit():
+    """
+    Commit actual (sha corto), con '+dirty' si hay cambios sin commitear en archivos versionados.
+    """
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}+dirty" if dirty else sha
+
+def resolve_commit(ref):
+    result = subprocess.run(["git", "rev-parse", "--short", ref], cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"❌ No se pudo resolver el commit '{ref}'.")
+    return result.stdout.strip()
+
+def worker(spec):
+    """
+    Ejecuta un caso (en su propio proceso) y devuelve el dict de resultados.
+    """
+    if not spec["verbose"]:
+        logging.disable(logging.CRITICAL)
+    from sqlalchemy import create_engine
+
+    from etl_script import transformations
+    from etl_script.api_client import close_session, iter_records
+    from etl_script.loader import load_data
+    from etl_script.metrics import peak_rss_bytes
+    from etl_script.transform_pool import map_batches, shutdown_pool
+
+    endpoint = spec["endpoint"]
+    transform_name, table_name = CASES[endpoint]
+    transform = getattr(transformations, transform_name)
+    engine = None
+    if spec["dsn"]:
+        engine = create_engine(spec["dsn"], connect_args={"options": f"-csearch_path={spec['schema']}"})
+    baseline = peak_rss_bytes()
+
+    seconds = dict.fromkeys(STAGES, 0.0)
+    counts = {"records": 0}
+    valid_rows = rejects = 0
+
+    def fetched():
+        batches = iter_records(endpoint, batch_size=spec["batch_size"] or spec["rows"] or 1)
+        while True:
+            started = time.perf_counter()
+            batch = next(batches, None)
+            seconds["fetch"] += time.perf_counter() - started
+            if batch is None:
+                return
+            counts["records"] += len(batch)
+            yield batch
+
+    frames = map_batches(transform, fetched(), spec["transform_processes"])
+    while True:
+        # map_batches lee los lotes que necesita: ese tiempo ya cuenta como fetch
+        fetch_before = seconds["fetch"]
+        started = time.perf_counter()
+        transformed = next(frames, None)
+        seconds["transform"] += time.perf_counter() - started - (seconds["fetch"] - fetch_before)
+        if transformed is None:
+            break
+        df = transformed.df
+        valid_rows += len(df)
+        rejects += 0 if transformed.rejects is None else len(transformed.rejects)
+
+        if engine is not None and not df.empty:
+            started = time.perf_counter()
+            load_data(df, table_name, engine, if_exists='append')
+            seconds["load"] += time.perf_counter() - started
+    close_session()
+    shutdown_pool()
+
+    peak = peak_rss_bytes()
+    return {
+        "endpoint": endpoint,
+        "rows": spec["rows"],
+        "malformed": spec["malformed"],
+        "batch_size": spec["batch_size"],
+        "transform_processes": spec["transform_processes"],
+        "records": counts["records"],
+        "valid_rows": valid_rows,
+        "rejects": rejects,
+        "fetch_seconds": round(seconds["fetch"], 4),
+        "transform_seconds": round(seconds["transform"], 4),
+        "load_seconds": round(seconds["load"], 4) if engine is not None else None,
+        "peak_rss_mb": round(peak / 1024 ** 2, 1) if peak else None,
+        "rss_delta_mb": round((peak - baseline) / 1024 ** 2, 1) if peak and baseline else None,
+    }
+
+def run_case(spec, base_url):
+    env = dict(os.environ, BASE_URL=base_url, API_KEY="benchmark", HTTP_RATE_LIMIT="0")
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_etl", "--worker", json.dumps(spec)],
+        cwd=REPO_ROOT, env=env, capture_output=not spec["verbose"], text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{spec['endpoint']} ({spec['rows']} filas) terminó con código {result.returncode}:\n"
+                           f"{(result.stderr or '')[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def rates(result):
+    """
+    Filas por segundo de cada etapa (la carga se mide sobre las filas válidas).
+    """
+    def rate(rows, seconds):
+        return rows / seconds if seconds else None
+    return {
+        "fetch": rate(result["records"], result["fetch_seconds"]),
+        "transform": rate(result["records"], result["transform_seconds"]),
+        "load": rate(result["valid_rows"], result["load_seconds"]),
+    }
+
+def _format_rate(value):
+    return f"{value:>12,.0f}" if value else f"{'-':>12}"
+
+def report(result):
+    stage_rates = rates(result)
+    peak = result["peak_rss_mb"]
+    print(
+        f"{result['endpoint']:<30}{result['rows']:>10,}" + ''.join(_format_rate(stage_rates[stage]) for stage in STAGES)
+        + f"{result['rejects']:>9,}{(f'{peak:,.0f}' if peak else '-'):>10}"
+    )
+
+def load_results(path):
+    if not path.exists():
+        return []
+    with path.open() as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(results, previous, threshold):
+    """
+    Compara contra la última medición de cada (endpoint, filas, procesos) en `previous`.
+    Devuelve la lista de regresiones (texto).
+    """
+    latest = {(old["endpoint"], old["rows"], old.get("transform_processes", 0)): old for old in previous}
+    regressions = []
+    print(f"\n{'comparación':<30}{'filas':>10}" + ''.join(f"{stage:>12}" for stage in STAGES) + f"{'memoria':>19}")
+    for result in results:
+        old = latest.get((result["endpoint"], result["rows"], result["transform_processes"]))
+        if old is None:
+            continue
+        new_rates, old_rates = rates(result), rates(old)
+        cells = []
+        for stage in STAGES:
+            if not new_rates[stage] or not old_rates[stage]:
+                cells.append(f"{'-':>12}")
+                continue
+            change = new_rates[stage] / old_rates[stage] - 1
+            cells.append(f"{change:>+12.0%}")
+            if change < -threshold:
+                regressions.append(f"{result['endpoint']} ({result['rows']:,} filas): {stage} {change:+.0%} filas/s")
+        memory = "-"
+        if result["peak_rss_mb"] and old["peak_rss_mb"]:
+            growth = result["peak_rss_mb"] / old["peak_rss_mb"] - 1
+            memory = f"{growth:+.0%}"
+            if growth > threshold:
+                regressions.append(f"{result['endpoint']} ({result['rows']:,} filas): memoria {growth:+.0%}")
+        print(f"{result['endpoint']:<30}{result['rows']:>10,}" + ''.join(cells) + f"{memory:>19}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--endpoints', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--rows', nargs='+', type=int, default=[10000, 100000],
+                        help="Tamaños de payload a medir (registros por endpoint)")
+    parser.add_argument('--malformed', type=float, default=0.01, help="Fracción de registros inválidos")
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="Registros por lote (0: todo el payload en un lote)")
+    parser.add_argument('--transform-processes', type=int, default=0,
+                        help="Procesos del pool de transformaciones (0: en el mismo proceso)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DSN'),
+                        help="PostgreSQL desechable (por defecto BENCH_DSN o la base del .env)")
+    parser.add_argument('--no-load', action='store_true', help="Medir solo lectura y transformación")
+    parser.add_argument('--results', type=Path, default=Path(__file__).parent / 'results.jsonl')
+    parser.add_argument('--no-save', action='store_true', help="No guardar los resultados")
+    parser.add_argument('--compare', metavar='REF', help="Commit contra el que comparar (p.ej. HEAD~1)")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Empeoramiento máximo tolerado al comparar (0.1 = 10%%)")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar los logs del ETL")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(json.loads(args.worker))))
+        return 0
+
+    from sqlalchemy import create_engine, text
+
+    from benchmarks.stub_server import start_stub_server
+
+    dsn = None
+    if not args.no_load:
+        if not args.dsn:
+            from etl_script.config import DATABASE_URI
+            args.dsn = DATABASE_URI
+        dsn = args.dsn
+    schema = f"etl_bench_{os.getpid()}"
+    engine = create_engine(dsn) if dsn else None
+    if engine is not None:
+        with engine.begin() as conn:
+            conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+
+    server, base_url = start_stub_server()
+    commit = git_commit()
+    results = []
+    print(f"Commit {commit}, {len(args.endpoints)} endpoints, {args.malformed:.1%} de registros inválidos, "
+          f"{args.transform_processes or 'sin'} procesos de transformación")
+    print(f"{'endpoint':<30}{'filas':>10}{'fetch/s':>12}{'transform/s':>12}{'load/s':>12}{'rechazos':>9}{'pico MB':>10}")
+    try:
+        for rows in args.rows:
+            for endpoint in args.endpoints:
+                server.state.payloads[endpoint] = (
+                    lambda endpoint=endpoint, rows=rows: iter_json(endpoint, rows, args.malformed, args.seed)
+                )
+                spec = {"endpoint": endpoint, "rows": rows, "malformed": args.malformed, "batch_size": args.batch_size,
+                        "transform_processes": args.transform_processes, "dsn": dsn, "schema": schema,
+                        "verbose": args.verbose}
+                result = run_case(spec, base_url)
+                result.update(commit=commit, recorded_at=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                              python=platform.python_version())
+                results.append(result)
+                report(result)
+    finally:
+        server.shutdown()
+        if engine is not None:
+            with engine.begin() as conn:
+                conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+            engine.dispose()
+
+    # Las mediciones anteriores se leen antes de agregar las de esta ejecución
+    stored = load_results(args.results)
+    if not args.no_save:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with args.results.open('a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+        print(f"Resultados agregados a {args.results}")
+
+    if args.compare:
+        reference = resolve_commit(args.compare)
+        previous = [old for old in stored if old["commit"].split('+')[0] == reference]
+        if not previous:
+            print(f"⚠️ No hay resultados guardados del commit {reference}.")
+            return 0
+        regressions = compare(results, previous, args.threshold)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print("✅ Sin regresiones respecto de", reference)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/bench_http_pool.py
+"""
+Mide conexiones TCP abiertas y tiempo total al pedir los endpoints de la API
+contra un servidor local (benchmarks.stub_server), comparando requests.get sin
+sesión con la sesión compartida de api_client.fetch_many.
+
+Uso:
+    python -m benchmarks.bench_http_pool --rounds 20 --pool-size 4
+"""
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=100)
+    args = parser.parse_args()
+
+    payload = [{"status": str(i), "description": "Abierto", "action": "open"} for i in range(args.rows)]
+    server, base_url = start_stub_server(default_payload=payload)
+
+    # La configuración se lee en el primer acceso: apuntarla al servidor local antes de usarla
+    os.environ['BASE_URL'] = base_url
+    os.environ.setdefault('API_KEY', 'benchmark')
+    os.environ['HTTP_POOL_SIZE'] = str(args.pool_size)
+    import requests
+    from etl_script import api_client, config
+    config.reset_settings()
+
+    total = args.rounds * len(api_client.ENDPOINTS)
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for endpoint in api_client.ENDPOINTS:
+            requests.get(f"{config.BASE_URL}{config.API_KEY}/{endpoint}", headers=config.HEADERS, timeout=60).json()
+    elapsed = time.perf_counter() - started
+    print(f"requests.get sin sesión: {total} solicitudes, {server.state.connections} conexiones, {elapsed:.2f} s")
+
+    server.state.connections = 0
+    server.state.max_active_connections = 0
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        api_client.fetch_many(api_client.ENDPOINTS)
+    elapsed = time.perf_counter() - started
+    print(
+        f"fetch_many (pool={args.pool_size}): {total} solicitudes, {server.state.connections} conexiones "
+        f"(máx. simultáneas {server.state.max_active_connections}), {elapsed:.2f} s"
+    )
+
+    api_client.close_session()
+    server.shutdown()
+    if server.state.connections > args.pool_size:
+        print("❌ Se abrieron más conexiones que el tamaño del pool.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_resilience.py
+"""
+Mide el comportamiento de api_client.make_request frente a una API que limita el ritmo
+(429 + Retry-After) o que tiene un endpoint caído (503), usando benchmarks.stub_server.
+
+Escenarios (cada uno con y sin la protección correspondiente):
+- throttle: el servidor acepta `--server-rate` solicitudes por segundo; se compara el
+  cliente sin límite propio (solo respeta Retry-After) con el token bucket a `--client-rate`.
+- outage: un endpoint responde 503 todo el tiempo; se compara el circuit breaker con un
+  umbral inalcanzable (cada llamada agota sus reintentos contra el endpoint caído).
+- recovery: el endpoint cae `--outage-seconds` y vuelve; el circuito debe cerrarse solo.
+
+Uso:
+    python -m benchmarks.bench_resilience
+    python -m benchmarks.bench_resilience --rounds 10 --server-rate 8 --client-rate 7
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+ENDPOINTS = [
+    "listTicketStatus",
+    "openedVersusClosedMonthly",
+    "ticketsByOpeningTime",
+    "activitiesHoursByDepartment",
+    "monthlySatisfactionAverage",
+    "listTicketsActivities",
+    "activitiesHoursToCharge",
+    "showTicketsPerPeriod",
+    "showTicketsByStatus",
+]
+DOWN_ENDPOINT = "activitiesHoursToCharge"
+
+def configure(**overrides):
+    """
+    Aplica variables de entorno y descarta la configuración, el limitador y los circuitos previos.
+    """
+    from etl_script import config, resilience
+    from etl_script.api_client import close_session
+
+    os.environ.update({name: str(value) for name, value in overrides.items()})
+    config.reset_settings()
+    resilience.reset()
+    close_session()
+
+def run_rounds(server, rounds, pause=0.0):
+    from etl_script.api_client import fetch_many
+
+    state = server.state
+    with state.lock:
+        state.requests = state.throttled = state.failed = 0
+        state.endpoint_requests.clear()
+    failed_calls = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = fetch_many(ENDPOINTS)
+        failed_calls += sum(1 for result in results if not result)
+        time.sleep(pause)
+    return {
+        "seconds": time.perf_counter() - start,
+        "requests": state.requests,
+        "429": state.throttled,
+        "503": state.failed,
+        "failed_calls": failed_calls,
+        "down_endpoint_requests": state.endpoint_requests[DOWN_ENDPOINT],
+    }
+
+def report(label, result):
+    print(
+        f"{label:<34}{result['seconds']:>8.2f}s{result['requests']:>10}{result['429']:>7}"
+        f"{result['503']:>7}{result['down_endpoint_requests']:>8}{result['failed_calls']:>9}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=6)
+    parser.add_argument('--server-rate', type=int, default=8, help="Solicitudes por segundo que acepta el servidor")
+    parser.add_argument('--client-rate', type=float, default=7.0, help="HTTP_RATE_LIMIT del cliente en el escenario con límite")
+    parser.add_argument('--outage-seconds', type=float, default=3.0)
+    parser.add_argument('--verbose', action='store_true', help="Mostrar los logs del cliente")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    server, base_url = start_stub_server(default_payload=[{"id": 1, "value": "x"}])
+    state = server.state
+
+    # Esperas cortas entre reintentos para que el benchmark no tarde minutos
+    os.environ.update(BASE_URL=base_url, HTTP_RETRY_WAIT_MIN='0.05', HTTP_RETRY_WAIT_MAX='0.2', RETRY_AFTER_MAX='5')
+    os.environ.setdefault('API_KEY', 'benchmark')
+    # Sin caché de respuestas: todas las solicitudes llegan al servidor
+    os.environ['CACHE_TTLS'] = ''
+
+    print(f"{'escenario':<34}{'tiempo':>9}{'solicit.':>10}{'429':>7}{'503':>7}{'caído':>8}{'fallidas':>9}")
+
+    state.rate_limit = args.server_rate
+    configure(HTTP_RATE_LIMIT=0, CIRCUIT_FAILURE_THRESHOLD=5)
+    report("throttle, sin límite del cliente", run_rounds(server, args.rounds))
+    time.sleep(1)
+    configure(HTTP_RATE_LIMIT=args.client_rate, HTTP_RATE_BURST=max(int(args.client_rate), 1))
+    report(f"throttle, token bucket {args.client_rate:g}/s", run_rounds(server, args.rounds))
+    state.rate_limit = None
+
+    state.set_outage(DOWN_ENDPOINT)
+    configure(HTTP_RATE_LIMIT=0, CIRCUIT_FAILURE_THRESHOLD=1000000)
+    report("outage, sin circuit breaker", run_rounds(server, args.rounds))
+    configure(CIRCUIT_FAILURE_THRESHOLD=5, CIRCUIT_RESET_SECONDS=60)
+    report("outage, circuit breaker", run_rounds(server, args.rounds))
+    state.clear_outage(DOWN_ENDPOINT)
+
+    state.set_outage(DOWN_ENDPOINT, args.outage_seconds)
+    configure(CIRCUIT_FAILURE_THRESHOLD=5, CIRCUIT_RESET_SECONDS=1)
+    recovery = run_rounds(server, args.rounds, pause=args.outage_seconds / max(args.rounds - 1, 1))
+    report(f"recovery tras {args.outage_seconds:g}s de caída", recovery)
+
+    from etl_script.resilience import circuit_breaker
+    print(f"Estado final del circuito de {DOWN_ENDPOINT}: {circuit_breaker(DOWN_ENDPOINT).state}")
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# benchmarks/bench_startup.py
+"""
+Control de regresión del arranque en frío: ejecuta los puntos de entrada livianos con
+`python -X importtime` y falla (código 1) si el tiempo de imports supera el presupuesto o
+si se importa alguna librería pesada (pandas, SQLAlchemy, requests...) que solo hace
+falta al ejecutar jobs.
+
+Las credenciales de la API y la base se quitan del entorno: --help y --list no deben
+necesitarlas.
+
+Uso:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 40 --repeat 5
+
+El tiempo de imports no incluye lo que carga un `python -c pass` (site, .pth del entorno).
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "main --help": ["-m", "etl_script.main", "--help"],
+    "main --list": ["-m", "etl_script.main", "--list"],
+    "daemon --help": ["-m", "etl_script.daemon", "--help"],
+}
+
+# Librerías que solo deben cargarse al ejecutar un job
+HEAVY_MODULES = ("pandas", "numpy", "sqlalchemy", "psycopg2", "requests", "tenacity", "ijson", "dotenv")
+
+# Máximo de ms de imports por comando
+BUDGET_MS = 75.0
+
+SECRET_VARIABLES = ("API_KEY", "BASE_URL", "DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT", "DB_NAME")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def parse_importtime(stderr, baseline=()):
+    """
+    Devuelve (µs acumulados de los imports de primer nivel, conjunto de módulos importados).
+    Los módulos de `baseline` (los que el intérprete carga siempre, p.ej. site) no suman.
+    """
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules.add(name)
+        if len(indent) == 1 and name not in baseline:
+            total += int(cumulative)
+    return total, modules
+
+def measure(args, env, baseline=()):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True, text=True, env=env,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} terminó con código {result.returncode}:\n{result.stderr[-2000:]}")
+    import_us, modules = parse_importtime(result.stderr, baseline)
+    return import_us / 1000, wall * 1000, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                        help="Máximo de ms de imports (mediana) por comando")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    env = {name: value for name, value in os.environ.items() if name not in SECRET_VARIABLES}
+    # Lo que importa el intérprete vacío (site, .pth del entorno...) no cuenta para el presupuesto
+    baseline = measure(["-c", "pass"], env)[2]
+    failures = []
+    print(f"{'comando':<16}{'imports ms':>12}{'total ms':>10}  librerías pesadas")
+    for label, command in COMMANDS.items():
+        runs = [measure(command, env, baseline) for _ in range(args.repeat)]
+        import_ms = statistics.median(run[0] for run in runs)
+        wall_ms = statistics.median(run[1] for run in runs)
+        heavy = sorted(name for name in runs[0][2] if name.split('.')[0] in HEAVY_MODULES and '.' not in name)
+        print(f"{label:<16}{import_ms:>12.1f}{wall_ms:>10.1f}  {', '.join(heavy) or '-'}")
+        if import_ms > args.budget_ms:
+            failures.append(f"{label}: {import_ms:.1f} ms de imports (presupuesto {args.budget_ms:.0f} ms)")
+        if heavy:
+            failures.append(f"{label}: importa {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Arranque dentro del presupuesto.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# benchmarks/bench_time_parsing.py
+"""
+Micro-benchmark del parseo de horas HH:MM: implementación anterior fila a fila
+(.apply con pd.to_datetime por celda) frente a parse_duration_minutes / parse_time_of_day.
+
+Uso:
+    python -m benchmarks.bench_time_parsing --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl_script.transformations import parse_duration_minutes, parse_time_of_day
+
+def build_payload(rows, seed=0):
+    """
+    Columna HH:MM sintética con horas acumuladas (>= 24), nulos y basura.
+    """
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, 40, rows)
+    minutes = rng.integers(0, 60, rows)
+    values = np.char.add(np.char.add(np.char.zfill(hours.astype(str), 2), ':'), np.char.zfill(minutes.astype(str), 2))
+    values = values.astype(object)
+    values[rng.random(rows) < 0.05] = None
+    values[rng.random(rows) < 0.01] = 'sin dato'
+    return pd.Series(values)
+
+def legacy_parse(series):
+    """
+    Lo que hacía transform_ticket_activities antes: un pd.to_datetime por celda.
+    """
+    def parse_time(time_str):
+        try:
+            return pd.to_datetime(time_str, format='%H:%M').time()
+        except:
+            return None
+    parsed = series.apply(parse_time)
+    return parsed, parsed.apply(lambda t: t.hour * 60 + t.minute if t else None)
+
+def vectorized_parse(series):
+    return parse_time_of_day(series), parse_duration_minutes(series)
+
+def timed(fn, series):
+    started = time.perf_counter()
+    fn(series)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--legacy-rows', type=int, default=None,
+                        help="Filas para la versión anterior (por defecto, las mismas); se extrapola a --rows")
+    args = parser.parse_args()
+
+    series = build_payload(args.rows)
+    legacy_rows = args.legacy_rows or args.rows
+
+    legacy = timed(legacy_parse, series.head(legacy_rows)) * args.rows / legacy_rows
+    vectorized = timed(vectorized_parse, series)
+    print(f"Filas: {args.rows}")
+    print(f"fila a fila : {legacy:8.2f} s" + (" (extrapolado)" if legacy_rows != args.rows else ""))
+    print(f"vectorizado : {vectorized:8.2f} s")
+    print(f"speedup     : {legacy / vectorized:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# benchmarks/payloads.py
+"""
+Generador de payloads sintéticos con la forma de cada endpoint de la API de Milldesk
+(los de api_client.ENDPOINTS), para benchmarks sin tocar la API real.
+
+Los valores imitan los de producción: fechas dd/mm/yyyy, horas HH:MM (incluidas duraciones
+de más de 24 h y valores vacíos), estados, agentes y contratos con pocos valores distintos
+y textos libres. Una fracción `malformed` de los registros se rompe según el esquema del
+endpoint (etl_script.schemas): falta una clave, un campo obligatorio viene null, un número
+o una fecha no se pueden parsear, o el elemento ni siquiera es un objeto.
+
+Todo se genera de forma perezosa: records() e iter_json() no arman la lista completa, así
+que se pueden pedir millones de filas con memoria constante. Con la misma semilla se
+obtienen siempre los mismos registros.
+
+Uso:
+    from benchmarks.payloads import records, iter_json
+    for record in records("listTicketsActivities", 100000, malformed=0.01): ...
+    server, base_url = start_stub_server({"listTicketsActivities": lambda: iter_json("listTicketsActivities", 10**6)})
+"""
+import json
+import random
+from datetime import date, timedelta
+
+from etl_script.schemas import SCHEMAS
+
+_DAYS = [date(2018, 1, 1) + timedelta(days=offset) for offset in range(365 * 8)]
+_DATES = [day.strftime('%d/%m/%Y') for day in _DAYS]
+_HOURS = [f"{hour:02d}:{minute:02d}" for hour in range(24) for minute in (0, 15, 30, 45)]
+_DURATIONS = _HOURS + ["25:30", "48:00", "100:15", "", None]
+_STATUSES = ["Abierto", "En progreso", "En espera", "Resuelto", "Cerrado", "Anulado"]
+_PEOPLE = ["Marco Fernandez", "Ana Rojas", "Luis Soto", "Camila Díaz", "Pedro Muñoz", "Josefa Vera",
+           "Diego Pino", "Valentina Ruiz", "Tomás Reyes", "Fernanda Soto"]
+_ACTIVITIES = ["Notebook", "Servidor", "Impresora", "Red", "Correo", "Licencias", "Respaldo", "VPN"]
+_TYPES = ["Presencial", "Remoto", "Telefónica"]
+_CONTRACTS = [f"Contrato {code}" for code in "ABCDEFGHIJ"]
+_LOCATIONS = ["Santiago", "Valparaíso", "Concepción", "Temuco", "Antofagasta"]
+_DEPARTMENTS = ["TI", "Finanzas", "Operaciones", "RRHH", "Comercial", "Legal"]
+_WORDS = ["se", "configura", "revisa", "equipo", "usuario", "según", "indicaciones", "acceso",
+          "instalación", "falla", "cliente", "respaldo", "red", "correo", "cambio"]
+
+def _text(rng, words=8):
+    return ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(2, words))).capitalize()
+
+def _timestamp(rng):
+    return f"{rng.choice(_DATES)} {rng.choice(_HOURS)}"
+
+def _ticket(rng, index):
+    start = rng.randrange(len(_DAYS) - 30)
+    closed = rng.random() < 0.7
+    return {
+        "id": str(index + 1),
+        "ticket": f"Ticket {index + 1}: {_text(rng, 5)}",
+        "requester": rng.choice(_PEOPLE),
+        "status": rng.choice(_STATUSES),
+        "start": _DATES[start],
+        "end": _DATES[start + rng.randint(0, 29)] if closed else None,
+        "charge_hour": f"{rng.randint(0, 40) / 2:g}",
+        "worked_hour": f"{rng.randint(0, 40) / 2:g}",
+        "analysis": _DATES[start + rng.randint(0, 5)] if rng.random() < 0.5 else None,
+        "reopening": _DATES[start + rng.randint(1, 29)] if rng.random() < 0.05 else None,
+        "starttime": f"{_DATES[start]} {rng.choice(_HOURS)}",
+        "endtime": _timestamp(rng) if closed else None,
+        "analysistime": _timestamp(rng) if rng.random() < 0.5 else None,
+        "slasexpirationdate": rng.choice(["SLA expirado", None, _timestamp(rng), _timestamp(rng)]),
+    }
+
+def _ticket_status(rng, index):
+    status = _STATUSES[index % len(_STATUSES)]
+    return {"status": status if index < len(_STATUSES) else f"{status} {index}",
+            "description": _text(rng, 4), "action": rng.choice(["open", "close", "wait"])}
+
+def _opened_closed(rng, index):
+    return {"month": index % 12 + 1, "year": 2000 + index // 12,
+            "opened": rng.randint(0, 500), "closed": rng.randint(0, 500)}
+
+def _by_hour(rng, index):
+    return {"hour": index % 24, "amount": rng.randint(0, 300), "percentage": f"{rng.random() * 10:.2f}"}
+
+def _by_department(rng, index):
+    department = _DEPARTMENTS[index % len(_DEPARTMENTS)]
+    return {"department": department if index < len(_DEPARTMENTS) else f"{department} {index}",
+            "worked_hour": rng.choice(_DURATIONS), "charge_hour": rng.choice(_DURATIONS)}
+
+def _satisfaction(rng, index):
+    month, year = index % 12 + 1, 2000 + index // 12
+    return {"month": month, "year": year, "month_year": f"{month:02d}-{year}",
+            "evaluation": f"{rng.uniform(1, 5):.2f}"}
+
+def _activity(rng, index):
+    start = rng.randrange(len(_DAYS) - 3)
+    return {
+        "activity": rng.choice(_ACTIVITIES),
+        "description": _text(rng),
+        "id": str(index + 1),
+        "ticket": _text(rng, 4),
+        "agent": rng.choice(_PEOPLE),
+        "typeofactivity": rng.choice(_TYPES),
+        "start": _DATES[start],
+        "end": _DATES[start + rng.randint(0, 2)],
+        "charge_hour": rng.choice(_DURATIONS),
+        "worked_hour": rng.choice(_DURATIONS),
+        "parts": rng.choice([None, None, None, "Disco SSD", "Cable de red"]),
+        "id_ticket": str(rng.randint(1, max(index // 3, 1))),
+    }
+
+def _hours_to_charge(rng, index):
+    start = rng.randrange(len(_DAYS) - 3)
+    return {
+        "id_ticket": str(rng.randint(1, max(index // 3, 1))),
+        "location_id": str(rng.randrange(len(_LOCATIONS))),
+        "ticket": _text(rng, 4),
+        "activity": rng.choice(_ACTIVITIES),
+        "description": _text(rng),
+        "start": _DATES[start],
+        "end": _DATES[start + rng.randint(0, 2)],
+        "parts": rng.choice([None, None, "Disco SSD"]),
+        "start_time": rng.choice(_HOURS),
+        "end_time": rng.choice(_HOURS),
+        "contract": rng.choice(_CONTRACTS),
+        "agent": rng.choice(_PEOPLE),
+        "location": rng.choice(_LOCATIONS),
+        "typeofactivity": rng.choice(_TYPES),
+        "requester": rng.choice(_PEOPLE),
+        "cost": f"{rng.uniform(0, 200000):.2f}",
+        "charge_hour": rng.choice(_DURATIONS),
+    }
+
+GENERATORS = {
+    "listTicketStatus": _ticket_status,
+    "showTicketsByStatus": _ticket,
+    "showTicketsPerPeriod": _ticket,
+    "openedVersusClosedMonthly": _opened_closed,
+    "ticketsByOpeningTime": _by_hour,
+    "activitiesHoursByDepartment": _by_department,
+    "monthlySatisfactionAverage": _satisfaction,
+    "listTicketsActivities": _activity,
+    "activitiesHoursToCharge": _hours_to_charge,
+}
+
+def malform(rng, record, endpoint):
+    """
+    Rompe el registro de una forma que la validación del esquema del endpoint debe rechazar.
+    """
+    schema = SCHEMAS[endpoint]
+    breakages = ['not_object']
+    if schema.get('keys'):
+        breakages.append('missing_key')
+    if schema.get('not_null'):
+        breakages.append('null_required')
+    if schema.get('types'):
+        breakages.append('bad_number')
+    if schema.get('formats'):
+        breakages.append('bad_date')
+    breakage = rng.choice(breakages)
+    if breakage == 'not_object':
+        return rng.choice(["basura", 42, None, ["lista"]])
+    record = dict(record)
+    if breakage == 'missing_key':
+        del record[rng.choice(schema['keys'])]
+    elif breakage == 'null_required':
+        record[rng.choice(schema['not_null'])] = None
+    elif breakage == 'bad_number':
+        record[rng.choice(sorted(schema['types']))] = rng.choice(["abc", "12,5", "N/A"])
+    else:
+        record[rng.choice(sorted(schema['formats']))] = rng.choice(["2024-13-45", "31/02/2024", "ayer"])
+    return record
+
+def records(endpoint, rows, malformed=0.0, seed=0):
+    """
+    Genera `rows` registros del endpoint (una fracción `malformed` inválidos).
+    """
+    rng = random.Random(f"{endpoint}:{seed}")
+    generate = GENERATORS[endpoint]
+    for index in range(rows):
+        record = generate(rng, index)
+        if malformed and rng.random() < malformed:
+            record = malform(rng, record, endpoint)
+        yield record
+
+def batches(endpoint, rows, batch_size=5000, malformed=0.0, seed=0):
+    """
+    Los mismos registros que records(), en listas de a lo sumo `batch_size`.
+    """
+    batch = []
+    for record in records(endpoint, rows, malformed, seed):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_json(endpoint, rows, malformed=0.0, seed=0, records_per_chunk=1000):
+    """
+    El arreglo JSON de records() serializado por partes (bytes), para servirlo en streaming.
+    """
+    yield b'['
+    separator = b''
+    for batch in batches(endpoint, rows, records_per_chunk, malformed, seed):
+        yield separator + ','.join(json.dumps(record, ensure_ascii=False) for record in batch).encode('utf-8')
+        separator = b','
+    yield b']'
@@ -0,0 +1,154 @@
+# benchmarks/stub_server.py
+"""
+Servidor HTTP local que imita la API de Milldesk para benchmarks.
+
+Responde JSON en /<API_KEY>/<endpoint> con keep-alive (HTTP/1.1) y lleva la cuenta
+de conexiones TCP abiertas, solicitudes atendidas y conexiones simultáneas máximas.
+Envía un ETag por respuesta y contesta 304 a un If-None-Match que coincida.
+
+Un payload puede ser también una función sin argumentos que devuelve partes del body
+en bytes (p.ej. benchmarks.payloads.iter_json): se envía con Transfer-Encoding: chunked,
+sin ETag, y así se pueden servir millones de registros sin armarlos en memoria.
+
+Para probar la resiliencia del cliente puede simular:
+- throttling: con `rate_limit` (solicitudes por segundo) el exceso recibe 429 con Retry-After;
+- caídas: `set_outage(endpoint, seconds)` hace que el endpoint responda 503 (sin Retry-After)
+  durante `seconds` segundos, o indefinidamente si es None.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubState:
+    def __init__(self, payloads=None, default_payload=None):
+        self.payloads = payloads or {}
+        self.default_payload = default_payload if default_payload is not None else []
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.active_connections = 0
+        self.max_active_connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.throttled = 0
+        self.failed = 0
+        self.endpoint_requests = Counter()
+        self.rate_limit = None
+        self.retry_after = 1
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.outages = {}
+
+    def set_outage(self, endpoint, seconds=None):
+        """
+        El endpoint responde 503 durante `seconds` segundos (None: hasta clear_outage).
+        """
+        with self.lock:
+            self.outages[endpoint] = None if seconds is None else time.monotonic() + seconds
+
+    def clear_outage(self, endpoint):
+        with self.lock:
+            self.outages.pop(endpoint, None)
+
+    def simulated_status(self, endpoint):
+        """
+        Estado forzado para esta solicitud (503 o 429) o None. Debe llamarse con el lock tomado.
+        """
+        now = time.monotonic()
+        if endpoint in self.outages:
+            deadline = self.outages[endpoint]
+            if deadline is None or now < deadline:
+                self.failed += 1
+                return 503
+            del self.outages[endpoint]
+        if self.rate_limit:
+            if now - self.window_start >= 1:
+                self.window_start, self.window_requests = now, 0
+            self.window_requests += 1
+            if self.window_requests > self.rate_limit:
+                self.throttled += 1
+                return 429
+        return None
+
+    def payload_for(self, endpoint):
+        return self.payloads.get(endpoint, self.default_payload)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        state = self.server.state
+        with state.lock:
+            state.connections += 1
+            state.active_connections += 1
+            state.max_active_connections = max(state.max_active_connections, state.active_connections)
+
+    def finish(self):
+        super().finish()
+        state = self.server.state
+        with state.lock:
+            state.active_connections -= 1
+
+    def do_GET(self):
+        state = self.server.state
+        endpoint = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+        with state.lock:
+            state.requests += 1
+            state.endpoint_requests[endpoint] += 1
+            simulated = state.simulated_status(endpoint)
+        if simulated is not None:
+            self.send_response(simulated)
+            if simulated == 429:
+                self.send_header('Retry-After', str(state.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        payload = state.payload_for(endpoint)
+        if callable(payload):
+            self.send_chunked(payload())
+            return
+        body = json.dumps(payload).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            with state.lock:
+                state.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunked(self, parts):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for part in parts:
+            if part:
+                self.wfile.write(f"{len(part):x}\r\n".encode('ascii') + part + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(payloads=None, default_payload=None, host='127.0.0.1', port=0):
+    """
+    Inicia el servidor en un hilo y devuelve (server, base_url).
+    `base_url` tiene el formato que espera BASE_URL (termina en '/').
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(payloads, default_payload)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/"
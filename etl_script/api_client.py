@@ -1,49 +1,266 @@
 # etl_script/api_client.py
+import contextvars
+import json
 import requests
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_exponential,
-    retry_if_exception_type
+    retry_if_exception
 )
 from requests.exceptions import RequestException, HTTPError, Timeout, ConnectionError
 
-from etl_script.config import API_KEY, BASE_URL, HEADERS
+try:
+    import ijson
+except ImportError:  # dependencia opcional: sin ijson, iter_records lee el body completo
+    ijson = None
+
+from etl_script import config, metrics, response_cache
+from etl_script.metrics import instrument
+from etl_script.resilience import (
+    CircuitOpenError, ThrottledError, circuit_breaker, parse_retry_after, rate_limiter
+)
+from etl_script.response_cache import UNCHANGED
 
 logger = logging.getLogger(__name__)
 
+# Endpoints de la API de Milldesk usados por el ETL
+ENDPOINTS = [
+    "listTicketStatus",
+    "showTicketsByStatus",
+    "showTicketsPerPeriod",
+    "openedVersusClosedMonthly",
+    "ticketsByOpeningTime",
+    "activitiesHoursByDepartment",
+    "monthlySatisfactionAverage",
+    "listTicketsActivities",
+    "activitiesHoursToCharge",
+]
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Devuelve la sesión HTTP compartida por todo el proceso.
+    Reutiliza conexiones keep-alive (un solo handshake TCP+TLS por conexión) y nunca
+    abre más de HTTP_POOL_SIZE conexiones: si el pool está lleno, la solicitud espera.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(config.HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE, pool_block=True)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def close_session():
+    """
+    Cierra la sesión compartida y sus conexiones.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def _record_retry(retry_state):
+    metrics.add_retry()
+
+def _is_retryable(exception):
+    """
+    Se reintentan los errores de red, los 5xx y los 429; no los 4xx ni un circuito abierto.
+    """
+    if isinstance(exception, CircuitOpenError):
+        return False
+    if isinstance(exception, HTTPError) and not isinstance(exception, ThrottledError):
+        return exception.response is None or exception.response.status_code >= 500
+    return isinstance(exception, RequestException)
+
+def _wait(retry_state):
+    if isinstance(retry_state.outcome.exception(), ThrottledError):
+        # El limitador ya quedó pausado hasta que venza el Retry-After
+        return 0
+    backoff = wait_exponential(multiplier=1, min=config.HTTP_RETRY_WAIT_MIN, max=config.HTTP_RETRY_WAIT_MAX)
+    return backoff(retry_state)
+
 @retry(
-    retry=retry_if_exception_type((RequestException, HTTPError, Timeout, ConnectionError)),
+    retry=retry_if_exception(_is_retryable),
     stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
+    wait=_wait,
+    before_sleep=_record_retry,
     reraise=True
 )
-def make_request(url, params=None):
+def make_request(url, params=None, stream=False, headers=None):
+    """
+    GET con reintentos. Devuelve el JSON decodificado o, con `stream=True`,
+    la respuesta sin leer el body (para parsearlo de forma incremental); en ese caso
+    los bytes descargados los informa quien lee el body.
+
+    Cada intento pasa por el limitador compartido y por el circuit breaker del endpoint
+    (ver etl_script/resilience.py); un 429 pausa el limitador según su Retry-After.
+    """
+    endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+    breaker = circuit_breaker(endpoint)
+    breaker.before_call()
+    rate_limiter().acquire()
+    try:
+        response = get_session().get(url, params=params, timeout=60, stream=stream, headers=headers)
+    except (Timeout, ConnectionError) as e:
+        breaker.record_failure()
+        logger.warning(f"⚠️ Intento fallido para URL {url}: {e}. Reintentando...")
+        raise
+    except RequestException as e:
+        breaker.record_failure()
+        logger.error(f"❗ Error de solicitud para URL {url}: {e}")
+        raise
+
+    status = response.status_code
+    if status == 429 or (status == 503 and 'Retry-After' in response.headers):
+        delay = parse_retry_after(response.headers.get('Retry-After'))
+        response.close()
+        # Un 429 indica que la API está viva; un 503 con Retry-After cuenta como caída
+        if status == 503:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        rate_limiter().pause(delay)
+        logger.warning(f"⏳ La API respondió {status} para URL {url}: se pausan las solicitudes {delay:.1f}s.")
+        raise ThrottledError(f"{status} para URL {url}", delay, response=response)
+    if status >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
     try:
-        response = requests.get(url, headers=HEADERS, params=params, timeout=60)
         response.raise_for_status()
+        if stream:
+            return response
+        metrics.add_bytes(len(response.content))
         return response.json()
-    except (HTTPError, Timeout, ConnectionError) as e:
-        logger.warning(f"⚠️ Intento fallido para URL {url}: {e}. Reintentando...")
+    except HTTPError as e:
+        response.close()
+        if status >= 500:
+            logger.warning(f"⚠️ Intento fallido para URL {url}: {e}. Reintentando...")
+        else:
+            logger.error(f"❗ Error de solicitud para URL {url}: {e}")
         raise
     except RequestException as e:
         logger.error(f"❗ Error de solicitud para URL {url}: {e}")
         raise
 
+@instrument('fetch')
 def fetch_data(endpoint, params=None):
     """
     Función genérica para obtener datos desde un endpoint específico.
+    Para los endpoints con TTL en CACHE_TTLS devuelve UNCHANGED si la respuesta
+    no cambió desde la última carga confirmada (ver response_cache).
     """
-    url = f"{BASE_URL}{API_KEY}/{endpoint}"
+    url = f"{config.BASE_URL}{config.API_KEY}/{endpoint}"
     try:
-        data = make_request(url, params=params)
+        if response_cache.is_cached(endpoint):
+            data = _fetch_cached(endpoint, url, params)
+            if data is UNCHANGED:
+                logger.info(f"♻️ Sin cambios en el endpoint '{endpoint}' desde la última carga.")
+                return data
+        else:
+            data = make_request(url, params=params)
         logger.info(f"✅ Datos obtenidos exitosamente desde el endpoint '{endpoint}'.")
         return data
     except Exception as e:
         logger.error(f"❌ No se pudieron obtener datos desde '{endpoint}': {e}")
         return []
 
+@instrument('fetch')
+def fetch_json(endpoint, params=None):
+    """
+    Igual que fetch_data pero sin caché y propagando los errores: para cargas que
+    reemplazan datos existentes, donde una respuesta vacía por error borraría filas.
+    """
+    url = f"{config.BASE_URL}{config.API_KEY}/{endpoint}"
+    data = make_request(url, params=params)
+    logger.info(f"✅ Datos obtenidos exitosamente desde el endpoint '{endpoint}' ({params or {}}).")
+    return data
+
+def _fetch_cached(endpoint, url, params):
+    """
+    GET condicional contra la entrada vigente de la caché. Devuelve UNCHANGED ante
+    un 304 o un body con el mismo hash; si no, el JSON decodificado (pendiente de commit).
+    """
+    entry = response_cache.lookup(endpoint, params)
+    response = make_request(url, params=params, stream=True, headers=response_cache.conditional_headers(entry))
+    try:
+        if response.status_code == 304:
+            return UNCHANGED
+        body = response.content
+        metrics.add_bytes(len(body))
+    finally:
+        response.close()
+    if not response_cache.stage(endpoint, params, body, response.headers, entry):
+        return UNCHANGED
+    return json.loads(body)
+
+def iter_records(endpoint, params=None, batch_size=None):
+    """
+    Lee un endpoint que devuelve un arreglo JSON y entrega sus registros en lotes
+    (listas de a lo sumo `batch_size` dicts, por defecto STREAM_BATCH_SIZE).
+
+    Con ijson el arreglo se parsea mientras llega, así que la memoria no depende del
+    tamaño de la respuesta. Sin ijson se usa response.json() y solo se trocea el resultado.
+    A diferencia de fetch_data, los errores se propagan: un lote perdido no debe
+    terminar en una carga incompleta.
+    """
+    batch_size = batch_size or config.STREAM_BATCH_SIZE
+    url = f"{config.BASE_URL}{config.API_KEY}/{endpoint}"
+    response = make_request(url, params=params, stream=True)
+    try:
+        if ijson is None:
+            logger.warning(f"⚠️ ijson no está instalado: '{endpoint}' se leerá completo en memoria.")
+            data = response.json()
+            records = data if isinstance(data, list) else [data]
+        else:
+            response.raw.decode_content = True
+            records = ijson.items(response.raw, 'item', use_float=True)
+
+        batch = []
+        total = 0
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                total += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            total += len(batch)
+            yield batch
+        logger.info(f"✅ {total} registros leídos en streaming desde el endpoint '{endpoint}'.")
+    finally:
+        metrics.add_bytes(response.raw.tell())
+        response.close()
+
+def fetch_many(endpoints, max_concurrency=None):
+    """
+    Obtiene varios endpoints a la vez sobre la sesión compartida.
+
+    `endpoints` es una lista de nombres de endpoint o de tuplas (endpoint, params).
+    Devuelve los resultados en el mismo orden. Como máximo se hacen
+    `max_concurrency` (por defecto HTTP_MAX_CONCURRENCY) solicitudes simultáneas.
+    """
+    requests_spec = [(item, None) if isinstance(item, str) else tuple(item) for item in endpoints]
+    if not requests_spec:
+        return []
+    workers = min(max_concurrency or config.HTTP_MAX_CONCURRENCY, len(requests_spec))
+    contexts = [contextvars.copy_context() for _ in requests_spec]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda context, spec: context.run(fetch_data, *spec), contexts, requests_spec))
+
 # Funciones específicas ahora utilizan `fetch_data`
 def get_ticket_status():
     return fetch_data("listTicketStatus")
@@ -51,9 +268,18 @@ def get_ticket_status():
 def get_tickets_by_status(status):
     return fetch_data("showTicketsByStatus", params={'status': status})
 
+def iter_tickets_by_status(status, batch_size=None):
+    return iter_records("showTicketsByStatus", params={'status': status}, batch_size=batch_size)
+
 def get_tickets_per_period(start_date, end_date):
     return fetch_data("showTicketsPerPeriod", params={'start': start_date, 'end': end_date})
 
+def get_tickets_per_period_slice(start_date, end_date):
+    """
+    Tickets de un tramo de fechas; los errores se propagan (ver fetch_json).
+    """
+    return fetch_json("showTicketsPerPeriod", params={'start': start_date, 'end': end_date})
+
 def get_opened_closed_monthly():
     return fetch_data("openedVersusClosedMonthly")
 
@@ -75,8 +301,20 @@ def get_ticket_activities():
     """
     return fetch_data("listTicketsActivities")
 
+def iter_ticket_activities(batch_size=None):
+    """
+    Igual que get_ticket_activities, pero en lotes leídos en streaming.
+    """
+    return iter_records("listTicketsActivities", batch_size=batch_size)
+
 def get_activities_hours_to_charge():
     """
     Obtiene los datos de actividades con horas a cargar desde el endpoint activitiesHoursToCharge.
     """
     return fetch_data("activitiesHoursToCharge")
+
+def iter_activities_hours_to_charge(batch_size=None):
+    """
+    Igual que get_activities_hours_to_charge, pero en lotes leídos en streaming.
+    """
+    return iter_records("activitiesHoursToCharge", batch_size=batch_size)
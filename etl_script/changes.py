@@ -0,0 +1,145 @@
+# etl_script/changes.py
+"""
+Registro de cambios (change data capture) de las tablas cargadas por el ETL.
+
+Para cada tabla de CHANGE_KEYS, el loader deja en CHANGES_TABLE una fila por clave
+insertada, actualizada o eliminada, con el run_id de la ejecución (metrics.run_id) y el
+job, en la misma transacción que la carga:
+- upsert_data: las claves que devuelven el INSERT ... ON CONFLICT y el DELETE,
+- recargas por particiones: la diferencia entre staging y la tabla viva en los meses que cambiaron,
+- recargas con swap: la diferencia entre staging y la tabla viva completa.
+Las cargas que no pueden compararse (primera carga, TRUNCATE + carga) registran una sola
+fila 'reload' sin clave: quien consume los cambios debe releer la tabla entera.
+
+Las tablas sin columna clave usan md5 de la fila completa (`md5(t::text)`) como clave, así
+que un cambio aparece como 'delete' de la fila anterior e 'insert' de la nueva.
+
+Si CHANGES_CHANNEL está definido, cada carga con cambios envía además un NOTIFY (entregado
+al hacer COMMIT) con un resumen JSON: run_id, job, table y conteos por operación.
+Los consumidores pueden hacer LISTEN y leer luego las claves por run_id y tabla.
+"""
+import json
+import logging
+import threading
+from collections import Counter
+
+from sqlalchemy import text
+
+from etl_script import loader, metrics
+from etl_script import config
+
+logger = logging.getLogger(__name__)
+
+def tracked(table_name):
+    return table_name in config.CHANGE_KEYS
+
+_lock = threading.Lock()
+_ready = set()
+
+def ensure_changes_table(engine):
+    """
+    Crea CHANGES_TABLE y su índice en una transacción propia, una vez por proceso: dentro de
+    las cargas en paralelo el CREATE INDEX chocaría con los INSERT de la otra transacción.
+    """
+    with _lock:
+        if config.CHANGES_TABLE in _ready:
+            return
+        table = loader.quote_ident(config.CHANGES_TABLE)
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id bigserial PRIMARY KEY, run_id text NOT NULL, job text, table_name text NOT NULL, "
+                "op text NOT NULL, key text, changed_at timestamptz NOT NULL DEFAULT now());"
+            ))
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {loader.quote_ident(f'{config.CHANGES_TABLE}_table_run_idx')} ON {table} (table_name, run_id);"
+            ))
+        _ready.add(config.CHANGES_TABLE)
+
+def reset():
+    """
+    Olvida qué tablas de cambios ya se crearon (p.ej. tras cambiar de base o de esquema).
+    """
+    with _lock:
+        _ready.clear()
+
+def key_expression(table_name, alias):
+    """
+    Expresión SQL de la clave de una fila de `alias`: su columna de CHANGE_KEYS o md5 de la fila.
+    """
+    column = config.CHANGE_KEYS.get(table_name)
+    return f"{alias}.{loader.quote_ident(column)}" if column else f"md5({alias}::text)"
+
+def _params(table_name, params=None):
+    return dict(params or {}, run_id=metrics.run_id(), job=metrics.current_job.get(), table_name=table_name)
+
+def record_returning(conn, table_name, statement, params=None, announce=True):
+    """
+    Ejecuta `statement` (una sentencia que devuelve las columnas key y op, p.ej. un
+    INSERT/DELETE ... RETURNING) y, si la tabla está en CHANGE_KEYS, registra cada fila
+    devuelta en CHANGES_TABLE. Devuelve un Counter con las filas por op.
+    Con announce=False no se envía el NOTIFY (quien llama lo hace con el total de la carga).
+    """
+    if not tracked(table_name):
+        return Counter(row.op for row in conn.execute(text(statement), params or {}))
+    ensure_changes_table(conn.engine)
+    ops = conn.execute(text(
+        f"WITH changed AS ({statement}) "
+        f"INSERT INTO {loader.quote_ident(config.CHANGES_TABLE)} (run_id, job, table_name, op, key) "
+        f"SELECT :run_id, :job, :table_name, op, key::text FROM changed RETURNING op;"
+    ), _params(table_name, params)).scalars().all()
+    counts = Counter(ops)
+    if announce:
+        notify(conn, table_name, counts)
+    return counts
+
+def record_diff(conn, table_name, old_table, new_table, condition='TRUE', params=None):
+    """
+    Registra las diferencias entre `old_table` (la tabla viva antes de reemplazarla) y
+    `new_table` (staging) en las filas que cumplen `condition` (sobre el alias s).
+    Se compara por clave y, para las claves presentes en ambas, por md5 de la fila.
+    No hace nada si la tabla no está en CHANGE_KEYS. Devuelve un Counter por op.
+    """
+    if not tracked(table_name):
+        return Counter()
+    key = key_expression(table_name, 's')
+    side = (f"SELECT DISTINCT ON (k) {key} AS k, md5(s::text) AS h FROM {{source}} s "
+            f"WHERE {condition} ORDER BY k, h")
+    statement = (
+        f"SELECT coalesce(n.k, o.k) AS key, "
+        f"CASE WHEN o.k IS NULL THEN 'insert' WHEN n.k IS NULL THEN 'delete' ELSE 'update' END AS op "
+        f"FROM ({side.format(source=new_table)}) n FULL JOIN ({side.format(source=old_table)}) o ON n.k = o.k "
+        f"WHERE n.h IS DISTINCT FROM o.h"
+    )
+    return record_returning(conn, table_name, statement, params)
+
+def record_reload(conn, table_name):
+    """
+    Registra que la tabla se recargó completa sin poder comparar: los consumidores la releen entera.
+    """
+    if not tracked(table_name):
+        return
+    ensure_changes_table(conn.engine)
+    conn.execute(text(
+        f"INSERT INTO {loader.quote_ident(config.CHANGES_TABLE)} (run_id, job, table_name, op) "
+        f"VALUES (:run_id, :job, :table_name, 'reload');"
+    ), _params(table_name))
+    notify(conn, table_name, Counter(reload=1))
+
+def notify(conn, table_name, counts):
+    """
+    Envía el resumen de cambios de la carga por CHANGES_CHANNEL (se entrega al hacer COMMIT).
+    """
+    if not counts or not tracked(table_name):
+        return
+    logger.info(
+        f"🔔 '{table_name}': cambios registrados en '{config.CHANGES_TABLE}' "
+        f"({', '.join(f'{op}={count}' for op, count in sorted(counts.items()))})."
+    )
+    if not config.CHANGES_CHANNEL:
+        return
+    payload = json.dumps({
+        "run_id": metrics.run_id(), "job": metrics.current_job.get(), "table": table_name,
+        **{op: counts.get(op, 0) for op in ('insert', 'update', 'delete', 'reload')},
+    })
+    conn.execute(text("SELECT pg_notify(:channel, :payload);"), {"channel": config.CHANGES_CHANNEL, "payload": payload})
@@ -1,43 +1,248 @@
 # etl_script/config.py
+"""
+Configuración del ETL.
+
+Nada se lee al importar este módulo: la primera vez que se accede a una variable
+(p.ej. `config.ETL_MAX_WORKERS`) se carga el .env y se construye un Settings con todos
+los valores ya convertidos a su tipo. Así `--help`, `--list` o los benchmarks que no tocan
+la API ni la base no pagan el costo de leer el entorno ni fallan si faltan credenciales.
+
+Los módulos del ETL leen `config.NOMBRE` al momento de usarlo, de modo que reset_settings()
+se aplica en todo el proceso. `from etl_script.config import NOMBRE` sigue funcionando,
+pero fija el valor en el momento del import.
+
+Las variables de la API y de la base se validan recién cuando se usan.
+"""
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Optional
 
 # Determinar la ruta del archivo .env
 env_path = Path(__file__).parent.parent / '.env'
 
-# Cargar las variables de entorno desde el archivo .env
-load_dotenv(dotenv_path=env_path)
-
-# API Configuration
-API_KEY = os.getenv('API_KEY')
-BASE_URL = os.getenv('BASE_URL')
-
-# Validar variables API
-if not API_KEY:
-    raise ValueError("La variable API_KEY debe estar definida en el archivo .env")
-if not BASE_URL:
-    raise ValueError("La variable BASE_URL debe estar definida en el archivo .env")
-
-HEADERS = {
-    'Authorization': f'Bearer {API_KEY}',
-    'Content-Type': 'application/json'
-}
-
-# Database Configuration
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_HOST = os.getenv('DB_HOST')
-DB_PORT = os.getenv('DB_PORT')
-DB_NAME = os.getenv('DB_NAME')
-
-# Validar variables de la base de datos
-required_db_vars = [DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]
-if not all(required_db_vars):
-    missing = [var for var, value in zip(
-        ['DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_NAME'],
-        required_db_vars
-    ) if not value]
-    raise ValueError(f"Las siguientes variables deben estar definidas en el archivo .env: {', '.join(missing)}")
-
-DATABASE_URI = f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+def parse_mapping(value):
+    """
+    Convierte "clave=valor,clave=valor" en un dict (una cadena vacía da un dict vacío).
+    """
+    return dict(
+        (part.strip() for part in item.split('=', 1))
+        for item in value.split(',') if item.strip()
+    )
+
+def _int_mapping(value):
+    return {name: int(number) for name, number in parse_mapping(value).items()}
+
+@dataclass(frozen=True)
+class Settings:
+    # API Configuration
+    api_key: Optional[str] = None
+    base_url: Optional[str] = None
+    # Conexiones keep-alive máximas hacia la API (el pool bloquea en lugar de abrir más)
+    http_pool_size: int = 10
+    # Solicitudes simultáneas en api_client.fetch_many
+    http_max_concurrency: int = 9
+    # Caché de respuestas: directorio y TTL en segundos por endpoint ("endpoint=segundos,...").
+    # Mientras el TTL no venza, una respuesta idéntica a la última cargada se omite por completo;
+    # al vencer se recarga aunque no haya cambios. Los endpoints sin TTL no usan la caché.
+    cache_dir: str = str(Path(__file__).parent.parent / '.etl_cache')
+    cache_ttls: Dict[str, int] = field(default_factory=lambda: _int_mapping(
+        'listTicketStatus=3600,monthlySatisfactionAverage=3600,'
+        'openedVersusClosedMonthly=3600,ticketsByOpeningTime=900'
+    ))
+    # Registros por lote al leer en streaming los endpoints grandes (api_client.iter_records)
+    stream_batch_size: int = 5000
+    # Solicitudes por segundo hacia la API sumando todos los hilos (0 desactiva el límite) y ráfaga máxima
+    http_rate_limit: float = 10.0
+    http_rate_burst: int = 10
+    # Espera exponencial entre reintentos (segundos, mínimo y máximo)
+    http_retry_wait_min: float = 4.0
+    http_retry_wait_max: float = 10.0
+    # Máximo de segundos que se respeta un Retry-After de la API
+    retry_after_max: float = 120.0
+    # Fallos seguidos (red, timeout, 5xx) que abren el circuito de un endpoint y segundos que queda abierto
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 60.0
+    # Zona horaria de las fechas con hora que envía la API sin zona (p.ej. slasexpirationdate)
+    api_timezone: str = 'UTC'
+
+    # Database Configuration
+    db_user: Optional[str] = None
+    db_password: Optional[str] = None
+    db_host: Optional[str] = None
+    db_port: Optional[str] = None
+    db_name: Optional[str] = None
+    # Conexiones del pool de SQLAlchemy (0: ETL_MAX_WORKERS × (PIPELINE_LOAD_WORKERS + 2), una por
+    # carga en paralelo más el lock y las consultas cortas de cada job) y conexiones extra en picos
+    db_pool_size: int = 0
+    db_max_overflow: int = 5
+    # Verificar cada conexión al sacarla del pool y reciclarlas tras estos segundos (modo daemon)
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    # Parámetros de sesión aplicados a cada conexión nueva ("parametro=valor,...")
+    db_session_settings: Dict[str, str] = field(default_factory=lambda: parse_mapping('application_name=milldesk_etl'))
+    # Parámetros aplicados con SET LOCAL en las transacciones que recargan tablas completas, cuyos
+    # datos se pueden volver a pedir a la API si un commit se pierde ante una caída del servidor
+    reload_session_settings: Dict[str, str] = field(default_factory=lambda: parse_mapping('synchronous_commit=off'))
+
+    # Loader Configuration
+    # Filas a partir de las cuales load_data usa COPY FROM STDIN en lugar de INSERT multi-fila
+    copy_min_rows: int = 5000
+    # Filas que se serializan a CSV por cada bloque enviado con COPY
+    copy_chunk_rows: int = 50000
+    # Memoria máxima (bytes estimados en pandas) de cada bloque que se escribe con COPY o INSERT
+    load_chunk_bytes: int = 64 * 1024 * 1024
+    # load_data: 'transaction' (todo o nada) o 'chunk' (un COMMIT por bloque)
+    load_commit_mode: str = 'transaction'
+    # Estrategia para recargar tablas completas: 'swap' (tabla <tabla>__staging + RENAME) o 'truncate'
+    load_strategy: str = 'swap'
+    # Tiempo máximo de espera por el lock de la tabla viva durante el RENAME
+    swap_lock_timeout: str = '5s'
+    # Tabla donde se guardan los registros rechazados por la validación de esquemas
+    rejects_table: str = 'etl_rejects'
+    # Sincronización de la tabla tickets: 'incremental' (upsert por id de las filas que cambian) o 'full'
+    tickets_sync_mode: str = 'incremental'
+    # Jobs independientes que etl_script.main ejecuta a la vez
+    etl_max_workers: int = 4
+    # Elementos que caben en cada cola entre etapas del pipeline (extract → transform → load)
+    pipeline_queue_size: int = 2
+    # Cargas simultáneas (tablas distintas) dentro de un mismo job
+    pipeline_load_workers: int = 2
+    # Procesos para transformar en paralelo los lotes de las extracciones en streaming
+    # (0: en el mismo proceso; requiere el paquete opcional pyarrow)
+    transform_processes: int = 0
+    # tickets_per_period: 'sliced' (tramos de fechas con checksum) o 'window' (una sola solicitud y recarga completa)
+    tickets_per_period_mode: str = 'sliced'
+    # Tamaño de cada tramo: 'day' o 'week' (semanas de lunes a domingo)
+    period_slice: str = 'week'
+    # Días hacia atrás que cubre una ejecución normal
+    period_lookback_days: int = 80
+    # Días de filas que conserva la tabla: una ejecución normal borra las anteriores
+    # (0: PERIOD_LOOKBACK_DAYS, la misma ventana fija del modo 'window')
+    period_retention_days: int = 0
+    # Los tramos que terminan dentro de estos últimos días se vuelven a pedir en cada ejecución
+    period_refresh_days: int = 14
+    # Tabla con el checksum y las filas cargadas de cada tramo
+    slice_state_table: str = 'etl_slice_state'
+    # Tablas particionadas por mes y su columna de fecha ("tabla=columna,..."; vacío desactiva)
+    partitioned_tables: Dict[str, str] = field(default_factory=lambda: parse_mapping(
+        'tickets_per_period=start,ticket_activities=start_date,activities_hours_to_charge=start_date'
+    ))
+    # Rangos de fechas modificados por cada carga, pendientes de recalcular en los rollups
+    dirty_ranges_table: str = 'etl_dirty_ranges'
+    # Tablas cuyas altas, cambios y bajas se registran en CHANGES_TABLE, con su columna clave
+    # ("tabla=columna,..."; sin columna, la clave de cada fila es md5 de la fila completa)
+    change_keys: Dict[str, str] = field(default_factory=lambda: parse_mapping(
+        'tickets=id,ticket_activities=activity_id,activities_hours_to_charge='
+    ))
+    # Tabla con las claves insertadas, actualizadas y eliminadas en cada ejecución
+    changes_table: str = 'etl_changes'
+    # Canal de NOTIFY con el resumen de cambios de cada carga (vacío desactiva)
+    changes_channel: str = 'etl_changes'
+    # Tabla con las métricas de rendimiento de cada ejecución (tiempos, filas, bytes, reintentos, memoria)
+    metrics_table: str = 'etl_run_metrics'
+    # Archivo .prom para el textfile collector de node-exporter (vacío desactiva la exportación)
+    metrics_textfile: str = ''
+    # Si un job sigue corriendo en otro proceso: 'coalesce' (esperar y correrlo una vez) o 'skip' (omitirlo)
+    job_lock_mode: str = 'coalesce'
+    # Segundos máximos de espera en modo 'coalesce' antes de omitir el job
+    job_lock_timeout: float = 600.0
+    # Tabla donde se registran las esperas y omisiones por lock
+    lock_events_table: str = 'etl_lock_events'
+    # etl_script.daemon: segundos entre ejecuciones de cada job ("job=segundos,..."); los jobs
+    # que dependen de otro (tickets_sla_detalle, rollups) corren tras él y no necesitan intervalo
+    job_intervals: Dict[str, int] = field(default_factory=lambda: _int_mapping(
+        'ticket_status=3600,tickets_by_status=60,tickets_per_period=300,tickets_by_opening_time=900,'
+        'monthly_satisfaction_and_opened_closed=3600,activities_hours_and_listTicketsActivities=300'
+    ))
+    # Desfase aleatorio de cada ejecución, como fracción del intervalo (0.1 = ±10%)
+    daemon_jitter: float = 0.1
+    # Máximo de segundos entre reintentos de un job que falla (backoff exponencial)
+    daemon_backoff_max: int = 3600
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Construye la configuración desde las variables de entorno (en mayúsculas), convirtiendo
+        cada valor al tipo de su campo. Las variables no definidas toman el valor por defecto.
+        """
+        environ = os.environ if environ is None else environ
+        values = {}
+        for spec in fields(cls):
+            raw = environ.get(spec.name.upper())
+            if raw is None:
+                continue
+            if spec.type == Dict[str, int]:
+                values[spec.name] = _int_mapping(raw)
+            elif spec.type == Dict[str, str]:
+                values[spec.name] = parse_mapping(raw)
+            elif spec.type is bool:
+                values[spec.name] = raw.strip().lower() in ('1', 'true', 'yes', 'on')
+            elif spec.type in (int, float):
+                values[spec.name] = spec.type(raw)
+            else:
+                values[spec.name] = raw
+        return cls(**values)
+
+    def validate_api(self):
+        # Validar variables API
+        if not self.api_key:
+            raise ValueError("La variable API_KEY debe estar definida en el archivo .env")
+        if not self.base_url:
+            raise ValueError("La variable BASE_URL debe estar definida en el archivo .env")
+
+    def validate_db(self):
+        # Validar variables de la base de datos
+        names = ['DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_NAME']
+        missing = [name for name in names if not getattr(self, name.lower())]
+        if missing:
+            raise ValueError(f"Las siguientes variables deben estar definidas en el archivo .env: {', '.join(missing)}")
+
+    @property
+    def headers(self):
+        self.validate_api()
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    @property
+    def database_uri(self):
+        self.validate_db()
+        return f'postgresql+psycopg2://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}'
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """
+    Carga el .env (sin pisar variables ya definidas) y devuelve la configuración. Se calcula una vez.
+    """
+    from dotenv import load_dotenv
+
+    # Cargar las variables de entorno desde el archivo .env
+    load_dotenv(dotenv_path=env_path)
+    return Settings.from_env()
+
+def reset_settings():
+    """
+    Descarta la configuración calculada: el próximo acceso vuelve a leer el entorno.
+    """
+    get_settings.cache_clear()
+
+_API_NAMES = {'API_KEY', 'BASE_URL'}
+_DB_NAMES = {'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_NAME'}
+
+def __getattr__(name):
+    # Compatibilidad con `from etl_script.config import NOMBRE`: las constantes en mayúsculas
+    # se resuelven contra Settings en el momento del acceso
+    if not name.isupper():
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    settings = get_settings()
+    if name in _API_NAMES:
+        settings.validate_api()
+    elif name in _DB_NAMES:
+        settings.validate_db()
+    try:
+        return getattr(settings, name.lower())
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,223 @@
+# etl_script/daemon.py
+"""
+Modo residente: un solo proceso que ejecuta los jobs del ETL según su propio intervalo.
+
+A diferencia de cron + scripts_bash/, los módulos (pandas, SQLAlchemy, requests...) se
+importan una sola vez y el pool de conexiones, la sesión HTTP y la caché de respuestas
+quedan calientes entre ejecuciones.
+
+- Cada job de JOB_INTERVALS corre cada N segundos, con un desfase aleatorio de ±DAEMON_JITTER
+  (fracción del intervalo) para que los jobs no coincidan siempre en el mismo instante.
+- Cada job vencido corre en su propio hilo: uno lento (p.ej. las actividades) no demora a
+  los frecuentes (tickets_by_status). Un job no se lanza mientras él o alguno de sus
+  dependientes está corriendo: espera a que termine.
+- Cuando un job corre, también corren los que dependen de él en el DAG de etl_script.main
+  (p.ej. ticket_status arrastra a tickets_by_status y tickets_sla_detalle).
+- Tras un fallo, el job se reintenta con backoff exponencial (intervalo × 2^fallos, hasta
+  DAEMON_BACKOFF_MAX segundos); un éxito vuelve al intervalo normal.
+- SIGTERM o SIGINT: no se lanzan más jobs, los que están corriendo terminan y el proceso
+  cierra el engine y la sesión HTTP antes de salir.
+
+Uso:
+    python -m etl_script.daemon
+    python -m etl_script.daemon --jobs tickets_by_status ticket_status
+"""
+import argparse
+import logging
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Módulos propios (db, api_client y metrics se importan al arrancar el daemon, no con --help)
+from etl_script import config
+from etl_script.logger import setup_logging
+from etl_script.main import JOBS, run_jobs
+
+logger = logging.getLogger(__name__)
+
+def dependents(name, jobs=JOBS):
+    """
+    Jobs que dependen (de forma transitiva) del job indicado.
+    """
+    found = set()
+    pending = [name]
+    while pending:
+        current = pending.pop()
+        for other, spec in jobs.items():
+            if current in spec["depends_on"] and other not in found:
+                found.add(other)
+                pending.append(other)
+    return found
+
+def next_delay(interval, failures=0, jitter=None):
+    """
+    Segundos hasta la próxima ejecución: el intervalo (o el backoff tras fallos) con jitter.
+    """
+    jitter = config.DAEMON_JITTER if jitter is None else jitter
+    delay = interval if not failures else min(interval * 2 ** failures, max(interval, config.DAEMON_BACKOFF_MAX))
+    return delay * (1 + random.uniform(-jitter, jitter))
+
+class Scheduler:
+    """
+    Planifica los jobs con intervalo propio. Cada job vencido se lanza en su propio hilo (con
+    sus dependientes, sobre etl_script.main.run_jobs), así un job lento no retrasa a los demás.
+    """
+    def __init__(self, engine, intervals, jobs=JOBS):
+        unknown = set(intervals) - set(jobs)
+        if unknown:
+            raise ValueError(f"Jobs desconocidos en JOB_INTERVALS: {', '.join(sorted(unknown))}")
+        self.engine = engine
+        self.jobs = jobs
+        self.intervals = intervals
+        self.failures = {name: 0 for name in intervals}
+        # La primera vuelta corre todo, escalonado por el jitter
+        now = time.monotonic()
+        self.next_run = {name: now + random.uniform(0, config.DAEMON_JITTER * interval) for name, interval in intervals.items()}
+        self.stop_event = threading.Event()
+        # Se activa al parar o cuando termina un job, para revisar los vencidos sin esperar
+        self.wakeup = threading.Event()
+        # Job lanzado -> jobs que está ejecutando (él y sus dependientes)
+        self.running = {}
+        self.lock = threading.Lock()
+        # Como en etl_script.main, a lo sumo ETL_MAX_WORKERS lanzamientos a la vez (el pool de
+        # conexiones se dimensiona con ese valor)
+        self.max_workers = config.ETL_MAX_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='daemon')
+
+    def stop(self, signum=None, frame=None):
+        if not self.stop_event.is_set():
+            logger.info("🛑 Señal de parada recibida: se terminan los jobs en curso y no se lanzan más.")
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def busy(self):
+        with self.lock:
+            return set().union(*self.running.values())
+
+    def chain(self, name):
+        return {name} | dependents(name, self.jobs)
+
+    def due(self, now):
+        """
+        Jobs vencidos que se pueden lanzar: ni ellos ni sus dependientes están corriendo.
+        """
+        busy = self.busy()
+        with self.lock:
+            return sorted(
+                name for name, when in self.next_run.items()
+                if when <= now and not self.chain(name) & busy
+            )
+
+    def launch(self, name):
+        """
+        Lanza un job vencido y sus dependientes en un hilo propio. No lanza nada si alguno
+        ya está corriendo (p.ej. lanzado en esta misma vuelta por otro job) o si ya hay
+        ETL_MAX_WORKERS lanzamientos en curso.
+        """
+        selected = self.chain(name)
+        with self.lock:
+            if len(self.running) >= self.max_workers or selected & set().union(*self.running.values()):
+                return None
+            self.running[name] = selected
+        future = self.executor.submit(self.run_job, name, selected)
+        future.add_done_callback(lambda _: self.wakeup.set())
+        return future
+
+    def run_job(self, name, selected):
+        """
+        Ejecuta un job junto con sus dependientes, guarda sus métricas y lo reprograma:
+        tras un fallo, con backoff exponencial.
+        """
+        from etl_script import metrics
+
+        try:
+            with metrics.run_scope():
+                try:
+                    results = run_jobs(self.engine, selected, jobs=self.jobs)
+                except Exception as e:
+                    logger.error(f"❌ [{name}] Error al ejecutar el job: {e}")
+                    results = {name: 'failed'}
+                metrics.flush_metrics(self.engine, jobs=selected)
+            logger.info(f"🏁 [{name}] Ejecución finalizada: {', '.join(f'{job}={status}' for job, status in results.items())}")
+            self.reschedule(name, results)
+            return results
+        finally:
+            with self.lock:
+                self.running.pop(name, None)
+
+    def reschedule(self, name, results):
+        now = time.monotonic()
+        with self.lock:
+            for job, status in results.items():
+                if job not in self.intervals:
+                    continue
+                if status == 'failed':
+                    self.failures[job] += 1
+                elif status in ('ok', 'busy'):
+                    self.failures[job] = 0
+                if status != 'skipped' or job == name:
+                    delay = next_delay(self.intervals[job], self.failures[job])
+                    self.next_run[job] = now + delay
+                    if self.failures[job]:
+                        logger.warning(
+                            f"🔁 [{job}] {self.failures[job]} fallo(s) seguido(s): próximo intento en {delay:.0f}s."
+                        )
+
+    def seconds_to_next(self, now):
+        """
+        Segundos hasta el próximo job que se podría lanzar (None: esperar a que termine uno).
+        """
+        busy = self.busy()
+        with self.lock:
+            if len(self.running) >= self.max_workers:
+                return None
+            pending = [when for name, when in self.next_run.items() if not self.chain(name) & busy]
+        return max(min(pending) - now, 0) if pending else None
+
+    def run_forever(self):
+        logger.info(
+            "🚀 Daemon del ETL iniciado: "
+            + ', '.join(f"{name} cada {interval}s" for name, interval in sorted(self.intervals.items()))
+        )
+        try:
+            while not self.stop_event.is_set():
+                self.wakeup.clear()
+                for name in self.due(time.monotonic()):
+                    self.launch(name)
+                self.wakeup.wait(self.seconds_to_next(time.monotonic()))
+        finally:
+            self.executor.shutdown(wait=True)
+        logger.info("🏁 Daemon del ETL detenido.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', nargs='+', choices=sorted(JOBS), help="Subconjunto de jobs a planificar (con intervalo en JOB_INTERVALS)")
+    args = parser.parse_args(argv)
+
+    missing = set(args.jobs or []) - set(config.JOB_INTERVALS)
+    if missing:
+        parser.error(f"sin intervalo en JOB_INTERVALS: {', '.join(sorted(missing))}")
+    intervals = {name: config.JOB_INTERVALS[name] for name in (args.jobs or config.JOB_INTERVALS)}
+
+    from etl_script.api_client import close_session
+    from etl_script.db import get_engine
+    from etl_script.transform_pool import shutdown_pool
+
+    setup_logging()
+    engine = get_engine()
+    scheduler = Scheduler(engine, intervals)
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    try:
+        scheduler.run_forever()
+    finally:
+        close_session()
+        shutdown_pool()
+        engine.dispose()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,36 @@
 # etl_script/db.py
-from sqlalchemy import create_engine
-from etl_script.config import DATABASE_URI
+from sqlalchemy import create_engine, event
+from etl_script import config
 import logging
 
 def get_engine():
+    """
+    Crea el engine compartido por los jobs. El pool se dimensiona para las cargas en paralelo
+    (DB_POOL_SIZE), cada conexión se verifica al sacarla del pool (DB_POOL_PRE_PING) y recibe
+    los parámetros de DB_SESSION_SETTINGS al abrirse. No se abre ninguna conexión hasta el primer uso.
+    """
     logger = logging.getLogger(__name__)
+    pool_size = config.DB_POOL_SIZE or config.ETL_MAX_WORKERS * (config.PIPELINE_LOAD_WORKERS + 2)
     try:
-        engine = create_engine(DATABASE_URI)
-        # Prueba de conexión
-        with engine.connect() as connection:
-            logger.info("🔗 Conexión a la base de datos establecida correctamente.")
-        return engine
+        engine = create_engine(
+            config.DATABASE_URI,
+            pool_size=pool_size,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+            pool_recycle=config.DB_POOL_RECYCLE,
+        )
     except Exception as e:
-        logger.critical(f"❌ Error al conectar con la base de datos: {e}")
+        logger.critical(f"❌ Error al crear el engine de la base de datos: {e}")
         raise
+
+    session_settings = dict(config.DB_SESSION_SETTINGS)
+    if session_settings:
+        @event.listens_for(engine, "connect")
+        def apply_session_settings(dbapi_connection, connection_record):
+            with dbapi_connection.cursor() as cursor:
+                for name, value in session_settings.items():
+                    cursor.execute("SELECT set_config(%s, %s, false)", (name, value))
+            dbapi_connection.commit()
+
+    logger.info(f"🔗 Engine de base de datos listo (pool de {pool_size} + {config.DB_MAX_OVERFLOW} conexiones).")
+    return engine
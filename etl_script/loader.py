@@ -1,23 +1,855 @@
 # etl_script/loader.py
+import io
+import itertools
 import logging
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
 from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, TIME
+from sqlalchemy.engine import Engine
+
+from etl_script import changes, metrics
+from etl_script import config
+from etl_script.schemas import Transformed
 
 logger = logging.getLogger(__name__)
 
-def load_data(df, table_name, engine, if_exists='append', index=False):
+def quote_ident(name):
+    """
+    Cita un identificador de PostgreSQL (tabla o columna).
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _begin(bind):
+    """
+    Abre una transacción si se recibe un Engine; si ya es una conexión, la reutiliza tal cual.
+    """
+    if isinstance(bind, Engine):
+        return bind.begin()
+    return nullcontext(bind)
+
+@contextmanager
+def _reload_begin(engine):
+    """
+    Transacción de una recarga completa: aplica RELOAD_SESSION_SETTINGS con SET LOCAL
+    (por defecto synchronous_commit=off, el COMMIT no espera el flush del WAL; si el servidor
+    cae justo después, la tabla se vuelve a cargar desde la API en la próxima ejecución).
+    """
+    with engine.begin() as conn:
+        for name, value in config.RELOAD_SESSION_SETTINGS.items():
+            conn.execute(text("SELECT set_config(:name, :value, true)"), {"name": name, "value": value})
+        yield conn
+
+# Máximo de parámetros por sentencia en el protocolo de PostgreSQL
+MAX_BIND_PARAMS = 65535
+
+def chunk_rows_for(df, method):
+    """
+    Filas por bloque al escribir `df`: las que entran en LOAD_CHUNK_BYTES según el tamaño
+    estimado de una fila y, con INSERT multi-fila, sin superar MAX_BIND_PARAMS parámetros
+    por sentencia (con COPY, como máximo COPY_CHUNK_ROWS).
+    """
+    if df.empty:
+        return 1
+    sample = df.head(1000)
+    row_bytes = max(int(sample.memory_usage(deep=True, index=False).sum() / len(sample)), 1)
+    rows = max(config.LOAD_CHUNK_BYTES // row_bytes, 1)
+    if method == 'multi':
+        return max(min(rows, MAX_BIND_PARAMS // max(len(df.columns), 1)), 1)
+    return min(rows, config.COPY_CHUNK_ROWS)
+
+def _chunks(df, rows):
+    """
+    Recorre `df` en bloques de `rows` filas: (índice, cantidad de bloques, bloque).
+    """
+    total = -(-len(df) // rows)
+    for index, start in enumerate(range(0, len(df), rows)):
+        yield index, total, df.iloc[start:start + rows]
+
+def _log_progress(table_name, index, total, done, rows_total):
+    # Solo las cargas de varios bloques informan avance, en no más de ~10 líneas
+    step = max(total // 10, 1)
+    if total > 1 and ((index + 1) % step == 0 or index + 1 == total):
+        logger.info(f"📦 '{table_name}': bloque {index + 1}/{total}, {done}/{rows_total} filas ({done / rows_total:.0%}).")
+
+def copy_frame(df, table_name, conn, chunk_rows=None):
+    """
+    Envía el DataFrame a la tabla con COPY FROM STDIN (CSV).
+    Se serializa por bloques de `chunk_rows` filas (por defecto según chunk_rows_for), así
+    nunca se arma en memoria una copia en texto de todo el payload.
+    """
+    chunk_rows = chunk_rows or chunk_rows_for(df, 'copy')
+    columns = ', '.join(quote_ident(col) for col in df.columns)
+    copy_sql = f"COPY {quote_ident(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+    cursor = conn.connection.cursor()
+    try:
+        done = 0
+        for index, total, chunk in _chunks(df, chunk_rows):
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False, na_rep='\\N')
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+            done += len(chunk)
+            _log_progress(table_name, index, total, done, len(df))
+    finally:
+        cursor.close()
+
+def insert_frame(df, table_name, conn, chunk_rows=None):
+    """
+    INSERT multi-fila por bloques (por defecto según chunk_rows_for): ninguna sentencia
+    supera el límite de parámetros de PostgreSQL ni el presupuesto de memoria.
+    """
+    chunk_rows = chunk_rows or chunk_rows_for(df, 'multi')
+    done = 0
+    for index, total, chunk in _chunks(df, chunk_rows):
+        chunk.to_sql(table_name, conn, if_exists='append', index=False, method='multi', dtype=_sql_dtypes(df))
+        done += len(chunk)
+        _log_progress(table_name, index, total, done, len(df))
+
+# Tipos SQL declarados por la transformación en df.attrs['sql_dtypes']
+_SQL_TYPES = {'time': TIME, 'double precision': DOUBLE_PRECISION}
+
+def _sql_dtypes(df):
+    """
+    Tipos SQL para crear las columnas con dtype compacto (ver transformations.apply_dtypes).
+    """
+    return {col: _SQL_TYPES[sql_type]() for col, sql_type in df.attrs.get('sql_dtypes', {}).items()
+            if col in df.columns} or None
+
+def _write_frame(df, table_name, conn, if_exists='append', method=None):
+    """
+    Escribe el DataFrame dentro de la transacción de `conn` y devuelve el método usado.
+    A diferencia de load_data, propaga los errores.
+    """
+    if method is None:
+        method = 'copy' if len(df) >= config.COPY_MIN_ROWS else 'multi'
+
+    if method == 'copy':
+        try:
+            # Savepoint: si COPY falla, la transacción sigue siendo válida para el fallback
+            with conn.begin_nested():
+                # Crea la tabla si no existe (o la recrea con if_exists='replace') sin insertar filas
+                df.head(0).to_sql(table_name, conn, if_exists=if_exists, index=False, dtype=_sql_dtypes(df))
+                copy_frame(df, table_name, conn)
+            return 'copy'
+        except Exception as e:
+            error_message = str(e).split('\n')[0]
+            logger.warning(f"⚠️ COPY falló en '{table_name}': {error_message}. Reintentando con INSERT multi-fila...")
+
+    df.head(0).to_sql(table_name, conn, if_exists=if_exists, index=False, dtype=_sql_dtypes(df))
+    insert_frame(df, table_name, conn)
+    return 'multi'
+
+@metrics.instrument('load')
+def load_data(df, table_name, engine, if_exists='append', index=False, method=None, commit=None):
     """
     Carga un DataFrame a la tabla indicada. Por defecto, hace append.
+
+    `method` puede ser 'copy' (COPY FROM STDIN) o 'multi' (INSERT multi-fila).
+    Si no se indica, los DataFrames con al menos COPY_MIN_ROWS filas van por COPY
+    y el resto por INSERT; si COPY falla se reintenta con INSERT. En ambos casos se
+    escribe por bloques acotados (ver chunk_rows_for).
+
+    `commit` (por defecto LOAD_COMMIT_MODE): 'transaction' carga todo o nada; 'chunk'
+    confirma cada bloque por separado (transacciones cortas, pero si un bloque falla
+    los anteriores quedan cargados). Con una conexión en lugar de un Engine siempre se
+    usa la transacción de quien llama.
+    Devuelve las filas cargadas. Registra y propaga los errores.
     """
     if df.empty:
         logger.warning(f"⚠️ No hay datos para cargar en la tabla '{table_name}'.")
+        return 0
+    if index:
+        df = df.reset_index()
+    method = method or ('copy' if len(df) >= config.COPY_MIN_ROWS else 'multi')
+    commit = commit or config.LOAD_COMMIT_MODE
+    try:
+        if commit == 'chunk' and isinstance(engine, Engine):
+            methods = set()
+            done = 0
+            for position, total, chunk in _chunks(df, chunk_rows_for(df, method)):
+                with engine.begin() as conn:
+                    methods.add(_write_frame(chunk, table_name, conn,
+                                             if_exists=if_exists if position == 0 else 'append', method=method))
+                done += len(chunk)
+                _log_progress(table_name, position, total, done, len(df))
+            used_method = '/'.join(sorted(methods))
+        else:
+            with _begin(engine) as conn:
+                used_method = _write_frame(df, table_name, conn, if_exists=if_exists, method=method)
+        logger.info(f"✅ Datos cargados exitosamente en la tabla '{table_name}' ({len(df)} filas, {used_method}).")
+        return len(df)
+    except Exception as e:
+        # La primera línea de un error de INSERT multi-fila incluye la sentencia completa
+        error_message = str(e).split('\n')[0][:500]
+        logger.error(f"❌ Error al cargar datos en '{table_name}': {error_message}")
+        raise
+
+def table_exists(bind, table_name):
+    """
+    Indica si la tabla existe en el esquema actual.
+    """
+    with _begin(bind) as conn:
+        return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": quote_ident(table_name)}).scalar()
+
+def _frames(data, rejects=None):
+    """
+    Normaliza un DataFrame, un Transformed o un iterable de ellos (lotes) y descarta los vacíos.
+    Si se pasa la lista `rejects`, va acumulando en ella los DataFrames de rechazos de cada
+    Transformed, incluidos los de lotes que quedaron vacíos.
+    Devuelve (primer_lote, iterador_con_todos_los_lotes); primer_lote es None si no hay datos.
+    """
+    if isinstance(data, (pd.DataFrame, Transformed)):
+        data = [data]
+
+    def unpack(item):
+        if not isinstance(item, Transformed):
+            return item
+        if rejects is not None and item.rejects is not None and not item.rejects.empty:
+            rejects.append(item.rejects)
+        return item.df
+
+    frames = (frame for frame in map(unpack, data) if not frame.empty)
+    first = next(frames, None)
+    if first is None:
+        return None, iter(())
+    return first, itertools.chain([first], frames)
+
+def store_rejects(rejects, engine):
+    """
+    Guarda en REJECTS_TABLE los registros rechazados por la validación de esquemas (lista de
+    DataFrames con endpoint, reason, payload y rejected_at, ver schemas.rejects_frame).
+    Un fallo aquí se registra pero no afecta a la carga principal.
+    """
+    rejects = [frame for frame in rejects if frame is not None and not frame.empty]
+    if not rejects:
         return
+    df = pd.concat(rejects, ignore_index=True)
     try:
-        df.to_sql(table_name, engine, if_exists=if_exists, index=index, method='multi')
-        logger.info(f"✅ Datos cargados exitosamente en la tabla '{table_name}'.")
+        with engine.begin() as conn:
+            # DDL explícito: varios jobs pueden guardar rechazos a la vez
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {quote_ident(config.REJECTS_TABLE)} "
+                "(endpoint text, reason text, payload text, rejected_at timestamp);"
+            ))
+            _write_frame(df, config.REJECTS_TABLE, conn)
+        logger.info(f"🗃️ {len(df)} registros rechazados guardados en '{config.REJECTS_TABLE}'.")
     except Exception as e:
         error_message = str(e).split('\n')[0]
-        logger.error(f"❌ Error al cargar datos en '{table_name}': {error_message}")
+        logger.error(f"❌ Error al guardar rechazos en '{config.REJECTS_TABLE}': {error_message}")
+
+def ensure_dirty_ranges_table(bind):
+    with _begin(bind) as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {quote_ident(config.DIRTY_RANGES_TABLE)} ("
+            "id bigserial PRIMARY KEY, table_name text NOT NULL, column_name text, "
+            "range_start date, range_end date, marked_at timestamptz NOT NULL DEFAULT now(), "
+            "refreshed text[] NOT NULL DEFAULT '{}');"
+        ))
+
+def mark_dirty(bind, table_name, column=None, ranges=None):
+    """
+    Registra en DIRTY_RANGES_TABLE qué filas de la tabla cambiaron: las de `column` dentro de
+    cada rango [desde, hasta) de `ranges`, o toda la tabla si no se indican rangos.
+    Las etapas posteriores a la carga (rollups) solo recalculan esos rangos.
+    Con una conexión, el registro queda en la misma transacción que la carga.
+    """
+    rows = [{"table_name": table_name, "column_name": column, "range_start": start, "range_end": end}
+            for start, end in ranges] if ranges is not None else [
+            {"table_name": table_name, "column_name": None, "range_start": None, "range_end": None}]
+    if not rows:
+        return
+    with _begin(bind) as conn:
+        ensure_dirty_ranges_table(conn)
+        conn.execute(text(
+            f"INSERT INTO {quote_ident(config.DIRTY_RANGES_TABLE)} (table_name, column_name, range_start, range_end) "
+            "VALUES (:table_name, :column_name, :range_start, :range_end);"
+        ), rows)
+
+def _write_frames(frames, table_name, conn):
+    """
+    Escribe todos los lotes en la transacción de `conn`.
+    Devuelve (filas escritas, métodos usados).
+    """
+    rows = 0
+    methods = set()
+    for frame in frames:
+        methods.add(_write_frame(frame, table_name, conn))
+        rows += len(frame)
+    return rows, '/'.join(sorted(methods))
+
+def _referencing_tables(conn, table_name):
+    """
+    Tablas que vacía un TRUNCATE ... CASCADE de `table_name`: las que la referencian con una
+    clave foránea, directa o indirectamente.
+    """
+    return conn.execute(text(
+        "WITH RECURSIVE refs(relid) AS ("
+        " SELECT conrelid FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(:table)"
+        " UNION SELECT c.conrelid FROM pg_constraint c JOIN refs ON c.confrelid = refs.relid WHERE c.contype = 'f')"
+        " SELECT DISTINCT relname FROM refs JOIN pg_class ON pg_class.oid = refs.relid"
+        " WHERE refs.relid <> to_regclass(:table) ORDER BY relname"
+    ), {"table": quote_ident(table_name)}).scalars().all()
+
+def _truncate_and_load(frames, table_name, engine, cascade=False):
+    """
+    TRUNCATE y carga en una sola transacción: si la carga falla, la tabla conserva sus datos.
+    Con `cascade`, las tablas vaciadas en cascada quedan registradas como recargadas (log de
+    cambios) y modificadas por completo (rollups).
+    """
+    with _reload_begin(engine) as conn:
+        cascaded = _referencing_tables(conn, table_name) if cascade else []
+        conn.execute(text(f"TRUNCATE TABLE {quote_ident(table_name)}{' CASCADE' if cascade else ''};"))
+        changes.record_reload(conn, table_name)
+        for referencing in cascaded:
+            logger.warning(f"⚠️ '{referencing}' se vació en cascada al recargar '{table_name}'.")
+            mark_dirty(conn, referencing)
+            changes.record_reload(conn, referencing)
+        return _write_frames(frames, table_name, conn)
+
+def _rename_staging_indexes(conn, table_name, staging_name):
+    """
+    Los índices creados por LIKE ... INCLUDING ALL se nombran a partir de la tabla staging;
+    tras el swap se renombran para que los nombres no vayan derivando entre ejecuciones.
+    """
+    rows = conn.execute(text(
+        "SELECT indexname FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = :table_name AND indexname LIKE :prefix"
+    ), {"table_name": table_name, "prefix": f"{staging_name}%"}).fetchall()
+    for (index_name,) in rows:
+        new_name = table_name + index_name[len(staging_name):]
+        conn.execute(text(f"ALTER INDEX {quote_ident(index_name)} RENAME TO {quote_ident(new_name)}"))
+
+def _grantee(name):
+    return 'PUBLIC' if name is None else quote_ident(name)
+
+def _copy_table_access(conn, table_name, staging_name):
+    """
+    LIKE ... INCLUDING ALL no copia el dueño, los permisos ni el comentario de la tabla:
+    se pasan de la tabla viva a staging antes del swap, para que p.ej. el rol de solo lectura
+    de Superset conserve su SELECT. Con políticas de RLS lanza ValueError (el swap cae a
+    TRUNCATE + INSERT, que conserva la tabla viva tal cual).
+    """
+    table, staging = quote_ident(table_name), quote_ident(staging_name)
+    live = conn.execute(text(
+        "SELECT pg_get_userbyid(c.relowner) AS owner, c.relacl IS NOT NULL AS has_acl, "
+        "c.relrowsecurity, c.relforcerowsecurity, obj_description(c.oid, 'pg_class') AS comment, "
+        "EXISTS (SELECT 1 FROM pg_policy p WHERE p.polrelid = c.oid) AS has_policies "
+        "FROM pg_class c WHERE c.oid = to_regclass(:name)"
+    ), {"name": table}).one()
+    if live.has_policies:
+        raise ValueError(f"'{table_name}' tiene políticas de seguridad por fila, que el swap no conserva")
+
+    conn.execute(text(f"ALTER TABLE {staging} OWNER TO {quote_ident(live.owner)};"))
+    if live.has_acl:
+        # El ACL explícito reemplaza al implícito del dueño: se parte de cero y se replica entrada por entrada
+        conn.execute(text(f"REVOKE ALL ON {staging} FROM PUBLIC, {quote_ident(live.owner)};"))
+        grants = conn.execute(text(
+            "SELECT r.rolname AS grantee, a.privilege_type, a.is_grantable "
+            "FROM pg_class c CROSS JOIN aclexplode(c.relacl) a LEFT JOIN pg_roles r ON r.oid = a.grantee "
+            "WHERE c.oid = to_regclass(:name)"
+        ), {"name": table}).fetchall()
+        for grant in grants:
+            option = " WITH GRANT OPTION" if grant.is_grantable else ""
+            conn.execute(text(f"GRANT {grant.privilege_type} ON {staging} TO {_grantee(grant.grantee)}{option};"))
+    column_grants = conn.execute(text(
+        "SELECT t.attname, r.rolname AS grantee, a.privilege_type, a.is_grantable "
+        "FROM pg_attribute t CROSS JOIN aclexplode(t.attacl) a LEFT JOIN pg_roles r ON r.oid = a.grantee "
+        "WHERE t.attrelid = to_regclass(:name) AND NOT t.attisdropped"
+    ), {"name": table}).fetchall()
+    for grant in column_grants:
+        option = " WITH GRANT OPTION" if grant.is_grantable else ""
+        conn.execute(text(
+            f"GRANT {grant.privilege_type} ({quote_ident(grant.attname)}) ON {staging} "
+            f"TO {_grantee(grant.grantee)}{option};"
+        ))
+    if live.relrowsecurity:
+        conn.execute(text(f"ALTER TABLE {staging} ENABLE ROW LEVEL SECURITY;"))
+    if live.relforcerowsecurity:
+        conn.execute(text(f"ALTER TABLE {staging} FORCE ROW LEVEL SECURITY;"))
+    if live.comment is not None:
+        conn.execute(text(f"COMMENT ON TABLE {staging} IS :comment;"), {"comment": live.comment})
+
+def _swap_load(frames, table_name, engine):
+    """
+    Carga en <tabla>__staging (con los mismos índices y defaults que la tabla viva) y luego
+    la intercambia con un RENAME dentro de una transacción corta. Los lectores siempre ven
+    la versión anterior completa o la nueva completa, nunca una tabla vacía o a medio cargar.
+
+    La tabla nueva hereda el dueño, los permisos y el comentario de la anterior (ver
+    _copy_table_access). Si el swap no es posible (p.ej. vistas o secuencias que dependen
+    de la tabla, o políticas de RLS), los datos
+    ya cargados en staging se pasan a la tabla viva con TRUNCATE + INSERT ... SELECT en una
+    sola transacción, sin volver a leer los lotes.
+    Devuelve (filas, métodos usados, 'swap' | 'truncate').
+    """
+    staging_name = f"{table_name}__staging"
+    old_name = f"{table_name}__old"
+    table, staging = quote_ident(table_name), quote_ident(staging_name)
+
+    with _reload_begin(engine) as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging};"))
+        conn.execute(text(f"CREATE TABLE {staging} (LIKE {table} INCLUDING ALL);"))
+    try:
+        with _reload_begin(engine) as conn:
+            rows, used_method = _write_frames(frames, staging_name, conn)
+        with _reload_begin(engine) as conn:
+            conn.execute(text(f"ANALYZE {staging};"))
+
+        try:
+            # Swap: solo esta transacción toma el lock exclusivo sobre la tabla viva
+            with _reload_begin(engine) as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{config.SWAP_LOCK_TIMEOUT}';"))
+                changes.record_diff(conn, table_name, table, staging)
+                _copy_table_access(conn, table_name, staging_name)
+                conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(old_name)};"))
+                conn.execute(text(f"ALTER TABLE {table} RENAME TO {quote_ident(old_name)};"))
+                conn.execute(text(f"ALTER TABLE {staging} RENAME TO {table};"))
+                conn.execute(text(f"DROP TABLE {quote_ident(old_name)};"))
+                _rename_staging_indexes(conn, table_name, staging_name)
+            return rows, used_method, 'swap'
+        except Exception as e:
+            error_message = str(e).split('\n')[0]
+            logger.warning(f"⚠️ No se pudo hacer swap de '{table_name}': {error_message}. Usando TRUNCATE + INSERT desde staging...")
+            with _reload_begin(engine) as conn:
+                changes.record_diff(conn, table_name, table, staging)
+                conn.execute(text(f"TRUNCATE TABLE {table};"))
+                conn.execute(text(f"INSERT INTO {table} SELECT * FROM {staging};"))
+            return rows, used_method, 'truncate'
+    finally:
+        with _reload_begin(engine) as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging};"))
+
+# ---- Tablas particionadas por mes (PARTITIONED_TABLES) ----
+def _month_start(value):
+    return value.replace(day=1)
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+def _months_between(start, end):
+    """
+    Meses (primer día) que se solapan con [start, end).
+    """
+    months, month = [], _month_start(start)
+    while month < end:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+def _frame_months(df, column):
+    values = pd.to_datetime(df[column]).dropna()
+    return sorted({period.start_time.date() for period in values.dt.to_period('M').unique()})
+
+def _partition_name(table_name, month):
+    return f"{table_name}_p{month:%Y%m}"
+
+def _relkind(conn, table_name):
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": quote_ident(table_name)}
+    ).scalar()
+
+def ensure_partitions(conn, table_name, column, months):
+    """
+    Crea las particiones mensuales que falten. Si la partición por defecto ya tenía filas
+    de ese mes, se mueven a la nueva partición (PostgreSQL no la crearía si no).
+    """
+    table, col = quote_ident(table_name), quote_ident(column)
+    default = quote_ident(f"{table_name}_default")
+    for month in sorted(set(months)):
+        name = _partition_name(table_name, month)
+        if _relkind(conn, name) is not None:
+            continue
+        bounds = {"start": month, "end": _next_month(month)}
+        in_month = f"{col} >= :start AND {col} < :end"
+        misplaced = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"), bounds).scalar()
+        if misplaced:
+            moved = quote_ident(f"{name}__moved")
+            conn.execute(text(f"CREATE TEMP TABLE {moved} (LIKE {table}) ON COMMIT DROP;"))
+            conn.execute(text(
+                f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) "
+                f"INSERT INTO {moved} SELECT * FROM moved;"
+            ), bounds)
+        conn.execute(text(
+            f"CREATE TABLE {quote_ident(name)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}');"
+        ))
+        if misplaced:
+            conn.execute(text(f"INSERT INTO {table} SELECT * FROM {moved};"))
+            conn.execute(text(f"DROP TABLE {moved};"))
+
+def prepare_partitioned(conn, table_name, column, df):
+    """
+    Deja lista la tabla particionada por rango mensual sobre `column`:
+    - si no existe, la crea con las columnas del DataFrame y una partición por defecto
+      (filas sin fecha),
+    - si existe como tabla común, la migra: la renombra, crea la particionada con las
+      mismas columnas, copia los datos, borra la anterior y recrea sus índices.
+    """
+    table, col = quote_ident(table_name), quote_ident(column)
+    default = quote_ident(f"{table_name}_default")
+    kind = _relkind(conn, table_name)
+    if kind == 'p':
+        return
+    if kind is None:
+        ddl = pd.io.sql.get_schema(df.head(0), table_name, con=conn, dtype=_sql_dtypes(df)).strip().rstrip(';')
+        conn.execute(text(f"{ddl} PARTITION BY RANGE ({col});"))
+        conn.execute(text(f"CREATE TABLE {default} PARTITION OF {table} DEFAULT;"))
+        logger.info(f"🧱 Tabla '{table_name}' creada particionada por mes sobre '{column}'.")
+        return
+
+    legacy_name = f"{table_name}__heap"
+    legacy = quote_ident(legacy_name)
+    logger.info(f"🧱 Migrando '{table_name}' a una tabla particionada por mes sobre '{column}'...")
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy};"))
+    conn.execute(text(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ({col});"))
+    conn.execute(text(f"CREATE TABLE {default} PARTITION OF {table} DEFAULT;"))
+    months = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', {col})::date FROM {legacy} WHERE {col} IS NOT NULL"
+    )).scalars().all()
+    ensure_partitions(conn, table_name, column, months)
+    rows = conn.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy};")).rowcount
+    indexes = _index_definitions(conn, legacy_name)
+    conn.execute(text(f"DROP TABLE {legacy};"))
+    # Los índices se crean después de copiar los datos (y ya sin la tabla anterior, que usaba sus nombres)
+    _create_indexes(conn, table_name, indexes)
+    logger.info(f"✅ '{table_name}' migrada: {rows} filas en {len(months)} particiones mensuales, {len(indexes)} índices.")
+
+def _index_definitions(conn, table_name):
+    """
+    Claves primarias, restricciones UNIQUE e índices secundarios de una tabla, para recrearlos
+    sobre otra: lista de (nombre, 'constraint' | 'index' | 'unique index', definición).
+    La definición de un índice empieza en USING (sin su nombre ni su tabla).
+    """
+    constraints = conn.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(:name) AND contype IN ('p', 'u') ORDER BY conname"
+    ), {"name": quote_ident(table_name)}).all()
+    indexes = conn.execute(text(
+        "SELECT c.relname, i.indisunique, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = to_regclass(:name) "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid) ORDER BY c.relname"
+    ), {"name": quote_ident(table_name)}).all()
+    definitions = [(name, 'constraint', definition) for name, definition in constraints]
+    for name, unique, definition in indexes:
+        # pg_get_indexdef: "CREATE [UNIQUE] INDEX nombre ON esquema.tabla USING método (...)"
+        definitions.append((name, 'unique index' if unique else 'index', 'USING' + definition.split(' USING', 1)[1]))
+    return definitions
+
+def _create_indexes(conn, table_name, definitions):
+    """
+    Recrea en la tabla las definiciones de _index_definitions. Las que PostgreSQL no admite
+    en una tabla particionada (p.ej. UNIQUE sin la columna de partición) se omiten con un aviso.
+    """
+    table = quote_ident(table_name)
+    for name, kind, definition in definitions:
+        if kind == 'constraint':
+            ddl = f"ALTER TABLE {table} ADD CONSTRAINT {quote_ident(name)} {definition};"
+        else:
+            ddl = f"CREATE {kind.upper()} {quote_ident(name)} ON {table} {definition};"
+        try:
+            with conn.begin_nested():
+                conn.execute(text(ddl))
+        except Exception as e:
+            error_message = str(e).split('\n')[0]
+            logger.warning(f"⚠️ No se pudo recrear '{name}' en '{table_name}': {error_message}")
+
+def _partitioned_load(first, frames, table_name, engine, column):
+    """
+    Reemplazo completo de una tabla particionada tocando solo los meses que cambiaron.
+
+    Los lotes se cargan en una tabla staging UNLOGGED; luego se compara un checksum por mes
+    (md5 de las filas) entre staging y la tabla viva, leyendo de la tabla viva solo las
+    particiones de los meses que trae la carga (un mes que ya no viene cambió si su partición
+    tiene filas). En una sola transacción se vacían con TRUNCATE solo las particiones de los
+    meses distintos y se rellenan desde staging.
+    Devuelve (filas, métodos usados, meses reemplazados).
+    """
+    staging_name = f"{table_name}__staging"
+    table, staging, col = quote_ident(table_name), quote_ident(staging_name), quote_ident(column)
+    with _reload_begin(engine) as conn:
+        prepare_partitioned(conn, table_name, column, first)
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging};"))
+        conn.execute(text(f"CREATE UNLOGGED TABLE {staging} (LIKE {table} INCLUDING DEFAULTS);"))
+    try:
+        with _reload_begin(engine) as conn:
+            rows, used_method = _write_frames(frames, staging_name, conn)
+
+        month_checksums = (
+            f"SELECT date_trunc('month', s.{col})::date AS month, "
+            f"md5(string_agg(md5(s::text), '' ORDER BY md5(s::text))) AS checksum FROM {{source}} s "
+            f"WHERE {{condition}} GROUP BY 1"
+        )
+        with _reload_begin(engine) as conn:
+            new = dict(conn.execute(text(month_checksums.format(source=staging, condition='true'))).all())
+            # En la tabla viva solo se leen las particiones de los meses que trae la carga; del
+            # resto basta saber si tienen filas (todas se borran, porque la carga es completa)
+            condition, params = _month_condition(column, list(new))
+            old = dict(conn.execute(text(month_checksums.format(source=table, condition=condition)), params).all())
+            for month in sorted(set(_partition_months(conn, table_name)) - set(new)):
+                partition = quote_ident(_partition_name(table_name, month))
+                if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {partition})")).scalar():
+                    old[month] = 'stale'
+            if None not in new and conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE {col} IS NULL)")).scalar():
+                old[None] = 'stale'
+            changed = sorted((month for month in set(new) | set(old) if new.get(month) != old.get(month)),
+                             key=lambda month: (month is None, month))
+            ensure_partitions(conn, table_name, column, [month for month in new if month is not None])
+            if changed:
+                _record_month_changes(conn, table_name, column, changed, table, staging)
+            for month in changed:
+                if month is None:
+                    # Filas sin fecha: viven en la partición por defecto
+                    conn.execute(text(f"DELETE FROM {table} WHERE {col} IS NULL;"))
+                    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {staging} WHERE {col} IS NULL;"))
+                    continue
+                conn.execute(text(f"TRUNCATE TABLE {quote_ident(_partition_name(table_name, month))};"))
+                conn.execute(text(
+                    f"INSERT INTO {table} SELECT * FROM {staging} WHERE {col} >= :start AND {col} < :end;"
+                ), {"start": month, "end": _next_month(month)})
+            mark_dirty(conn, table_name, column,
+                       [(month, _next_month(month)) for month in changed if month is not None])
+        logger.info(f"🧩 '{table_name}': {len(changed)} de {len(set(new) | set(old))} meses cambiaron.")
+        return rows, used_method, changed
+    finally:
+        with _reload_begin(engine) as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging};"))
+
+def _record_month_changes(conn, table_name, column, months, table, staging):
+    """
+    Registra en el log de cambios las diferencias entre la tabla viva y staging en los meses
+    que se van a reescribir (ver changes.record_diff). Una fila que cambió de mes figura en
+    ambos meses, así que se compara por clave sobre todos a la vez.
+    """
+    condition, params = _month_condition(column, months)
+    changes.record_diff(conn, table_name, table, staging, condition, params)
+
+def _month_condition(column, months):
+    """
+    Condición SQL (sobre el alias s) que cubre los meses indicados; None son las filas sin fecha.
+    Usa rangos sobre la columna para que PostgreSQL lea solo esas particiones.
+    Devuelve (condición, parámetros).
+    """
+    col = quote_ident(column)
+    conditions, params = [], {}
+    for position, month in enumerate(months):
+        if month is None:
+            conditions.append(f"s.{col} IS NULL")
+            continue
+        conditions.append(f"(s.{col} >= :start_{position} AND s.{col} < :end_{position})")
+        params.update({f"start_{position}": month, f"end_{position}": _next_month(month)})
+    return ' OR '.join(conditions) or 'false', params
+
+def _partition_months(conn, table_name):
+    """
+    Meses (primer día) con partición propia en la tabla particionada.
+    """
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": quote_ident(table_name)}).scalars()
+    prefix = f"{table_name}_p"
+    return [
+        date(int(name[-6:-2]), int(name[-2:]), 1)
+        for name in names
+        if name.startswith(prefix) and len(name) == len(prefix) + 6 and name[-6:].isdigit()
+    ]
+
+@metrics.instrument('load')
+def replace_table(data, table_name, engine, strategy=None, cascade=False):
+    """
+    Reemplaza el contenido completo de una tabla con un DataFrame o con un iterable
+    de DataFrames (lotes, p.ej. de una extracción en streaming). En lugar de un DataFrame
+    se acepta el Transformed de una transformación: sus rechazos se guardan en REJECTS_TABLE.
+
+    - 'swap' (por defecto, LOAD_STRATEGY): carga en <tabla>__staging y la intercambia con RENAME.
+      Si el swap no es posible (p.ej. vistas o secuencias que dependen de la tabla),
+      copia staging a la tabla viva con TRUNCATE + INSERT en una transacción.
+    - 'truncate': TRUNCATE + carga en una misma transacción. Obligatorio con `cascade=True`,
+      ya que un swap no arrastra las claves foráneas de otras tablas.
+
+    Si no hay datos (p.ej. falló la extracción) la tabla no se toca y devuelve False.
+    Devuelve True si la tabla quedó reemplazada. Registra y propaga los errores de la carga
+    (la tabla conserva sus datos anteriores).
+    """
+    strategy = strategy or config.LOAD_STRATEGY
+    if cascade:
+        strategy = 'truncate'
+
+    rejects = []
+    try:
+        first, frames = _frames(data, rejects)
+        if first is None:
+            logger.warning(f"⚠️ No hay datos para cargar en la tabla '{table_name}'. Se conservan los datos actuales.")
+            return False
+
+        partition_column = config.PARTITIONED_TABLES.get(table_name)
+        if partition_column and not cascade:
+            rows, used_method, changed = _partitioned_load(first, frames, table_name, engine, partition_column)
+            logger.info(
+                f"✅ Tabla '{table_name}' reemplazada por particiones ({rows} filas, {used_method}, "
+                f"{len(changed)} meses reescritos)."
+            )
+            metrics.add_rows(rows)
+            return True
+        if not table_exists(engine, table_name):
+            # Primera carga: no hay nada que intercambiar, la tabla se crea desde el DataFrame
+            with _reload_begin(engine) as conn:
+                rows, used_method = _write_frames(frames, table_name, conn)
+                changes.record_reload(conn, table_name)
+            logger.info(f"✅ Tabla '{table_name}' creada y cargada ({rows} filas, {used_method}).")
+            metrics.add_rows(rows)
+            mark_dirty(engine, table_name)
+            return True
+        if strategy == 'swap':
+            rows, used_method, applied = _swap_load(frames, table_name, engine)
+        else:
+            rows, used_method = _truncate_and_load(frames, table_name, engine, cascade=cascade)
+            applied = 'truncate'
+        logger.info(f"✅ Tabla '{table_name}' reemplazada mediante {applied} ({rows} filas, {used_method}).")
+        metrics.add_rows(rows)
+        mark_dirty(engine, table_name)
+        return True
+    except Exception as e:
+        error_message = str(e).split('\n')[0][:500]
+        logger.error(f"❌ Error al reemplazar datos en '{table_name}': {error_message}")
+        raise
+    finally:
+        store_rejects(rejects, engine)
+
+def replace_range(data, table_name, bind, column, start, end):
+    """
+    Reemplaza solo las filas con `column` en [start, end) por los datos recibidos
+    (DataFrame o lotes), en una sola transacción: DELETE del rango + carga.
+    Sin datos, el rango queda vacío. Crea la tabla si no existe.
+    Devuelve (filas escritas, métodos usados). Propaga los errores.
+    """
+    first, frames = _frames(data)
+    with _begin(bind) as conn:
+        partition_column = config.PARTITIONED_TABLES.get(table_name)
+        if partition_column and first is not None:
+            prepare_partitioned(conn, table_name, partition_column, first)
+            if partition_column == column:
+                ensure_partitions(conn, table_name, column, _months_between(start, end))
+            else:
+                ensure_partitions(conn, table_name, partition_column, _frame_months(first, partition_column))
+        if table_exists(conn, table_name):
+            conn.execute(
+                text(f"DELETE FROM {quote_ident(table_name)} "
+                     f"WHERE {quote_ident(column)} >= :start AND {quote_ident(column)} < :end;"),
+                {"start": start, "end": end},
+            )
+        mark_dirty(conn, table_name, column, [(start, end)])
+        if first is None:
+            return 0, 'none'
+        return _write_frames(frames, table_name, conn)
+
+def row_hashes(df):
+    """
+    Hash (int64) del contenido de cada fila, estable entre ejecuciones.
+    Las columnas numéricas se normalizan a float64 para que un mismo valor no cambie
+    de hash según si su lote trae nulos (int64 vs float64).
+    """
+    normalized = pd.DataFrame({
+        col: (df[col].to_numpy(dtype='float64', na_value=np.nan)
+              if is_numeric_dtype(df[col]) and not is_bool_dtype(df[col]) else df[col])
+        for col in df.columns
+    }, index=df.index)
+    return pd.util.hash_pandas_object(normalized, index=False).astype('int64')
+
+@metrics.instrument('load')
+def upsert_data(data, table_name, engine, key='id', hash_column='row_hash'):
+    """
+    Sincroniza la tabla con un DataFrame (o un iterable de lotes) escribiendo solo lo que cambió:
+
+    - calcula un hash por fila y lo compara con la columna `hash_column` guardada,
+    - hace INSERT ... ON CONFLICT (key) DO UPDATE solo de las filas nuevas o modificadas,
+    - borra las claves que ya no vienen en los datos, salvo que haya registros rechazados por
+      la validación (su clave falta en los datos pero no se dio de baja).
+
+    Los lotes se copian a una tabla temporal (sin WAL) y la comparación se hace en SQL.
+    Crea la columna de hash y un índice único sobre `key` si no existen.
+    Devuelve un dict con los conteos 'inserted', 'updated' y 'deleted'. Propaga los errores.
+    """
+    rejects = []
+    try:
+        return _upsert_frames(data, table_name, engine, key, hash_column, rejects)
+    finally:
+        store_rejects(rejects, engine)
+
+def _upsert_frames(data, table_name, engine, key, hash_column, rejects):
+    first, frames = _frames(data, rejects)
+    if first is None:
+        # Sin datos no se borra nada: una extracción fallida no debe vaciar la tabla
+        logger.warning(f"⚠️ No hay datos para sincronizar en la tabla '{table_name}'.")
+        return {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+    def hashed(frame):
+        frame = frame.drop(columns=[hash_column], errors='ignore')
+        return frame.assign(**{hash_column: row_hashes(frame)})
+    frames = (hashed(frame) for frame in frames)
+
+    if not table_exists(engine, table_name):
+        with engine.begin() as conn:
+            rows, _ = _write_frames(frames, table_name, conn)
+            mark_dirty(conn, table_name)
+            changes.record_reload(conn, table_name)
+        metrics.add_rows(rows)
+        return {'inserted': rows, 'updated': 0, 'deleted': 0}
+
+    table, key_column, hash_col = quote_ident(table_name), quote_ident(key), quote_ident(hash_column)
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {hash_col} bigint;"))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {quote_ident(f'{table_name}_{key}_key')} ON {table} ({key_column});"
+        ))
+
+    staging_name = f"{table_name}__upsert"
+    staging = quote_ident(staging_name)
+    columns = [quote_ident(col) for col in list(first.drop(columns=[hash_column], errors='ignore').columns) + [hash_column]]
+    column_list = ', '.join(columns)
+    updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in columns if col != key_column)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;"))
+        for frame in frames:
+            copy_frame(frame, staging_name, conn)
+            metrics.add_rows(len(frame))
+
+        # Claves repetidas en el payload: gana la última recibida (orden físico de la tabla temporal).
+        # Las claves escritas y borradas quedan en el log de cambios (ver etl_script/changes.py)
+        counts = changes.record_returning(conn, table_name,
+            f"INSERT INTO {table} AS t ({column_list}) "
+            f"SELECT DISTINCT ON ({key_column}) {column_list} FROM {staging} ORDER BY {key_column}, ctid DESC "
+            f"ON CONFLICT ({key_column}) DO UPDATE SET {updates} "
+            f"WHERE t.{hash_col} IS DISTINCT FROM EXCLUDED.{hash_col} "
+            f"RETURNING t.{key_column} AS key, CASE WHEN xmax = 0 THEN 'insert' ELSE 'update' END AS op",
+            announce=False,
+        )
+        if rejects:
+            # Un registro rechazado falta en staging pero sigue existiendo en la API: con rechazos
+            # no se borra nada y las bajas se aplican en la próxima sincronización sin rechazos
+            logger.warning(
+                f"⚠️ {sum(len(frame) for frame in rejects)} registros rechazados: no se borran de '{table_name}' las claves ausentes en esta sincronización."
+            )
+        else:
+            counts += changes.record_returning(conn, table_name,
+                f"DELETE FROM {table} AS t WHERE NOT EXISTS "
+                f"(SELECT 1 FROM {staging} s WHERE s.{key_column} = t.{key_column}) "
+                f"RETURNING t.{key_column} AS key, 'delete' AS op",
+                announce=False,
+            )
+        if counts:
+            mark_dirty(conn, table_name)
+            changes.notify(conn, table_name, counts)
+
+    return {'inserted': counts['insert'], 'updated': counts['update'], 'deleted': counts['delete']}
 
 def load_activities_hours_by_department(df, engine):
     load_data(df, 'activities_hours_by_department', engine, if_exists='append')
@@ -27,4 +859,3 @@ def load_monthly_satisfaction_average(df, engine):
     Carga los datos de satisfacción mensual promedio en la base de datos.
     """
     load_data(df, 'monthly_satisfaction_average', engine, if_exists='append')
-
@@ -0,0 +1,128 @@
+# etl_script/locks.py
+"""
+Coordinación entre ejecuciones con advisory locks de PostgreSQL.
+
+Cada job toma un lock de sesión (pg_try_advisory_lock) con clave propia, en una conexión
+dedicada que lo mantiene mientras el job corre; si el proceso muere, PostgreSQL libera
+el lock al cerrarse la conexión. Así dos ejecuciones solapadas (p.ej. cron cada 5 minutos
+con una API lenta) nunca reemplazan la misma tabla a la vez.
+
+Si el job ya está corriendo en otro proceso, según JOB_LOCK_MODE:
+- 'skip': la ejecución nueva lo omite.
+- 'coalesce': la ejecución nueva espera a que termine (hasta JOB_LOCK_TIMEOUT segundos) y
+  después lo corre una vez; si ya hay otra ejecución esperando, se omite, de modo que las
+  ejecuciones solapadas se agrupan en a lo sumo una pendiente.
+
+Las esperas, omisiones y timeouts se registran en LOCK_EVENTS_TABLE.
+"""
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from etl_script import config
+from etl_script.loader import quote_ident
+from etl_script.metrics import job_metrics
+
+logger = logging.getLogger(__name__)
+
+# Primer componente de la clave de los locks: separa los del ETL de otros usos de la base
+LOCK_NAMESPACE = "milldesk_etl"
+# Cada cuántos segundos se reintenta el lock mientras se espera
+POLL_SECONDS = 1.0
+
+class JobBusy(Exception):
+    """
+    El job se está ejecutando en otro proceso y esta ejecución se omite.
+    """
+
+def _try_lock(conn, key):
+    return conn.execute(
+        text("SELECT pg_try_advisory_lock(hashtext(:namespace), hashtext(:key))"),
+        {"namespace": LOCK_NAMESPACE, "key": key},
+    ).scalar()
+
+def _unlock(conn, key):
+    conn.execute(
+        text("SELECT pg_advisory_unlock(hashtext(:namespace), hashtext(:key))"),
+        {"namespace": LOCK_NAMESPACE, "key": key},
+    )
+
+def record_event(engine, job, event, wait_seconds=0.0):
+    """
+    Registra un evento de lock ('waited', 'skipped' o 'timeout'). Un fallo solo se registra en el log.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {quote_ident(config.LOCK_EVENTS_TABLE)} ("
+                "job text NOT NULL, event text NOT NULL, wait_seconds double precision NOT NULL, "
+                "pid integer, host text, at timestamptz NOT NULL DEFAULT now());"
+            ))
+            conn.execute(
+                text(f"INSERT INTO {quote_ident(config.LOCK_EVENTS_TABLE)} (job, event, wait_seconds, pid, host) "
+                     "VALUES (:job, :event, :wait_seconds, :pid, :host);"),
+                {"job": job, "event": event, "wait_seconds": wait_seconds,
+                 "pid": os.getpid(), "host": socket.gethostname()},
+            )
+    except Exception as e:
+        error_message = str(e).split('\n')[0]
+        logger.error(f"❌ Error al registrar el evento de lock '{event}' de '{job}': {error_message}")
+
+def _wait_for_lock(conn, job, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        if _try_lock(conn, job):
+            return True
+    return False
+
+@contextmanager
+def job_lock(engine, job, mode=None, timeout=None):
+    """
+    Mantiene el lock del job durante el bloque. Lanza JobBusy si el job sigue corriendo
+    en otro proceso y esta ejecución debe omitirse (ver JOB_LOCK_MODE).
+    """
+    mode = mode or config.JOB_LOCK_MODE
+    timeout = config.JOB_LOCK_TIMEOUT if timeout is None else timeout
+    queue_key = f"{job}:queued"
+    # AUTOCOMMIT: la conexión no queda "idle in transaction" mientras corre el job
+    conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        if not _try_lock(conn, job):
+            if mode != 'coalesce' or not _try_lock(conn, queue_key):
+                record_event(engine, job, 'skipped')
+                raise JobBusy(f"'{job}' ya se está ejecutando en otro proceso: se omite esta ejecución.")
+            logger.info(f"⏳ [{job}] Ejecución anterior en curso: esperando a que termine (hasta {timeout:.0f}s)...")
+            start = time.monotonic()
+            try:
+                acquired = _wait_for_lock(conn, job, timeout)
+            finally:
+                _unlock(conn, queue_key)
+            waited = time.monotonic() - start
+            if not acquired:
+                record_event(engine, job, 'timeout', waited)
+                raise JobBusy(f"'{job}' siguió ocupado durante {waited:.0f}s: se omite esta ejecución.")
+            record_event(engine, job, 'waited', waited)
+            logger.info(f"🔓 [{job}] Lock obtenido tras esperar {waited:.1f}s.")
+        try:
+            yield
+        finally:
+            _unlock(conn, job)
+    finally:
+        conn.close()
+
+def run_locked(engine, job, fn, *args, **kwargs):
+    """
+    Ejecuta fn(engine, ...) con el lock del job y sus métricas (ver etl_script/metrics.py).
+    Si el job está ocupado en otro proceso, lo registra y devuelve None.
+    """
+    try:
+        with job_lock(engine, job), job_metrics(job):
+            return fn(engine, *args, **kwargs)
+    except JobBusy as e:
+        logger.warning(f"⏭️ [{job}] {e}")
+        return None
@@ -0,0 +1,216 @@
+# etl_script/main.py
+"""
+Orquestador del ETL: ejecuta todos los jobs en un solo proceso como un DAG.
+
+Los jobs independientes corren en paralelo y comparten el engine (pool de conexiones)
+y la sesión HTTP. Un job solo arranca cuando terminaron bien todos sus dependientes
+previos; si uno falla, los que dependen de él se omiten.
+
+Uso:
+    python -m etl_script.main                          # todos los jobs
+    python -m etl_script.main --jobs tickets_by_status tickets_sla_detalle
+    python -m etl_script.main --jobs tickets_sla_detalle --with-deps
+    python -m etl_script.main --list
+"""
+import argparse
+import contextvars
+import importlib
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Módulos propios (los que cargan pandas, SQLAlchemy o requests se importan al ejecutar,
+# para que --help y --list arranquen sin ellos)
+from etl_script import config
+from etl_script.logger import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Jobs del ETL y sus dependencias. "run" es "modulo:funcion" y se importa al ejecutar el job.
+# ticket_status hace TRUNCATE ... CASCADE, que también vacía las tablas de tickets que la
+# referencian: por eso corre antes que cualquier job que cargue esas tablas.
+JOBS = {
+    "ticket_status": {
+        "run": "etl_script.ticket_status:run",
+        "depends_on": [],
+    },
+    "tickets_by_status": {
+        "run": "etl_script.tickets_by_status:run",
+        "depends_on": ["ticket_status"],
+    },
+    "tickets_sla_detalle": {
+        "run": "etl_script.sla:build_sla_detail",
+        "depends_on": ["tickets_by_status"],
+    },
+    "tickets_per_period": {
+        "run": "etl_script.tickets_per_period:run",
+        "depends_on": ["ticket_status"],
+    },
+    "tickets_by_opening_time": {
+        "run": "etl_script.tickets_by_opening_time:run",
+        "depends_on": [],
+    },
+    "monthly_satisfaction_and_opened_closed": {
+        "run": "etl_script.monthly_satisfaction_and_opened_closed:run",
+        "depends_on": [],
+    },
+    "activities_hours_and_listTicketsActivities": {
+        "run": "etl_script.activities_hours_and_listTicketsActivities:run",
+        "depends_on": [],
+    },
+    "rollups": {
+        "run": "etl_script.rollups:refresh_rollups",
+        "depends_on": ["activities_hours_and_listTicketsActivities"],
+    },
+}
+
+def with_dependencies(names, jobs=JOBS):
+    """
+    Agrega a la selección todas las dependencias (transitivas) de los jobs indicados.
+    """
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(jobs[name]["depends_on"])
+    return selected
+
+def topological_order(names, jobs=JOBS):
+    """
+    Ordena los jobs seleccionados respetando sus dependencias.
+    Las dependencias que no están en la selección se consideran satisfechas.
+    Lanza ValueError si hay un ciclo.
+    """
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Ciclo en las dependencias de los jobs: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dependency in jobs[name]["depends_on"]:
+            if dependency in names:
+                visit(dependency, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in sorted(names):
+        visit(name, [])
+    return order
+
+def resolve(target):
+    """
+    Devuelve la función de un job: importa "modulo:funcion" en el primer uso (un callable se
+    devuelve tal cual).
+    """
+    if callable(target):
+        return target
+    module_name, _, attribute = target.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+def _run_job(name, run, engine):
+    """
+    Ejecuta un job con su lock entre procesos (ver etl_script/locks.py) y sus métricas.
+    """
+    from etl_script.locks import job_lock
+    from etl_script.metrics import job_metrics
+
+    with job_lock(engine, name), job_metrics(name):
+        return run(engine)
+
+def run_jobs(engine, names=None, max_workers=None, jobs=JOBS):
+    """
+    Ejecuta los jobs indicados (todos por defecto) en paralelo respetando el DAG.
+    Devuelve un dict {job: 'ok' | 'failed' | 'busy' | 'skipped'}: 'busy' si el job ya corría
+    en otro proceso, 'skipped' si falló u omitió una de sus dependencias.
+    """
+    from etl_script.locks import JobBusy
+
+    names = set(names or jobs)
+    unknown = names - set(jobs)
+    if unknown:
+        raise ValueError(f"Jobs desconocidos: {', '.join(sorted(unknown))}")
+    order = topological_order(names, jobs)
+    # Los módulos de los jobs se importan aquí, en un solo hilo, antes de lanzar ninguno
+    runs = {name: resolve(jobs[name]["run"]) for name in order}
+
+    results = {}
+    pending = list(order)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or config.ETL_MAX_WORKERS) as executor:
+        while pending or running:
+            for name in list(pending):
+                dependencies = [dep for dep in jobs[name]["depends_on"] if dep in names]
+                if any(results.get(dep) in ('failed', 'busy', 'skipped') for dep in dependencies):
+                    logger.warning(f"⏭️ [{name}] Se omite: una de sus dependencias falló o no se ejecutó.")
+                    results[name] = 'skipped'
+                    pending.remove(name)
+                elif all(results.get(dep) == 'ok' for dep in dependencies):
+                    logger.info(f"▶️ [{name}] Iniciando job...")
+                    # copy_context: el job hereda el run_id de quien llama (p.ej. el daemon)
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, _run_job, name, runs[name], engine)] = name
+                    pending.remove(name)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    results[name] = 'ok'
+                    logger.info(f"✅ [{name}] Job finalizado.")
+                except JobBusy as e:
+                    results[name] = 'busy'
+                    logger.warning(f"⏭️ [{name}] {e}")
+                except Exception as e:
+                    results[name] = 'failed'
+                    logger.error(f"❌ [{name}] Error en el job: {e}")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', nargs='+', choices=sorted(JOBS), help="Subconjunto de jobs a ejecutar")
+    parser.add_argument('--with-deps', action='store_true', help="Incluir las dependencias de los jobs seleccionados")
+    parser.add_argument('--max-workers', type=int, default=None, help="Jobs simultáneos (por defecto ETL_MAX_WORKERS)")
+    parser.add_argument('--list', action='store_true', help="Listar los jobs y sus dependencias")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in topological_order(set(JOBS)):
+            dependencies = ', '.join(JOBS[name]["depends_on"]) or '-'
+            print(f"{name}  (depende de: {dependencies})")
+        return 0
+
+    names = set(args.jobs or JOBS)
+    if args.with_deps:
+        names = with_dependencies(names)
+
+    from etl_script.api_client import close_session
+    from etl_script.db import get_engine
+    from etl_script.metrics import flush_metrics
+    from etl_script.transform_pool import shutdown_pool
+
+    setup_logging()
+    logger.info(f"🚀 Inicio del ETL: {', '.join(topological_order(names))}")
+    engine = get_engine()
+    try:
+        results = run_jobs(engine, names, max_workers=args.max_workers)
+        flush_metrics(engine)
+    finally:
+        close_session()
+        shutdown_pool()
+        engine.dispose()
+
+    summary = ', '.join(f"{name}={status}" for name, status in results.items())
+    logger.info(f"🏁 ETL finalizado: {summary}")
+    # Un job omitido porque otra ejecución lo tiene en curso no es un error
+    return 1 if 'failed' in results.values() else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+# etl_script/metrics.py
+"""
+Métricas de rendimiento por ejecución.
+
+Las funciones de extracción (fetch_data), transformación (transform_*) y carga
+(load_data, replace_table, upsert_data, load_slice) están decoradas con @instrument:
+cada llamada suma tiempo, filas y errores a la etapa del job en curso. api_client suma
+además los bytes descargados y los reintentos de tenacity. El job en curso se toma de
+una ContextVar (job_metrics) y se propaga a los hilos de trabajo con copy_context.
+
+Al terminar, flush_metrics guarda una fila por job/etapa/función en METRICS_TABLE y,
+si METRICS_TEXTFILE está definido, escribe un archivo para el textfile collector de
+node-exporter con los valores de la última ejecución de cada job. El daemon lanza cada
+job dentro de run_scope (su propio run_id) y guarda solo las métricas de esos jobs.
+"""
+import contextvars
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl_script import config
+from etl_script.schemas import Transformed
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage no se informa el pico de memoria
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+current_job = contextvars.ContextVar('current_job', default='etl')
+_current_span = contextvars.ContextVar('current_span', default=None)
+_current_run = contextvars.ContextVar('current_run', default=None)
+
+_lock = threading.Lock()
+_stages = {}
+_jobs = {}
+_run = {"id": uuid.uuid4().hex, "started_at": datetime.now(timezone.utc)}
+# Últimas filas exportadas de cada job, para que el textfile conserve los jobs que no se
+# guardaron en este flush
+_textfile_rows = {}
+
+def _empty_stage():
+    return {"calls": 0, "errors": 0, "wall_seconds": 0.0, "rows": 0, "bytes": 0, "retries": 0}
+
+def _job_entry(job):
+    return _jobs.setdefault(job, {"bytes": 0, "retries": 0, "wall_seconds": 0.0, "peak_rss_bytes": None})
+
+def reset():
+    """
+    Empieza una ejecución nueva (nuevo run_id, sin métricas acumuladas).
+    """
+    with _lock:
+        _stages.clear()
+        _jobs.clear()
+        _run.update(id=uuid.uuid4().hex, started_at=datetime.now(timezone.utc))
+
+def _run_info():
+    return _current_run.get() or _run
+
+def run_id():
+    """
+    Identificador de la ejecución en curso (cambia con reset o dentro de run_scope).
+    """
+    return _run_info()["id"]
+
+@contextmanager
+def run_scope():
+    """
+    Ejecución propia (nuevo run_id) para lo que se mida dentro del bloque, en este hilo y en
+    los que se lancen con copy_context. Permite guardar las métricas de un job mientras otros
+    siguen corriendo.
+    """
+    token = _current_run.set({"id": uuid.uuid4().hex, "started_at": datetime.now(timezone.utc)})
+    try:
+        yield
+    finally:
+        _current_run.reset(token)
+
+def peak_rss_bytes():
+    """
+    Pico de memoria residente del proceso desde que arrancó (ru_maxrss), no de un job:
+    en etl_script.main o en el daemon incluye lo que usaron los jobs anteriores o simultáneos.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+@contextmanager
+def job_metrics(name):
+    """
+    Atribuye al job `name` todo lo que se mida dentro del bloque (en este hilo y en los
+    que se lancen con copy_context) y registra su duración y el pico de memoria del proceso
+    (de todo el proceso hasta ese momento, ver peak_rss_bytes).
+    """
+    token = current_job.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry = _job_entry(name)
+            entry["wall_seconds"] += elapsed
+            entry["peak_rss_bytes"] = peak_rss_bytes()
+        current_job.reset(token)
+
+def _add(field, amount):
+    job = current_job.get()
+    span = _current_span.get()
+    with _lock:
+        if field in ("bytes", "retries"):
+            _job_entry(job)[field] += amount
+        if span is not None:
+            span[field] += amount
+
+def add_rows(rows):
+    """
+    Suma filas a la llamada instrumentada en curso (p.ej. filas cargadas desde lotes).
+    """
+    _add("rows", rows)
+
+def add_bytes(size):
+    _add("bytes", size)
+
+def add_retry():
+    _add("retries", 1)
+
+def _rows_of(value):
+    if isinstance(value, Transformed):
+        value = value.df
+    if isinstance(value, (pd.DataFrame, list)):
+        return len(value)
+    return 0
+
+def instrument(stage):
+    """
+    Decorador: mide cada llamada como parte de `stage` ('fetch', 'transform' o 'load').
+    Las filas salen del resultado (fetch/transform) o del DataFrame recibido (load), salvo
+    que la función las informe con add_rows.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            span = _empty_stage()
+            token = _current_span.set(span)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            except Exception:
+                span["errors"] += 1
+                raise
+            finally:
+                _current_span.reset(token)
+                span["wall_seconds"] = time.perf_counter() - start
+                span["calls"] = 1
+                if not span["rows"]:
+                    span["rows"] = _rows_of(args[0] if stage == 'load' and args else result)
+                _record_span(stage, fn.__name__, span)
+        return wrapper
+    return decorator
+
+def _record_span(stage, name, span):
+    key = (current_job.get(), stage, name)
+    with _lock:
+        totals = _stages.setdefault(key, _empty_stage())
+        for field, value in span.items():
+            totals[field] += value
+
+def record_call(stage, name, wall_seconds, rows=0, errors=0):
+    """
+    Registra una llamada medida fuera de este proceso (p.ej. una transformación en el
+    pool de procesos) como si hubiera pasado por @instrument.
+    """
+    _record_span(stage, name, dict(_empty_stage(), calls=1, wall_seconds=wall_seconds, rows=rows, errors=errors))
+
+def snapshot(jobs=None, discard=False):
+    """
+    Copia de las métricas acumuladas: (lista de filas por job/etapa/función, dict por job).
+    Con `jobs`, solo las de esos jobs; con `discard`, además se quitan de lo acumulado.
+    """
+    def selected(job):
+        return jobs is None or job in jobs
+
+    with _lock:
+        stages = [
+            {"job": key[0], "stage": key[1], "name": key[2], **values}
+            for key, values in sorted(_stages.items()) if selected(key[0])
+        ]
+        job_values = {job: dict(values) for job, values in _jobs.items() if selected(job)}
+        if discard:
+            for key in [key for key in _stages if selected(key[0])]:
+                del _stages[key]
+            for job in job_values:
+                del _jobs[job]
+    return stages, job_values
+
+def _metric_rows(jobs=None, discard=False):
+    stages, jobs = snapshot(jobs, discard)
+    rows = [dict(row, peak_rss_bytes=None) for row in stages]
+    for job, values in sorted(jobs.items()):
+        rows.append({
+            "job": job, "stage": "job", "name": job, "calls": 1, "errors": 0,
+            "wall_seconds": values["wall_seconds"], "rows": 0, "bytes": values["bytes"],
+            "retries": values["retries"], "peak_rss_bytes": values["peak_rss_bytes"],
+        })
+    return rows
+
+def write_textfile(path, rows):
+    """
+    Escribe las métricas en formato de exposición de Prometheus (escritura atómica,
+    como exige el textfile collector de node-exporter).
+    """
+    def labels(row):
+        return f'job="{row["job"]}",stage="{row["stage"]}",name="{row["name"]}"'
+
+    series = [
+        ("etl_stage_duration_seconds", "Tiempo total de la etapa en la última ejecución", "wall_seconds"),
+        ("etl_stage_calls", "Llamadas de la etapa en la última ejecución", "calls"),
+        ("etl_stage_errors", "Llamadas con error en la última ejecución", "errors"),
+        ("etl_stage_rows", "Filas procesadas por la etapa en la última ejecución", "rows"),
+        ("etl_stage_bytes", "Bytes descargados en la última ejecución", "bytes"),
+        ("etl_stage_retries", "Reintentos HTTP en la última ejecución", "retries"),
+        ("etl_process_peak_rss_bytes",
+         "Pico de memoria residente de todo el proceso desde su inicio (no solo del job), medido al terminar el job",
+         "peak_rss_bytes"),
+    ]
+    lines = []
+    for metric, description, field in series:
+        lines.append(f"# HELP {metric} {description}.")
+        lines.append(f"# TYPE {metric} gauge")
+        for row in rows:
+            if row[field] is not None and (field != "peak_rss_bytes" or row["stage"] == "job"):
+                lines.append(f"{metric}{{{labels(row)}}} {row[field]}")
+    lines.append("# HELP etl_last_run_timestamp_seconds Inicio de la última ejecución (epoch).")
+    lines.append("# TYPE etl_last_run_timestamp_seconds gauge")
+    lines.append(f"etl_last_run_timestamp_seconds {_run_info()['started_at'].timestamp():.0f}")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+def flush_metrics(engine, textfile=None, jobs=None):
+    """
+    Guarda las métricas de la ejecución en METRICS_TABLE y en el textfile de Prometheus.
+    Con `jobs` guarda solo las de esos jobs y las descarta, para que el próximo flush no
+    las repita. Un fallo aquí se registra pero no afecta al resultado del ETL.
+    """
+    rows = _metric_rows(jobs, discard=jobs is not None)
+    if not rows:
+        return
+    # El loader importa este módulo: quote_ident se importa al usarlo
+    from etl_script.loader import quote_ident
+
+    textfile = textfile or config.METRICS_TEXTFILE
+    run = _run_info()
+    table = quote_ident(config.METRICS_TABLE)
+    try:
+        df = pd.DataFrame(rows)
+        df.insert(0, "run_id", run["id"])
+        df.insert(1, "started_at", run["started_at"])
+        with engine.begin() as conn:
+            created = conn.execute(text("SELECT to_regclass(:name) IS NULL"), {"name": table}).scalar()
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "run_id text, started_at timestamptz, job text, stage text, name text, calls integer, "
+                "errors integer, wall_seconds double precision, rows bigint, bytes bigint, retries integer, "
+                "peak_rss_bytes bigint);"
+            ))
+            if created:
+                conn.execute(text(
+                    f"COMMENT ON COLUMN {table}.peak_rss_bytes IS "
+                    "'Pico de memoria residente de todo el proceso desde su inicio (ru_maxrss), no solo del job';"
+                ))
+            df.to_sql(config.METRICS_TABLE, conn, if_exists='append', index=False, method='multi')
+        logger.info(f"📈 Métricas de la ejecución {run['id']} guardadas en '{config.METRICS_TABLE}' ({len(df)} filas).")
+    except Exception as e:
+        error_message = str(e).split('\n')[0]
+        logger.error(f"❌ Error al guardar las métricas en '{config.METRICS_TABLE}': {error_message}")
+    if textfile:
+        with _lock:
+            for job in {row["job"] for row in rows}:
+                _textfile_rows[job] = [row for row in rows if row["job"] == job]
+            exported = [row for job in sorted(_textfile_rows) for row in _textfile_rows[job]]
+        try:
+            write_textfile(textfile, exported)
+        except OSError as e:
+            logger.error(f"❌ Error al escribir el textfile de métricas '{textfile}': {e}")
@@ -0,0 +1,250 @@
+# etl_script/pipeline.py
+"""
+Ejecutor extract → transform → load con etapas solapadas.
+
+Cada etapa tiene su propio pool de hilos y entre etapas hay colas acotadas: una tabla
+se carga mientras otra todavía se descarga, y si la carga va más lenta que la
+extracción, la cola llena frena a los extractores en lugar de acumular DataFrames
+en memoria.
+
+Una tarea es un dict con:
+- label, target_table, extract_fn, extract_kwargs, transform_fn (devuelve un Transformed:
+  el DataFrame y los rechazos de la validación, ver schemas.Transformed),
+- endpoint (opcional): se confirma en la caché de respuestas tras una carga exitosa,
+- stream (opcional): extract_fn devuelve lotes; se transforman y cargan de forma perezosa
+  dentro de la etapa de carga (la descarga en streaming cuenta como tiempo de carga). Con
+  TRANSFORM_PROCESSES > 0 los lotes se transforman en un pool de procesos (ver transform_pool),
+- load_fn (opcional): función (transformed, table_name, engine) -> bool, por defecto replace_table,
+- load_kwargs (opcional): argumentos extra para load_fn.
+
+run_pipeline devuelve un PipelineStats con tiempos por etapa y por tarea y la
+profundidad máxima de cada cola. Un error en una tarea no detiene a las demás: queda con
+estado 'failed' y el job lo informa con stats.raise_for_failures().
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from etl_script import response_cache
+from etl_script.transform_pool import map_batches
+from etl_script import config
+from etl_script.loader import replace_table
+from etl_script.response_cache import UNCHANGED
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("extract", "transform", "load")
+
+# Marca de fin de cola para los hilos de una etapa
+_DONE = object()
+
+class PipelineError(Exception):
+    """
+    Una o más tareas del pipeline terminaron con error.
+    """
+
+class PipelineStats:
+    """
+    Tiempos y profundidad de colas de una ejecución del pipeline (seguro entre hilos).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.stage_items = {stage: 0 for stage in STAGES}
+        self.max_queue_depth = {"transform": 0, "load": 0}
+        self.tasks = {}
+        self.started = time.perf_counter()
+        self.wall_seconds = None
+
+    def task(self, label):
+        return self.tasks.setdefault(label, {"status": "pending", "rows": None, **{stage: 0.0 for stage in STAGES}})
+
+    def record(self, stage, label, seconds):
+        with self.lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_items[stage] += 1
+            self.task(label)[stage] += seconds
+
+    def set_status(self, label, status, rows=None):
+        with self.lock:
+            entry = self.task(label)
+            entry["status"] = status
+            if rows is not None:
+                entry["rows"] = rows
+
+    def failed(self):
+        """
+        Tareas que terminaron con error (estado 'failed').
+        """
+        with self.lock:
+            return sorted(label for label, entry in self.tasks.items() if entry["status"] == "failed")
+
+    def raise_for_failures(self):
+        """
+        Lanza PipelineError si alguna tarea falló, para que el job se registre como fallido.
+        """
+        failed = self.failed()
+        if failed:
+            raise PipelineError(f"[{self.name}] {len(failed)} tarea(s) con error: {', '.join(failed)}")
+
+    def observe_queue(self, stage, depth):
+        with self.lock:
+            self.max_queue_depth[stage] = max(self.max_queue_depth[stage], depth)
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self.started
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "wall_seconds": self.wall_seconds,
+                "stage_seconds": dict(self.stage_seconds),
+                "stage_items": dict(self.stage_items),
+                "max_queue_depth": dict(self.max_queue_depth),
+                "tasks": {label: dict(entry) for label, entry in self.tasks.items()},
+            }
+
+    def log_summary(self):
+        stages = ', '.join(
+            f"{stage} {self.stage_seconds[stage]:.2f}s/{self.stage_items[stage]}" for stage in STAGES
+        )
+        queues = ', '.join(f"{stage} {depth}" for stage, depth in self.max_queue_depth.items())
+        logger.info(
+            f"📊 [{self.name}] {self.wall_seconds:.2f}s en total; etapas (tiempo/tareas): {stages}; "
+            f"cola máx.: {queues}."
+        )
+        failed = self.failed()
+        if failed:
+            logger.error(f"❌ [{self.name}] Tareas con error: {', '.join(failed)}")
+
+def _timed(stats, stage, label, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stats.record(stage, label, time.perf_counter() - start)
+
+def _put(stats, stage, target_queue, item):
+    target_queue.put(item)
+    stats.observe_queue(stage, target_queue.qsize())
+
+def _stream_frames(task, batches, stats):
+    """
+    Transforma los lotes a medida que la carga los consume, en orden.
+    Con el pool de procesos, el tiempo registrado es la espera por cada resultado.
+    """
+    label = task["label"]
+    start = time.perf_counter()
+    for frame in map_batches(task["transform_fn"], batches):
+        stats.record("transform", label, time.perf_counter() - start)
+        yield frame
+        start = time.perf_counter()
+
+def run_pipeline(tasks, engine, name="pipeline", extract_workers=None, transform_workers=None,
+                 load_workers=None, queue_size=None):
+    """
+    Ejecuta las tareas solapando extracción, transformación y carga.
+    Un error en una tarea se registra y no detiene a las demás; la tarea queda 'failed'
+    (ver PipelineStats.failed y raise_for_failures).
+    """
+    stats = PipelineStats(name)
+    if not tasks:
+        stats.finish()
+        return stats
+
+    queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+    extract_workers = extract_workers or min(len(tasks), config.HTTP_MAX_CONCURRENCY)
+    transform_workers = transform_workers or min(len(tasks), 2)
+    load_workers = load_workers or min(len(tasks), config.PIPELINE_LOAD_WORKERS)
+    to_transform = queue.Queue(maxsize=queue_size)
+    to_load = queue.Queue(maxsize=queue_size)
+
+    def extract(task):
+        label = task["label"]
+        try:
+            if task.get("stream"):
+                logger.info(f"[{label}] Extracción en streaming: se transforma y carga por lotes.")
+                batches = task["extract_fn"](**task.get("extract_kwargs", {}))
+                _put(stats, "load", to_load, (task, _stream_frames(task, batches, stats)))
+                return
+            logger.info(f"[{label}] Iniciando extracción...")
+            data = _timed(stats, "extract", label, task["extract_fn"], **task.get("extract_kwargs", {}))
+            if data is UNCHANGED:
+                logger.info(f"[{label}] Sin cambios desde la última carga. Se omiten transformación y carga.")
+                stats.set_status(label, "unchanged")
+                return
+            logger.info(f"[{label}] Extracción completa. Transformando datos...")
+            _put(stats, "transform", to_transform, (task, data))
+        except Exception as e:
+            logger.error(f"[{label}] Error en la extracción: {e}")
+            stats.set_status(label, "failed")
+
+    def transform_worker():
+        while True:
+            item = to_transform.get()
+            if item is _DONE:
+                return
+            task, data = item
+            label = task["label"]
+            try:
+                transformed = _timed(stats, "transform", label, task["transform_fn"], data)
+                logger.info(f"[{label}] Transformación completa. Filas obtenidas: {len(transformed.df)}")
+                _put(stats, "load", to_load, (task, transformed))
+            except Exception as e:
+                logger.error(f"[{label}] Error en la transformación: {e}")
+                stats.set_status(label, "failed")
+
+    def load_worker():
+        while True:
+            item = to_load.get()
+            if item is _DONE:
+                return
+            task, transformed = item
+            label, table_name = task["label"], task["target_table"]
+            load_fn = task.get("load_fn", replace_table)
+            try:
+                # replace_table conserva la tabla si no hay datos y guarda los rechazos igual
+                ok = _timed(stats, "load", label, load_fn, transformed, table_name, engine, **task.get("load_kwargs", {}))
+            except Exception as e:
+                logger.error(f"[{label}] Error en la carga de '{table_name}': {e}")
+                ok = False
+            if ok:
+                if task.get("endpoint"):
+                    response_cache.commit(task["endpoint"])
+                stats.set_status(label, "ok", rows=None if task.get("stream") else len(transformed.df))
+                logger.info(f"[{label}] Carga completada en '{table_name}'.")
+            else:
+                stats.set_status(label, "failed")
+
+    # Cada hilo corre en una copia del contexto para que las métricas se atribuyan al job
+    transformers = [threading.Thread(target=contextvars.copy_context().run, args=(transform_worker,),
+                                     name=f"{name}-transform-{i}", daemon=True)
+                    for i in range(transform_workers)]
+    loaders = [threading.Thread(target=contextvars.copy_context().run, args=(load_worker,),
+                                name=f"{name}-load-{i}", daemon=True)
+               for i in range(load_workers)]
+    for thread in transformers + loaders:
+        thread.start()
+
+    with ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix=f"{name}-extract") as executor:
+        contexts = [contextvars.copy_context() for _ in tasks]
+        list(executor.map(lambda context, task: context.run(extract, task), contexts, tasks))
+
+    # Cierre en orden: cada etapa termina cuando la anterior ya no puede producir más
+    for _ in transformers:
+        to_transform.put(_DONE)
+    for thread in transformers:
+        thread.join()
+    for _ in loaders:
+        to_load.put(_DONE)
+    for thread in loaders:
+        thread.join()
+
+    stats.finish()
+    stats.log_summary()
+    return stats
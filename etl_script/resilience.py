@@ -0,0 +1,182 @@
+# etl_script/resilience.py
+"""
+Protecciones de las llamadas a la API de Milldesk (usadas por api_client.make_request).
+
+- Limitador token bucket compartido por todo el proceso: como máximo HTTP_RATE_LIMIT
+  solicitudes por segundo en promedio, con ráfagas de hasta HTTP_RATE_BURST, sumando
+  todos los hilos (fetch_many, pipeline, jobs en paralelo).
+- Retry-After: ante un 429 (o un 503 con Retry-After) el limitador se pausa para todos
+  los hilos hasta que venza el plazo indicado por la API (como máximo RETRY_AFTER_MAX).
+- Circuit breaker por endpoint: tras CIRCUIT_FAILURE_THRESHOLD fallos seguidos (errores de
+  conexión, timeouts o 5xx) el endpoint se da por caído y las llamadas fallan al instante
+  con CircuitOpenError durante CIRCUIT_RESET_SECONDS; después se deja pasar una llamada de
+  prueba y, si responde bien, el circuito se cierra.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from requests.exceptions import HTTPError
+
+from etl_script import config
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """
+    El endpoint acumuló demasiados fallos seguidos: la llamada se corta sin tocar la red.
+    """
+
+class ThrottledError(HTTPError):
+    """
+    La API pidió bajar el ritmo (429, o 503 con Retry-After). `retry_after` en segundos.
+    """
+    def __init__(self, message, retry_after, response=None):
+        super().__init__(message, response=response)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Token bucket seguro entre hilos. `rate` tokens por segundo (0 o menos desactiva el límite).
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Bloquea hasta poder hacer una solicitud. Devuelve los segundos esperados.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.rate <= 0:
+                    return waited
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """
+        Detiene todas las solicitudes durante `seconds` (p.ej. por un Retry-After).
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            # Al reanudar no se dispara una ráfaga completa contra una API que acaba de pedir calma
+            self.tokens = min(self.tokens, 1.0)
+
+class CircuitBreaker:
+    """
+    Circuito de un endpoint: 'closed' (normal), 'open' (falla rápido) o 'half_open' (una llamada de prueba).
+    """
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+                self.probing = False
+            if self.state == 'half_open' and not self.probing:
+                self.probing = True
+                logger.info(f"🔌 [{self.name}] Circuito semiabierto: llamada de prueba.")
+                return
+            raise CircuitOpenError(
+                f"Circuito abierto para '{self.name}' tras {self.failures} fallos seguidos "
+                f"(reintento en {max(remaining, 0):.0f}s)."
+            )
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info(f"✅ [{self.name}] Circuito cerrado: el endpoint volvió a responder.")
+            self.state = 'closed'
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                if self.state == 'closed':
+                    logger.error(
+                        f"⛔ [{self.name}] Circuito abierto tras {self.failures} fallos seguidos: "
+                        f"las llamadas fallan sin esperar durante {self.reset_seconds:.0f}s."
+                    )
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+_lock = threading.Lock()
+_limiter = None
+_breakers = {}
+
+def rate_limiter():
+    """
+    Limitador compartido por el proceso (se crea con la configuración en el primer uso).
+    """
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = TokenBucket(config.HTTP_RATE_LIMIT, config.HTTP_RATE_BURST)
+        return _limiter
+
+def circuit_breaker(endpoint):
+    with _lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS)
+        return _breakers[endpoint]
+
+def reset():
+    """
+    Descarta el limitador y los circuitos (p.ej. tras cambiar la configuración).
+    """
+    global _limiter
+    with _lock:
+        _limiter = None
+        _breakers.clear()
+
+def parse_retry_after(value, default=1.0):
+    """
+    Segundos indicados por un encabezado Retry-After (número o fecha HTTP), acotados a RETRY_AFTER_MAX.
+    """
+    if not value:
+        seconds = default
+    else:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                seconds = default
+    return min(max(seconds, 0.0), config.RETRY_AFTER_MAX)
@@ -0,0 +1,116 @@
+# etl_script/response_cache.py
+"""
+Caché en disco de las respuestas de la API.
+
+Por cada endpoint (y parámetros) se guarda el hash del último body cargado y, si la API
+los envía, su ETag y Last-Modified. Mientras el TTL del endpoint (CACHE_TTLS) no venza,
+una respuesta 304 o con el mismo hash se informa como UNCHANGED y el job omite la
+transformación y la carga. Un hash nuevo queda pendiente hasta que el job confirma
+la carga con commit(): si la carga falla, la próxima ejecución vuelve a cargar.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from etl_script import config
+
+logger = logging.getLogger(__name__)
+
+class _Unchanged:
+    def __repr__(self):
+        return 'UNCHANGED'
+
+# Valor que devuelve api_client.fetch_data cuando la respuesta no cambió
+UNCHANGED = _Unchanged()
+
+_lock = threading.Lock()
+_pending = {}
+
+def _state_file():
+    # Se resuelve en cada uso: CACHE_DIR puede cambiar con config.reset_settings()
+    return Path(config.CACHE_DIR) / 'responses.json'
+
+def is_cached(endpoint):
+    return config.CACHE_TTLS.get(endpoint, 0) > 0
+
+def _key(endpoint, params=None):
+    if not params:
+        return endpoint
+    return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+def _load_state():
+    try:
+        with open(_state_file(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_state(state):
+    state_file = _state_file()
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica: otro proceso nunca lee un archivo a medio escribir
+    fd, tmp_path = tempfile.mkstemp(dir=state_file.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_file)
+
+def lookup(endpoint, params=None):
+    """
+    Devuelve la entrada guardada si sigue vigente según el TTL del endpoint; si no, None.
+    """
+    with _lock:
+        entry = _load_state().get(_key(endpoint, params))
+    if entry and time.time() - entry['loaded_at'] < config.CACHE_TTLS.get(endpoint, 0):
+        return entry
+    return None
+
+def conditional_headers(entry):
+    """
+    Cabeceras If-None-Match / If-Modified-Since para una entrada vigente.
+    """
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def stage(endpoint, params, body, headers, entry=None):
+    """
+    Compara el body recibido con la entrada vigente. Si es idéntico devuelve False
+    (sin cambios); si no, deja la nueva versión pendiente de commit() y devuelve True.
+    """
+    digest = hashlib.sha256(body).hexdigest()
+    if entry and entry.get('hash') == digest:
+        return False
+    with _lock:
+        _pending[_key(endpoint, params)] = {
+            'endpoint': endpoint,
+            'hash': digest,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+        }
+    return True
+
+def commit(endpoint):
+    """
+    Confirma que las respuestas pendientes del endpoint se cargaron correctamente.
+    """
+    with _lock:
+        keys = [key for key, entry in _pending.items() if entry['endpoint'] == endpoint]
+        if not keys:
+            return
+        state = _load_state()
+        for key in keys:
+            state[key] = dict(_pending.pop(key), loaded_at=time.time())
+        try:
+            _save_state(state)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar la caché de respuestas en '{_state_file()}': {e}")
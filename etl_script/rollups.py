@@ -0,0 +1,197 @@
+# etl_script/rollups.py
+"""
+Tablas resumen (rollups) para los dashboards de Superset.
+
+Cada rollup agrega una tabla cargada por el ETL por un período (día, semana o mes de su
+columna de fecha) y unas dimensiones, a partir de los minutos que ya calculan las
+transformaciones (charge_minutes / worked_minutes). Los gráficos leen unas pocas filas
+ya agregadas en lugar de recorrer la tabla completa en cada refresco.
+
+Tras cada carga, el loader registra en DIRTY_RANGES_TABLE los rangos de fechas que
+cambiaron (mark_dirty). refresh_rollups recalcula solo los períodos que tocan esos
+rangos; si una carga reemplazó la tabla completa (o el rollup todavía no existe), el
+rollup se reconstruye entero. Cada registro anota en `refreshed` los rollups que ya lo
+aplicaron y se borra, en la misma transacción, cuando lo aplicaron todos los rollups de
+su tabla (refresh_rollups puede actualizar solo algunos).
+"""
+import logging
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from etl_script import config
+from etl_script.loader import quote_ident, table_exists, ensure_dirty_ranges_table
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS = {
+    "rollup_activities_agent_day": {
+        "source": "ticket_activities",
+        "date_column": "start_date",
+        "grain": "day",
+        "dimensions": ["agent"],
+        "measures": {
+            "activities": "count(*)",
+            "charge_minutes": "sum(charge_minutes)",
+            "worked_minutes": "sum(worked_minutes)",
+        },
+    },
+    "rollup_activities_type_week": {
+        "source": "ticket_activities",
+        "date_column": "start_date",
+        "grain": "week",
+        "dimensions": ["typeofactivity"],
+        "measures": {
+            "activities": "count(*)",
+            "charge_minutes": "sum(charge_minutes)",
+            "worked_minutes": "sum(worked_minutes)",
+        },
+    },
+    "rollup_hours_contract_month": {
+        "source": "activities_hours_to_charge",
+        "date_column": "start_date",
+        "grain": "month",
+        "dimensions": ["contract"],
+        "measures": {
+            "activities": "count(*)",
+            "charge_minutes": "sum(charge_minutes)",
+            "cost": "sum(cost)",
+        },
+    },
+}
+
+def _align(start, end, grain):
+    """
+    Extiende [start, end) a períodos completos del grano del rollup.
+    """
+    if grain == 'week':
+        start = start - timedelta(days=start.weekday())
+        end = end + timedelta(days=(7 - end.weekday()) % 7)
+    elif grain == 'month':
+        start = start.replace(day=1)
+        if end.day != 1:
+            end = (end.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def _merge_ranges(ranges):
+    """
+    Une rangos [desde, hasta) que se solapan o se tocan.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _select(spec, bounded=False):
+    column = quote_ident(spec["date_column"])
+    dimensions = [quote_ident(dim) for dim in spec["dimensions"]]
+    measures = [f"{expression} AS {quote_ident(name)}" for name, expression in spec["measures"].items()]
+    where = f"{column} IS NOT NULL"
+    if bounded:
+        where += f" AND {column} >= :start AND {column} < :end"
+    return (
+        f"SELECT date_trunc('{spec['grain']}', {column})::date AS bucket, {', '.join(dimensions + measures)} "
+        f"FROM {quote_ident(spec['source'])} WHERE {where} "
+        f"GROUP BY {', '.join(['1'] + dimensions)}"
+    )
+
+def _rebuild(conn, name, spec):
+    rollup = quote_ident(name)
+    if not table_exists(conn, name):
+        conn.execute(text(f"CREATE TABLE {rollup} AS {_select(spec)} WITH NO DATA;"))
+        conn.execute(text(f"CREATE INDEX {quote_ident(f'{name}_bucket_idx')} ON {rollup} (bucket);"))
+    else:
+        conn.execute(text(f"TRUNCATE TABLE {rollup};"))
+    return conn.execute(text(f"INSERT INTO {rollup} {_select(spec)};")).rowcount
+
+def _refresh_ranges(conn, name, spec, ranges):
+    rollup = quote_ident(name)
+    rows = 0
+    for start, end in _merge_ranges(_align(start, end, spec["grain"]) for start, end in ranges):
+        bounds = {"start": start, "end": end}
+        conn.execute(text(f"DELETE FROM {rollup} WHERE bucket >= :start AND bucket < :end;"), bounds)
+        rows += conn.execute(text(f"INSERT INTO {rollup} {_select(spec, bounded=True)};"), bounds).rowcount
+    return rows
+
+def _refresh_source(engine, source, rollups):
+    """
+    Recalcula los rollups de una tabla de origen según los rangos pendientes de cada uno.
+    """
+    dirty = quote_ident(config.DIRTY_RANGES_TABLE)
+    with engine.begin() as conn:
+        if not table_exists(conn, source):
+            logger.warning(f"⚠️ La tabla '{source}' no existe todavía: se omiten sus rollups.")
+            return
+        marks = conn.execute(
+            text(f"SELECT id, column_name, range_start, range_end, refreshed FROM {dirty} "
+                 "WHERE table_name = :source ORDER BY id FOR UPDATE"),
+            {"source": source},
+        ).all()
+
+        for name, spec in rollups:
+            pending = [mark for mark in marks if name not in mark.refreshed]
+            full = not table_exists(conn, name) or any(
+                mark.range_start is None or mark.column_name != spec["date_column"] for mark in pending
+            )
+            if full:
+                rows = _rebuild(conn, name, spec)
+                logger.info(f"✅ Rollup '{name}' reconstruido ({rows} filas).")
+            elif pending:
+                ranges = [(mark.range_start, mark.range_end) for mark in pending]
+                rows = _refresh_ranges(conn, name, spec, ranges)
+                logger.info(f"✅ Rollup '{name}' actualizado en {len(_merge_ranges(ranges))} rangos ({rows} filas).")
+            else:
+                logger.info(f"♻️ Rollup '{name}' sin cambios en '{source}'.")
+            if pending:
+                conn.execute(
+                    text(f"UPDATE {dirty} SET refreshed = array_append(refreshed, :name) WHERE id = ANY(:ids);"),
+                    {"name": name, "ids": [mark.id for mark in pending]},
+                )
+
+        # Un rango se consume recién cuando lo aplicaron todos los rollups de su tabla
+        if marks:
+            everyone = [name for name, spec in ROLLUPS.items() if spec["source"] == source]
+            conn.execute(
+                text(f"DELETE FROM {dirty} WHERE id = ANY(:ids) AND refreshed @> CAST(:names AS text[]);"),
+                {"ids": [mark.id for mark in marks], "names": everyone},
+            )
+
+def refresh_rollups(engine, names=None):
+    """
+    Actualiza los rollups indicados (por defecto todos). Debe ejecutarse después de cargar
+    sus tablas de origen. Un error en una tabla de origen se registra y no detiene a las demás;
+    al terminar se lanza RuntimeError con las tablas de origen que fallaron.
+    """
+    names = names or list(ROLLUPS)
+    by_source = {}
+    for name in names:
+        by_source.setdefault(ROLLUPS[name]["source"], []).append((name, ROLLUPS[name]))
+
+    ensure_dirty_ranges_table(engine)
+    with engine.begin() as conn:
+        # Tablas creadas antes de que cada registro anotara los rollups que ya lo aplicaron
+        conn.execute(text(
+            f"ALTER TABLE {quote_ident(config.DIRTY_RANGES_TABLE)} "
+            "ADD COLUMN IF NOT EXISTS refreshed text[] NOT NULL DEFAULT '{}';"
+        ))
+    failed = []
+    for source, rollups in by_source.items():
+        try:
+            _refresh_source(engine, source, rollups)
+        except Exception as e:
+            error_message = str(e).split('\n')[0]
+            logger.error(f"❌ Error al actualizar los rollups de '{source}': {error_message}")
+            failed.append(source)
+
+    # Los rangos de tablas sin rollups no los consume nadie
+    sources = sorted({spec["source"] for spec in ROLLUPS.values()})
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"DELETE FROM {quote_ident(config.DIRTY_RANGES_TABLE)} WHERE NOT (table_name = ANY(:sources));"),
+            {"sources": sources},
+        )
+    if failed:
+        raise RuntimeError(f"No se pudieron actualizar los rollups de: {', '.join(failed)}")
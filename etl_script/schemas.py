@@ -0,0 +1,194 @@
+# etl_script/schemas.py
+"""
+Esquemas de los registros que devuelve cada endpoint de la API.
+
+Cada esquema declara:
+- keys: claves que todo registro debe traer (su valor puede ser null),
+- not_null: claves cuyo valor no puede ser null,
+- types: 'integer' o 'number' para valores que deben ser numéricos,
+- formats: formato strptime para valores que deben ser fechas,
+- dtypes: dtype compacto de cada columna ya transformada (nombres después de renombrar):
+  'category' para texto con pocos valores distintos, 'Int32'/'Int64' para ids y minutos,
+  'float32' para porcentajes y costos y 'time' para horas del día
+  (ver transformations.apply_dtypes).
+
+validate_records aplica el esquema a todo el lote de una vez y separa los registros
+inválidos (rechazos) en lugar de descartar la carga completa. Las transformaciones
+devuelven ambos juntos en un Transformed.
+"""
+import json
+import logging
+from collections import Counter
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_TICKET_KEYS = ['id', 'start', 'end', 'charge_hour', 'worked_hour', 'analysis', 'reopening',
+                'starttime', 'endtime', 'analysistime']
+
+_TICKET_DTYPES = {'id': 'Int64', 'status': 'category', 'requester': 'category'}
+
+SCHEMAS = {
+    "listTicketStatus": {
+        "keys": ['status', 'description', 'action'],
+        "not_null": ['status'],
+        "dtypes": {'status': 'category', 'action': 'category'},
+    },
+    "showTicketsByStatus": {
+        "keys": _TICKET_KEYS,
+        "not_null": ['id'],
+        "types": {'id': 'integer'},
+        "formats": {'start': '%d/%m/%Y'},
+        "dtypes": _TICKET_DTYPES,
+    },
+    "showTicketsPerPeriod": {
+        "keys": _TICKET_KEYS,
+        # Sin 'start' un ticket no se puede asignar a un tramo de la carga por períodos
+        "not_null": ['id', 'start'],
+        "types": {'id': 'integer'},
+        "formats": {'start': '%d/%m/%Y'},
+        "dtypes": _TICKET_DTYPES,
+    },
+    "openedVersusClosedMonthly": {
+        "keys": ['month', 'year', 'opened', 'closed'],
+        "not_null": ['month', 'year'],
+        "types": {'month': 'integer', 'year': 'integer', 'opened': 'integer', 'closed': 'integer'},
+        "dtypes": {'month': 'Int32', 'year': 'Int32', 'opened': 'Int32', 'closed': 'Int32'},
+    },
+    "ticketsByOpeningTime": {
+        "keys": ['hour', 'amount', 'percentage'],
+        "not_null": ['hour'],
+        "types": {'hour': 'integer', 'amount': 'integer', 'percentage': 'number'},
+        "dtypes": {'hour': 'Int32', 'amount': 'Int32', 'percentage': 'float32'},
+    },
+    "activitiesHoursByDepartment": {
+        "keys": ['department', 'worked_hour', 'charge_hour'],
+        "not_null": ['department'],
+        "dtypes": {'department': 'category', 'worked_minutes': 'Int32', 'charge_minutes': 'Int32'},
+    },
+    "monthlySatisfactionAverage": {
+        "keys": ['month', 'year', 'month_year', 'evaluation'],
+        "not_null": ['month', 'year'],
+        "types": {'month': 'integer', 'year': 'integer', 'evaluation': 'number'},
+        "dtypes": {'month': 'Int32', 'year': 'Int32', 'month_year': 'category'},
+    },
+    "listTicketsActivities": {
+        "keys": ['activity', 'description', 'id', 'ticket', 'agent', 'typeofactivity', 'start', 'end',
+                 'charge_hour', 'worked_hour', 'parts', 'id_ticket'],
+        "not_null": ['id'],
+        "types": {'id': 'integer', 'id_ticket': 'integer'},
+        "formats": {'start': '%d/%m/%Y'},
+        "dtypes": {'activity_id': 'Int64', 'id_ticket': 'Int64', 'activity': 'category', 'agent': 'category',
+                   'typeofactivity': 'category', 'charge_minutes': 'Int32', 'worked_minutes': 'Int32',
+                   'charge_hour': 'time', 'worked_hour': 'time'},
+    },
+    "activitiesHoursToCharge": {
+        "keys": ['id_ticket', 'location_id', 'ticket', 'activity', 'description', 'start', 'end', 'parts',
+                 'start_time', 'end_time', 'contract', 'agent', 'location', 'typeofactivity', 'requester',
+                 'cost', 'charge_hour'],
+        "types": {'id_ticket': 'integer', 'cost': 'number'},
+        "formats": {'start': '%d/%m/%Y'},
+        "dtypes": {'id_ticket': 'Int64', 'activity': 'category', 'contract': 'category', 'agent': 'category',
+                   'location': 'category', 'typeofactivity': 'category', 'requester': 'category',
+                   'charge_hour': 'category', 'cost': 'float32', 'charge_minutes': 'Int32',
+                   'start_time': 'time', 'end_time': 'time'},
+    },
+}
+
+def _present(series):
+    """
+    Valores informados: ni null ni cadena vacía.
+    """
+    return series.notna() & (series != '')
+
+def rejects_frame(endpoint, rejected):
+    """
+    DataFrame de rechazos a partir de pares (registro original, motivos).
+    """
+    return pd.DataFrame({
+        'endpoint': endpoint,
+        'reason': ['; '.join(reasons) for _, reasons in rejected],
+        'payload': [json.dumps(item, ensure_ascii=False, default=str) for item, _ in rejected],
+        'rejected_at': pd.Timestamp.now(),
+    }, columns=['endpoint', 'reason', 'payload', 'rejected_at'])
+
+class Transformed(NamedTuple):
+    """
+    Resultado de una transformación: el DataFrame a cargar y, aparte, los registros
+    rechazados (DataFrame de rejects_frame, o None). Los rechazos no viajan en df.attrs,
+    que pandas copia en profundidad en cada DataFrame derivado del lote.
+    """
+    df: pd.DataFrame
+    rejects: Optional[pd.DataFrame] = None
+
+def validate_records(data, endpoint):
+    """
+    Valida un lote de registros contra SCHEMAS[endpoint].
+
+    Las claves se revisan en una sola pasada y los nulos, tipos y formatos de forma
+    vectorizada sobre el DataFrame. Devuelve (DataFrame con los registros válidos,
+    DataFrame de rechazos con el motivo y el registro original). Registra cuántos
+    rechazos hubo por motivo.
+    """
+    schema = SCHEMAS[endpoint]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        logger.error(f"❌ [{endpoint}] Los datos recibidos no son una lista.")
+        return pd.DataFrame(), rejects_frame(endpoint, [(data, ['payload:no_es_lista'])])
+    if not data:
+        return pd.DataFrame(), rejects_frame(endpoint, [])
+
+    # 1) Claves: una sola pasada con comparación de conjuntos por registro
+    required = frozenset(schema["keys"])
+    reasons = {}
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            reasons[position] = ['type:registro']
+        elif not required <= item.keys():
+            reasons[position] = [f"missing:{key}" for key in sorted(required - item.keys())]
+
+    records = data
+    if any(reason == ['type:registro'] for reason in reasons.values()):
+        records = [item if isinstance(item, dict) else {} for item in data]
+    df = pd.DataFrame(records)
+    for key in schema["keys"]:
+        if key not in df.columns:
+            df[key] = None
+
+    # 2) Nulos, tipos y formatos: vectorizado sobre columnas completas
+    checks = {}
+    for col in schema.get("not_null", []):
+        checks[f"null:{col}"] = ~_present(df[col])
+    for col, kind in schema.get("types", {}).items():
+        present = _present(df[col])
+        numeric = pd.to_numeric(df[col], errors='coerce')
+        bad = present & numeric.isna()
+        if kind == 'integer':
+            bad |= present & numeric.notna() & (numeric % 1 != 0)
+        checks[f"type:{col}"] = bad
+    for col, date_format in schema.get("formats", {}).items():
+        parsed = pd.to_datetime(df[col], format=date_format, errors='coerce')
+        checks[f"format:{col}"] = _present(df[col]) & parsed.isna()
+
+    already_rejected = np.zeros(len(df), dtype=bool)
+    already_rejected[list(reasons)] = True
+    for name, mask in checks.items():
+        mask = mask.fillna(False).to_numpy(dtype=bool) & ~already_rejected
+        for position in np.flatnonzero(mask):
+            reasons.setdefault(int(position), []).append(name)
+
+    if not reasons:
+        return df, rejects_frame(endpoint, [])
+
+    counts = Counter(reason for row_reasons in reasons.values() for reason in row_reasons)
+    detail = ', '.join(f"{reason}={count}" for reason, count in counts.most_common())
+    logger.warning(f"⚠️ [{endpoint}] {len(reasons)} de {len(df)} registros rechazados ({detail}).")
+
+    rejected_positions = sorted(reasons)
+    rejects = rejects_frame(endpoint, [(data[position], reasons[position]) for position in rejected_positions])
+    valid = df.drop(index=df.index[rejected_positions]).reset_index(drop=True)
+    return valid, rejects
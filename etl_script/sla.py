@@ -0,0 +1,116 @@
+# etl_script/sla.py
+"""
+Detalle de SLA de los tickets (tickets_sla_detalle).
+
+El vencimiento se parsea una sola vez al transformar los tickets (columnas
+sla_expires_at y sla_expirado, ver transformations.add_sla_columns). Sobre ellas,
+tickets_sla_detalle es una vista: el estado y el tiempo restante se calculan al
+consultar, así Superset nunca lee valores desactualizados y no hay que regenerar nada
+después de cada carga. Solo se vuelven a escribir los tickets que cambiaron (upsert).
+
+Con LOAD_STRATEGY=swap y TICKETS_SYNC_MODE=full la vista impide borrar la tabla vieja
+en el intercambio, por lo que la recarga completa de 'tickets' usa TRUNCATE + carga.
+"""
+import hashlib
+import logging
+from sqlalchemy import text
+
+from etl_script import config
+from etl_script.loader import quote_ident, table_exists
+
+logger = logging.getLogger(__name__)
+
+SLA_VIEW = "tickets_sla_detalle"
+
+# Columnas tipadas que la transformación agrega a 'tickets'
+SLA_COLUMNS = {
+    "sla_expires_at": "timestamptz",
+    "sla_expirado": "boolean",
+}
+
+# Sin esquema: la vista usa la tabla 'tickets' del search_path, igual que el loader
+SLA_VIEW_QUERY = f"""
+    SELECT
+        t.id,
+        t.ticket,
+        t.requester,
+        t.status,
+        t.slasexpirationdate,
+        CASE
+            WHEN t.sla_expirado THEN 'SLA expirado (manual)'
+            WHEN t.sla_expires_at IS NULL THEN 'SIN FECHA VÁLIDA'
+            WHEN t.sla_expires_at < now() THEN 'VENCIDO'
+            ELSE 'DENTRO DE SLA'
+        END AS estado_sla,
+        date_trunc('second', r.restante) AS tiempo_restante_intervalo,
+        EXTRACT(DAY FROM COALESCE(r.restante, INTERVAL '0')) AS dias_restantes,
+        EXTRACT(HOUR FROM COALESCE(r.restante, INTERVAL '0')) AS horas_restantes,
+        EXTRACT(MINUTE FROM COALESCE(r.restante, INTERVAL '0')) AS minutos_restantes,
+        COALESCE(EXTRACT(SECOND FROM r.restante)::int, 0) AS segundos_restantes
+    FROM {quote_ident("tickets")} t
+    CROSS JOIN LATERAL (SELECT t.sla_expires_at - now() AS restante) r
+    WHERE t.slasexpirationdate IS NOT NULL
+"""
+
+# Comentario de la vista con la versión de su definición: si coincide, la vista está al día
+# y build_sla_detail no la recrea (CREATE OR REPLACE VIEW toma un AccessExclusiveLock que
+# espera detrás de las consultas largas de los tableros)
+SLA_VIEW_COMMENT = f"tickets_sla_detalle v{hashlib.md5(SLA_VIEW_QUERY.encode('utf-8')).hexdigest()[:12]}"
+
+def ensure_sla_columns(engine, table_name="tickets"):
+    """
+    Agrega las columnas de SLA a una tabla de tickets ya existente (creada antes de que
+    la transformación las generara). Si la tabla no existe, la primera carga la crea.
+    Un sla_expires_at sin zona (versiones anteriores) se convierte a timestamptz leyendo
+    sus valores en API_TIMEZONE; la vista se borra antes y build_sla_detail la recrea.
+    """
+    if not table_exists(engine, table_name):
+        return
+    with engine.begin() as conn:
+        for column, column_type in SLA_COLUMNS.items():
+            conn.execute(text(
+                f"ALTER TABLE {quote_ident(table_name)} ADD COLUMN IF NOT EXISTS {quote_ident(column)} {column_type};"
+            ))
+        column_type = conn.execute(text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = to_regclass(:table) AND attname = 'sla_expires_at'"
+        ), {"table": quote_ident(table_name)}).scalar()
+        if column_type == 'timestamp without time zone':
+            logger.info(f"🔧 Convirtiendo '{table_name}.sla_expires_at' a timestamptz ({config.API_TIMEZONE}).")
+            if conn.execute(text("SELECT relkind = 'v' FROM pg_class WHERE oid = to_regclass(:name)"),
+                            {"name": quote_ident(SLA_VIEW)}).scalar():
+                conn.execute(text(f"DROP VIEW {quote_ident(SLA_VIEW)};"))
+            conn.execute(text(
+                f"ALTER TABLE {quote_ident(table_name)} ALTER COLUMN sla_expires_at TYPE timestamptz "
+                f"USING sla_expires_at AT TIME ZONE :timezone;"
+            ), {"timezone": config.API_TIMEZONE})
+
+def build_sla_detail(engine):
+    """
+    Crea la vista 'tickets_sla_detalle' sobre 'tickets', o la actualiza si su comentario no
+    corresponde a la versión actual de SLA_VIEW_QUERY; si ya está al día no toma ningún lock.
+    Si existe la antigua tabla regenerada en cada carga, se reemplaza por la vista.
+    Debe ejecutarse después de cargar 'tickets'; es idempotente y no recorre los datos.
+    Registra y propaga los errores.
+    """
+    try:
+        if not table_exists(engine, "tickets"):
+            logger.warning(f"⚠️ La tabla 'tickets' no existe todavía: no se crea la vista '{SLA_VIEW}'.")
+            return
+        with engine.begin() as conn:
+            current = conn.execute(
+                text("SELECT relkind, obj_description(oid, 'pg_class') AS comment FROM pg_class WHERE oid = to_regclass(:name)"),
+                {"name": quote_ident(SLA_VIEW)},
+            ).one_or_none()
+            if current is not None and current.relkind == 'v' and current.comment == SLA_VIEW_COMMENT:
+                logger.info(f"♻️ Vista '{SLA_VIEW}' al día.")
+                return
+            if current is not None and current.relkind != 'v':
+                logger.info(f"🧹 Reemplazando la tabla '{SLA_VIEW}' por una vista.")
+                conn.execute(text(f"DROP TABLE {quote_ident(SLA_VIEW)};"))
+            conn.execute(text(f"CREATE OR REPLACE VIEW {quote_ident(SLA_VIEW)} AS {SLA_VIEW_QUERY};"))
+            conn.execute(text(f"COMMENT ON VIEW {quote_ident(SLA_VIEW)} IS :comment;"), {"comment": SLA_VIEW_COMMENT})
+        logger.info(f"✅ Vista '{SLA_VIEW}' creada o actualizada.")
+    except Exception as e:
+        logger.error(f"❌ Error al generar la vista '{SLA_VIEW}': {e}")
+        raise
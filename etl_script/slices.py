@@ -0,0 +1,201 @@
+# etl_script/slices.py
+"""
+Carga por tramos de fechas (slices).
+
+Un rango de fechas se divide en tramos de un día o de una semana (lunes a domingo,
+alineados al calendario para que un tramo sea el mismo en todas las ejecuciones).
+Por cada tramo cargado se guarda en SLICE_STATE_TABLE un checksum de sus filas y
+cuántas son. Así:
+
+- plan_slices decide qué tramos pedir a la API: los que nunca se cargaron, los recientes
+  (que todavía pueden cambiar) y aquellos cuyo conteo en la tabla ya no coincide con el
+  guardado (p.ej. tras un TRUNCATE ... CASCADE);
+- load_slice solo reescribe un tramo cuando su checksum cambió, reemplazando únicamente
+  las filas de ese rango de fechas;
+- prune_state borra el estado de los tramos que ya quedaron fuera de PERIOD_LOOKBACK_DAYS
+  y prune_rows las filas anteriores a PERIOD_RETENTION_DAYS, para que la tabla no crezca
+  sin límite.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from etl_script import config
+from etl_script.metrics import instrument
+from etl_script.loader import mark_dirty, quote_ident, table_exists, replace_range, row_hashes, store_rejects
+from etl_script.schemas import Transformed, rejects_frame
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('day', 'week')
+
+def make_slices(start, end, granularity='week'):
+    """
+    Divide [start, end] (fechas, ambos inclusive) en tramos alineados.
+    Devuelve una lista de (desde, hasta), ambos inclusive. El primer y el último tramo
+    semanal se extienden a la semana completa.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidad de tramo no soportada: {granularity}")
+    step = timedelta(days=1 if granularity == 'day' else 7)
+    current = start if granularity == 'day' else start - timedelta(days=start.weekday())
+    slices = []
+    while current <= end:
+        slices.append((current, current + step - timedelta(days=1)))
+        current += step
+    return slices
+
+def frame_checksum(df):
+    """
+    Checksum del contenido de un tramo, independiente del orden de las filas.
+    """
+    if df.empty:
+        return hashlib.sha256(b'').hexdigest()
+    hashes = np.sort(row_hashes(df).to_numpy())
+    columns = ','.join(sorted(map(str, df.columns))).encode('utf-8')
+    return hashlib.sha256(columns + hashes.tobytes()).hexdigest()
+
+def ensure_state_table(bind):
+    with bind.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {quote_ident(config.SLICE_STATE_TABLE)} ("
+            "dataset text NOT NULL, slice_start date NOT NULL, slice_end date NOT NULL, "
+            "checksum text NOT NULL, rows integer NOT NULL, loaded_at timestamptz NOT NULL DEFAULT now(), "
+            "PRIMARY KEY (dataset, slice_start));"
+        ))
+
+def load_state(engine, dataset):
+    """
+    Estado guardado de los tramos del dataset: {slice_start: {'slice_end', 'checksum', 'rows'}}.
+    """
+    ensure_state_table(engine)
+    with engine.connect() as conn:
+        result = conn.execute(
+            text(f"SELECT slice_start, slice_end, checksum, rows FROM {quote_ident(config.SLICE_STATE_TABLE)} "
+                 "WHERE dataset = :dataset"),
+            {"dataset": dataset},
+        )
+        return {row.slice_start: {"slice_end": row.slice_end, "checksum": row.checksum, "rows": row.rows}
+                for row in result}
+
+def prune_state(engine, dataset, before):
+    """
+    Borra el estado de los tramos del dataset que terminan antes de `before`. Devuelve cuántos.
+    """
+    ensure_state_table(engine)
+    with engine.begin() as conn:
+        pruned = conn.execute(
+            text(f"DELETE FROM {quote_ident(config.SLICE_STATE_TABLE)} WHERE dataset = :dataset AND slice_end < :before"),
+            {"dataset": dataset, "before": before},
+        ).rowcount
+    if pruned:
+        logger.info(f"🧹 [{dataset}] Estado de {pruned} tramos anteriores a {before} eliminado.")
+    return pruned
+
+def prune_rows(engine, table_name, column, before):
+    """
+    Borra las filas de la tabla con `column` anterior a `before`. Devuelve cuántas.
+    """
+    if not table_exists(engine, table_name):
+        return 0
+    with engine.begin() as conn:
+        oldest = conn.execute(text(f"SELECT min({quote_ident(column)})::date FROM {quote_ident(table_name)}")).scalar()
+        if oldest is None or oldest >= before:
+            return 0
+        deleted = conn.execute(
+            text(f"DELETE FROM {quote_ident(table_name)} WHERE {quote_ident(column)} < :before"),
+            {"before": before},
+        ).rowcount
+        mark_dirty(conn, table_name, column, [(oldest, before)])
+    logger.info(f"🧹 [{table_name}] {deleted} filas anteriores a {before} eliminadas.")
+    return deleted
+
+def count_rows(engine, table_name, column, granularity, start, end):
+    """
+    Filas actuales de la tabla por tramo en [start, end]: {slice_start: filas}.
+    """
+    if not table_exists(engine, table_name):
+        return {}
+    bucket = f"{quote_ident(column)}::date" if granularity == 'day' else f"date_trunc('week', {quote_ident(column)})::date"
+    with engine.connect() as conn:
+        result = conn.execute(
+            text(f"SELECT {bucket} AS slice_start, count(*) AS rows FROM {quote_ident(table_name)} "
+                 f"WHERE {quote_ident(column)} >= :start AND {quote_ident(column)} < :end GROUP BY 1"),
+            {"start": start, "end": end + timedelta(days=1)},
+        )
+        return {row.slice_start: row.rows for row in result}
+
+def plan_slices(engine, dataset, table_name, column, slices, granularity, refresh_from, fetch_all=False):
+    """
+    Elige los tramos a pedir. Devuelve una lista de (desde, hasta, forzar_recarga):
+    `forzar_recarga` es True cuando la tabla ya no tiene las filas registradas para el tramo,
+    de modo que se reescribe aunque el checksum no haya cambiado.
+    Con `fetch_all` se piden todos los tramos (backfill), pero solo se recargan los que cambiaron.
+    """
+    if not slices:
+        return []
+    state = load_state(engine, dataset)
+    counts = count_rows(engine, table_name, column, granularity, slices[0][0], slices[-1][1])
+    planned = []
+    for slice_start, slice_end in slices:
+        saved = state.get(slice_start)
+        drifted = saved is not None and counts.get(slice_start, 0) != saved["rows"]
+        if fetch_all or saved is None or drifted or slice_end >= refresh_from:
+            planned.append((slice_start, slice_end, drifted))
+    logger.info(
+        f"🗓️ [{dataset}] {len(planned)} de {len(slices)} tramos a consultar "
+        f"({sum(1 for *_, drifted in planned if drifted)} con filas faltantes o de más en '{table_name}')."
+    )
+    return planned
+
+@instrument('load')
+def load_slice(df, table_name, engine, dataset, column, slice_start, slice_end, force=False):
+    """
+    Carga un tramo: si su checksum coincide con el guardado (y no se fuerza), no escribe nada;
+    si no, reemplaza las filas del rango y actualiza el estado en la misma transacción.
+    Las filas fuera del tramo se guardan como rechazos (motivo 'range:<columna>').
+    Devuelve True si el tramo quedó al día. Propaga los errores.
+    """
+    # Con un Transformed, sus rechazos de validación se guardan junto con los del tramo
+    df, rejects = (df.df, [df.rejects]) if isinstance(df, Transformed) else (df, [])
+    try:
+        if not df.empty:
+            # Una fila fuera del rango no se borraría al recargar el tramo: se descarta
+            values = pd.to_datetime(df[column])
+            inside = (values >= pd.Timestamp(slice_start)) & (values < pd.Timestamp(slice_end + timedelta(days=1)))
+            if not inside.all():
+                logger.warning(
+                    f"⚠️ [{dataset}] {int((~inside).sum())} filas fuera del tramo {slice_start} a {slice_end} "
+                    f"descartadas (se guardan en '{config.REJECTS_TABLE}')."
+                )
+                rejects.append(rejects_frame(
+                    dataset, [(row, [f"range:{column}"]) for row in df[~inside].to_dict('records')]
+                ))
+                df = df[inside]
+        checksum = frame_checksum(df)
+        state_table = quote_ident(config.SLICE_STATE_TABLE)
+        with engine.begin() as conn:
+            saved = conn.execute(
+                text(f"SELECT checksum FROM {state_table} WHERE dataset = :dataset AND slice_start = :slice_start"),
+                {"dataset": dataset, "slice_start": slice_start},
+            ).scalar()
+            if saved == checksum and not force:
+                logger.info(f"♻️ [{dataset}] Tramo {slice_start} a {slice_end} sin cambios.")
+                return True
+            rows, used_method = replace_range(df, table_name, conn, column, slice_start, slice_end + timedelta(days=1))
+            conn.execute(
+                text(f"INSERT INTO {state_table} (dataset, slice_start, slice_end, checksum, rows, loaded_at) "
+                     "VALUES (:dataset, :slice_start, :slice_end, :checksum, :rows, now()) "
+                     "ON CONFLICT (dataset, slice_start) DO UPDATE SET slice_end = EXCLUDED.slice_end, "
+                     "checksum = EXCLUDED.checksum, rows = EXCLUDED.rows, loaded_at = EXCLUDED.loaded_at;"),
+                {"dataset": dataset, "slice_start": slice_start, "slice_end": slice_end,
+                 "checksum": checksum, "rows": rows},
+            )
+        logger.info(f"✅ [{dataset}] Tramo {slice_start} a {slice_end} recargado en '{table_name}' ({rows} filas, {used_method}).")
+        return True
+    finally:
+        store_rejects(rejects, engine)
@@ -1,118 +1,71 @@
 # etl_script/tickets_by_status.py
 import logging
-from sqlalchemy import text
+from requests.exceptions import RequestException
 
 # Módulos propios
 from etl_script.logger import setup_logging
 from etl_script.db import get_engine
-from etl_script.loader import load_data
+from etl_script.locks import run_locked
+from etl_script.metrics import flush_metrics
+from etl_script import config
+from etl_script.loader import replace_table, upsert_data
+from etl_script.sla import ensure_sla_columns, build_sla_detail
 from etl_script.transformations import transform_tickets
-from etl_script.api_client import get_tickets_by_status
+from etl_script.transform_pool import map_batches
+from etl_script.api_client import iter_tickets_by_status
 
-def main():
-    logger = setup_logging()
-    logger.info("🚀 Inicio del proceso ETL para tickets_by_status (y SLA)")
-
-    engine = get_engine()
+logger = logging.getLogger(__name__)
 
-    # 1) Extracción: Llamar al endpoint sin filtrar por estado (se obtiene toda la info)
-    logger.info("Iniciando extracción de tickets (todos los estados)...")
-    # Al pasar una cadena vacía, se genera la URL:
-    data = get_tickets_by_status("")
-    logger.info("Extracción completada. Transformando datos...")
+def _replace_tickets(batches, engine):
+    # replace_table propaga los errores de la carga; False significa que no llegaron datos
+    if not replace_table(batches, "tickets", engine):
+        raise RuntimeError("No se obtuvieron tickets para cargar: se conservan los datos actuales de 'tickets'.")
+    logger.info("Carga completada en la tabla 'tickets'.")
 
-    # 2) Transformación
-    df = transform_tickets(data)
-    logger.info(f"Transformación completada. Total de filas obtenidas: {len(df)}")
+def run(engine):
+    """
+    Extrae, transforma y carga la tabla 'tickets' usando un engine ya creado.
+    """
+    logger.info("🚀 Inicio del proceso ETL para tickets_by_status")
 
-    # 3) Truncar la tabla 'tickets'
-    with engine.begin() as conn:
-        logger.info("🧹 Truncando tabla: tickets...")
-        conn.execute(text("TRUNCATE TABLE tickets;"))
+    # 1) Extracción + 2) Transformación, en lotes leídos en streaming.
+    # Al pasar una cadena vacía se obtienen los tickets de todos los estados.
+    def transformed_batches():
+        logger.info("Iniciando extracción en streaming de tickets (todos los estados)...")
+        # Con TRANSFORM_PROCESSES > 0 los lotes se transforman en paralelo (ver transform_pool)
+        yield from map_batches(transform_tickets, iter_tickets_by_status(""))
 
-    # 4) Cargar datos
-    if df.empty:
-        logger.warning("DataFrame vacío. Se omite carga en 'tickets'.")
+    # 3) Cargar datos: incremental (solo filas que cambiaron) o reemplazo completo.
+    # Las columnas de SLA se agregan antes a una tabla creada por versiones anteriores.
+    ensure_sla_columns(engine)
+    if config.TICKETS_SYNC_MODE == 'incremental':
+        try:
+            counts = upsert_data(transformed_batches(), "tickets", engine, key="id")
+            logger.info(
+                f"✅ Sincronización incremental de 'tickets': {counts['inserted']} insertadas, "
+                f"{counts['updated']} actualizadas, {counts['deleted']} eliminadas."
+            )
+        except RequestException as e:
+            # Falló la extracción: no tiene sentido reintentar con una recarga completa
+            logger.error(f"❌ No se pudieron obtener los tickets: {e}. Se conservan los datos actuales.")
+            raise
+        except Exception as e:
+            error_message = str(e).split('\n')[0]
+            logger.warning(f"⚠️ Falló la sincronización incremental de 'tickets': {error_message}. Recargando completa...")
+            _replace_tickets(transformed_batches(), engine)
     else:
-        load_data(df, "tickets", engine)
-        logger.info("Carga completada en la tabla 'tickets'.")
-
-    # 5) Generar la tabla SLA (proceso sin cambios respecto a la versión anterior)
-    try:
-        logger.info("⏳ Generando la tabla 'tickets_sla_detalle' con los cálculos SLA...")
-        with engine.begin() as conn:
-            conn.execute(text("TRUNCATE TABLE tickets_sla_detalle;"))
+        _replace_tickets(transformed_batches(), engine)
 
-            insert_query = """
-                INSERT INTO tickets_sla_detalle (
-                    id,
-                    ticket,
-                    requester,
-                    status,
-                    slasexpirationdate,
-                    estado_sla,
-                    tiempo_restante_intervalo,
-                    dias_restantes,
-                    horas_restantes,
-                    minutos_restantes,
-                    segundos_restantes
-                )
-                SELECT
-                    t.id,
-                    t.ticket,
-                    t.requester,
-                    t.status,
-                    t.slasexpirationdate,
-                    CASE
-                       WHEN t.slasexpirationdate = 'SLA expirado' THEN 'SLA expirado (manual)'
-                       WHEN t.slasexpirationdate ~ '^\d{2}/\d{2}/\d{4}\s\d{2}:\d{2}$' THEN
-                         CASE 
-                            WHEN to_timestamp(t.slasexpirationdate, 'DD/MM/YYYY HH24:MI') < NOW() 
-                                 THEN 'VENCIDO'
-                            ELSE 'DENTRO DE SLA'
-                         END
-                       ELSE 'SIN FECHA VÁLIDA'
-                    END AS estado_sla,
-                    CASE
-                       WHEN t.slasexpirationdate ~ '^\d{2}/\d{2}/\d{4}\s\d{2}:\d{2}$'
-                       THEN date_trunc('second', to_timestamp(t.slasexpirationdate, 'DD/MM/YYYY HH24:MI') - NOW())
-                       ELSE NULL
-                    END AS tiempo_restante_intervalo,
-                    EXTRACT(DAY FROM (
-                      CASE 
-                         WHEN t.slasexpirationdate ~ '^\d{2}/\d{2}/\d{4}\s\d{2}:\d{2}$'
-                         THEN to_timestamp(t.slasexpirationdate, 'DD/MM/YYYY HH24:MI') - NOW()
-                         ELSE INTERVAL '0'
-                      END
-                    )) AS dias_restantes,
-                    EXTRACT(HOUR FROM (
-                      CASE 
-                         WHEN t.slasexpirationdate ~ '^\d{2}/\d{2}/\d{4}\s\d{2}:\d{2}$'
-                         THEN to_timestamp(t.slasexpirationdate, 'DD/MM/YYYY HH24:MI') - NOW()
-                         ELSE INTERVAL '0'
-                      END
-                    )) AS horas_restantes,
-                    EXTRACT(MINUTE FROM (
-                      CASE 
-                         WHEN t.slasexpirationdate ~ '^\d{2}/\d{2}/\d{4}\s\d{2}:\d{2}$'
-                         THEN to_timestamp(t.slasexpirationdate, 'DD/MM/YYYY HH24:MI') - NOW()
-                         ELSE INTERVAL '0'
-                      END
-                    )) AS minutos_restantes,
-                    CASE 
-                       WHEN t.slasexpirationdate ~ '^\d{2}/\d{2}/\d{4}\s\d{2}:\d{2}$'
-                       THEN (EXTRACT(SECOND FROM (to_timestamp(t.slasexpirationdate, 'DD/MM/YYYY HH24:MI') - NOW())))::int
-                       ELSE 0
-                    END AS segundos_restantes
-                FROM public.tickets t
-                WHERE t.slasexpirationdate IS NOT NULL
-                ORDER BY t.id DESC;
-            """
-            conn.execute(text(insert_query))
-        logger.info("✅ Tabla 'tickets_sla_detalle' generada con éxito.")
-    except Exception as e:
-        logger.error(f"❌ Error al generar la tabla 'tickets_sla_detalle': {e}")
+    logger.info("🏁 Proceso ETL finalizado para tickets_by_status.")
 
+def main():
+    setup_logging()
+    engine = get_engine()
+    try:
+        run_locked(engine, "tickets_by_status", run)
+        run_locked(engine, "tickets_sla_detalle", build_sla_detail)
+    finally:
+        flush_metrics(engine)
     logger.info("🏁 Proceso ETL finalizado para tickets_by_status (y SLA).")
 
 if __name__ == "__main__":
@@ -1,75 +1,134 @@
 # etl_script/tickets_per_period.py
+"""
+ETL de tickets_per_period.
 
+En modo 'sliced' (TICKETS_PER_PERIOD_MODE) el rango se divide en tramos de un día o una
+semana que se piden en paralelo; solo se consultan los tramos recientes o que faltan, y
+un tramo solo se reescribe si su checksum cambió (ver etl_script/slices.py).
+
+Backfill de un rango arbitrario:
+    python -m etl_script.tickets_per_period --start 2022-01-01 --end 2024-12-31
+    python -m etl_script.tickets_per_period --start 2024-01-01 --slice day --force
+"""
+import argparse
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from sqlalchemy import text
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 # Módulos propios
 from etl_script.logger import setup_logging
 from etl_script.db import get_engine
-from etl_script.loader import load_data
+from etl_script.locks import run_locked
+from etl_script.metrics import flush_metrics
+from etl_script import config
+from etl_script.pipeline import run_pipeline
+from etl_script.slices import make_slices, plan_slices, load_slice, prune_rows, prune_state
 from etl_script.transformations import transform_tickets_per_period
-from etl_script.api_client import get_tickets_per_period
+from etl_script.api_client import get_tickets_per_period, get_tickets_per_period_slice
 
-def main():
-    logger = setup_logging()
-    logger.info("🚀 Inicio del proceso ETL para tickets_per_period")
+logger = logging.getLogger(__name__)
 
-    engine = get_engine()
+TABLE_NAME = "tickets_per_period"
+DATE_COLUMN = "start"
 
-    # Parámetros de fechas
+def window_tasks():
+    """
+    Una sola tarea con los últimos PERIOD_LOOKBACK_DAYS días y reemplazo completo de la tabla.
+    """
     end_date = datetime.today().strftime('%Y-%m-%d')
-    start_date = (datetime.today() - timedelta(days=80)).strftime('%Y-%m-%d')
-
-    tasks = [
+    start_date = (datetime.today() - timedelta(days=config.PERIOD_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+    return [
         {
             "label": "tickets_per_period",
             "extract_fn": get_tickets_per_period,
             "extract_kwargs": {"start_date": start_date, "end_date": end_date},
             "transform_fn": transform_tickets_per_period,
-            "target_table": "tickets_per_period"
+            "target_table": TABLE_NAME
         }
     ]
 
-    # 2) Truncar tabla
-    with engine.begin() as conn:
-        logger.info("🧹 Truncando tabla: tickets_per_period...")
-        conn.execute(text("TRUNCATE TABLE tickets_per_period;"))
+def sliced_tasks(engine, start_date=None, end_date=None, granularity=None, force=False):
+    """
+    Una tarea por tramo a consultar. Sin fechas se cubren los últimos PERIOD_LOOKBACK_DAYS
+    días, se borra el estado de los tramos anteriores y las filas más antiguas que
+    PERIOD_RETENTION_DAYS; con fechas (backfill) se consultan todos los tramos del rango.
+    """
+    granularity = granularity or config.PERIOD_SLICE
+    today = date.today()
+    backfill = start_date is not None or end_date is not None
+    start_date = start_date or today - timedelta(days=config.PERIOD_LOOKBACK_DAYS)
+    end_date = end_date or today
 
-    # 3) fetch_transform
-    def fetch_transform(task):
-        label = task["label"]
-        logger.info(f"[{label}] Iniciando extracción...")
-        data = task["extract_fn"](**task["extract_kwargs"])
-        logger.info(f"[{label}] Extracción completa. Transformando datos...")
+    slices = make_slices(start_date, end_date, granularity)
+    if not backfill:
+        # Una ejecución normal ya no vuelve a mirar esos tramos; un backfill los recarga si hace falta
+        prune_state(engine, TABLE_NAME, slices[0][0])
+        retention_days = max(config.PERIOD_RETENTION_DAYS, config.PERIOD_LOOKBACK_DAYS)
+        retention_start = today - timedelta(days=retention_days)
+        prune_rows(engine, TABLE_NAME, DATE_COLUMN, make_slices(retention_start, retention_start, granularity)[0][0])
+    planned = plan_slices(
+        engine, TABLE_NAME, TABLE_NAME, DATE_COLUMN, slices, granularity,
+        refresh_from=today - timedelta(days=config.PERIOD_REFRESH_DAYS),
+        fetch_all=backfill or force,
+    )
+    return [
+        {
+            "label": f"tickets_per_period[{slice_start}]",
+            "extract_fn": get_tickets_per_period_slice,
+            "extract_kwargs": {"start_date": slice_start.isoformat(), "end_date": slice_end.isoformat()},
+            "transform_fn": transform_tickets_per_period,
+            "target_table": TABLE_NAME,
+            "load_fn": load_slice,
+            "load_kwargs": {
+                "dataset": TABLE_NAME,
+                "column": DATE_COLUMN,
+                "slice_start": slice_start,
+                "slice_end": slice_end,
+                "force": force or drifted,
+            },
+        }
+        for slice_start, slice_end, drifted in planned
+    ]
 
-        df = task["transform_fn"](data)
-        logger.info(f"[{label}] Transformación completa. Filas obtenidas: {len(df)}")
-        return (task["target_table"], df, label)
+def run(engine, start_date=None, end_date=None, granularity=None, force=False):
+    """
+    Extrae, transforma y carga los tickets por período (tickets_per_period) usando un engine ya creado.
+    Devuelve las estadísticas del pipeline; lanza PipelineError si alguna tarea falló.
+    """
+    logger.info("🚀 Inicio del proceso ETL para tickets_per_period")
 
-    # 4) Ejecutar en paralelo (solo 1 tarea, pero conservamos el patrón)
-    results = []
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future_to_label = {executor.submit(fetch_transform, t): t["label"] for t in tasks}
-        for future in as_completed(future_to_label):
-            label = future_to_label[future]
-            try:
-                table_name, df, label = future.result()
-                results.append((table_name, df, label))
-            except Exception as e:
-                logger.error(f"[{label}] Error en fetch_transform: {e}")
+    # 1) Tareas: un tramo por tarea, o una sola ventana en modo 'window'
+    if config.TICKETS_PER_PERIOD_MODE == 'window':
+        tasks = window_tasks()
+        load_workers = None
+    else:
+        tasks = sliced_tasks(engine, start_date, end_date, granularity, force)
+        # Las descargas van en paralelo; los tramos se escriben de a uno (la tabla
+        # puede no existir todavía y solo una carga debe crearla)
+        load_workers = 1
 
-    # 5) Cargar
-    for table_name, df, label in results:
-        if df.empty:
-            logger.warning(f"[{label}] DataFrame vacío. Se omite carga.")
-            continue
-        load_data(df, table_name, engine)
-        logger.info(f"[{label}] Carga completada en '{table_name}'.")
+    # 2) Extraer, transformar y cargar con etapas solapadas (ver etl_script/pipeline.py)
+    stats = run_pipeline(tasks, engine, name="tickets_per_period", load_workers=load_workers)
+    stats.raise_for_failures()
 
-    # 6) Sin SLA
+    # 3) Sin SLA
     logger.info("🏁 Proceso ETL finalizado para tickets_per_period.")
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', type=date.fromisoformat, help="Inicio del backfill (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, help="Fin del backfill (YYYY-MM-DD, por defecto hoy)")
+    parser.add_argument('--slice', choices=['day', 'week'], help="Tamaño de tramo (por defecto PERIOD_SLICE)")
+    parser.add_argument('--force', action='store_true', help="Recargar los tramos aunque su checksum no haya cambiado")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    engine = get_engine()
+    try:
+        run_locked(engine, "tickets_per_period", run,
+                   start_date=args.start, end_date=args.end, granularity=args.slice, force=args.force)
+    finally:
+        flush_metrics(engine)
 
 if __name__ == "__main__":
     main()
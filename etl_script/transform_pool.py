@@ -0,0 +1,182 @@
+# etl_script/transform_pool.py
+"""
+Transformación de lotes en un pool de procesos.
+
+Las transformaciones de los endpoints grandes (transform_ticket_activities,
+transform_activities_hours_to_charge, transform_tickets) hacen mucho trabajo en Python
+puro bajo el GIL: en hilos no corren en paralelo. Con TRANSFORM_PROCESSES > 0,
+map_batches reparte los lotes de una extracción en streaming entre procesos (spawn) y
+devuelve los resultados (Transformed) en el mismo orden que los lotes, mientras el proceso principal
+sigue leyendo los siguientes.
+
+Los lotes viajan como Arrow IPC (un buffer por columna en lugar de un pickle de miles de
+dicts). Los registros con las mismas claves, en el mismo orden, que el primero van en la
+tabla Arrow; los demás (mal formados, con otras claves o que no son objetos) van aparte con
+su posición, así el worker reconstruye exactamente el lote recibido de la API y la
+validación rechaza lo mismo que en el proceso principal. Si una columna mezcla tipos que
+Arrow no puede representar sin cambiarlos (p.ej. enteros y decimales), el lote viaja
+con pickle.
+
+Sin pyarrow (dependencia opcional) o con TRANSFORM_PROCESSES=0 los lotes se transforman
+en el mismo proceso, como antes.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import pyarrow as pa
+except ImportError:  # dependencia opcional: sin pyarrow no se usa el pool de procesos
+    pa = None
+
+from etl_script import config, metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pool = None
+_pool_size = 0
+_warned = False
+
+def _arrow_column(values):
+    """
+    Arreglo Arrow de tipo escalar que conserva exactamente los valores, o None si no se puede.
+    """
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return None
+    kind = array.type
+    if pa.types.is_floating(kind) and any(type(value) is int for value in values):
+        return None
+    if pa.types.is_string(kind) or pa.types.is_integer(kind) or pa.types.is_boolean(kind) \
+            or pa.types.is_floating(kind) or pa.types.is_null(kind):
+        return array
+    return None
+
+def encode_batch(batch):
+    """
+    Prepara un lote (lista de registros) para enviarlo a otro proceso:
+    ('arrow', buffer IPC, [(posición, registro), ...]) o ('pickle', lote).
+    """
+    first = next((item for item in batch if type(item) is dict), None) if isinstance(batch, list) else None
+    if pa is None or not first:
+        return ('pickle', batch)
+    keys = tuple(first)
+    regular, extras = [], []
+    for position, item in enumerate(batch):
+        if type(item) is dict and tuple(item) == keys:
+            regular.append(item)
+        else:
+            extras.append((position, item))
+
+    columns = []
+    for key in keys:
+        column = _arrow_column([item[key] for item in regular])
+        if column is None:
+            return ('pickle', batch)
+        columns.append(column)
+    table = pa.Table.from_arrays(columns, names=list(keys))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return ('arrow', sink.getvalue(), extras)
+
+def decode_batch(encoded):
+    """
+    Reconstruye el lote original a partir de encode_batch.
+    """
+    if encoded[0] == 'pickle':
+        return encoded[1]
+    _, buffer, extras = encoded
+    records = pa.ipc.open_stream(buffer).read_all().to_pylist()
+    for position, item in extras:
+        records.insert(position, item)
+    return records
+
+def _transform(transform_fn, encoded):
+    # Corre en el worker: devuelve el Transformed y los segundos de la transformación
+    batch = decode_batch(encoded)
+    started = time.perf_counter()
+    transformed = transform_fn(batch)
+    return transformed, time.perf_counter() - started
+
+def get_pool(processes):
+    """
+    Pool compartido por el proceso (se crea en el primer uso y se reutiliza entre jobs).
+    """
+    global _pool, _pool_size
+    with _lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: los hilos del pipeline no se heredan a medio usar, como pasaría con fork
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+            _pool_size = processes
+            logger.info(f"🧵 Pool de {processes} procesos para transformaciones iniciado.")
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+def _enabled(processes):
+    global _warned
+    if processes <= 0:
+        return False
+    if pa is None:
+        if not _warned:
+            logger.warning("⚠️ pyarrow no está instalado: las transformaciones se ejecutan en el mismo proceso.")
+            _warned = True
+        return False
+    return True
+
+def map_batches(transform_fn, batches, processes=None):
+    """
+    Aplica `transform_fn` a cada lote y entrega sus resultados en el orden de los lotes.
+
+    Con el pool (TRANSFORM_PROCESSES > 0 y pyarrow instalado) hay como máximo dos lotes
+    por proceso en vuelo, así la memoria no crece si la carga va más lenta que la lectura.
+    Los errores de una transformación se propagan igual que en el mismo proceso.
+    """
+    processes = config.TRANSFORM_PROCESSES if processes is None else processes
+    if not _enabled(processes):
+        for batch in batches:
+            yield transform_fn(batch)
+        return
+
+    pool = get_pool(processes)
+    name = getattr(transform_fn, '__name__', 'transform')
+    pending = deque()
+
+    def collect():
+        future = pending.popleft()
+        try:
+            transformed, seconds = future.result()
+        except BrokenProcessPool:
+            shutdown_pool()
+            raise
+        except Exception:
+            metrics.record_call('transform', name, 0.0, errors=1)
+            raise
+        # @instrument registró la llamada en el worker: se replica aquí para que cuente en el job
+        metrics.record_call('transform', name, seconds, rows=len(transformed.df))
+        return transformed
+
+    try:
+        for batch in batches:
+            pending.append(pool.submit(_transform, transform_fn, encode_batch(batch)))
+            if len(pending) >= processes * 2:
+                yield collect()
+        while pending:
+            yield collect()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -1,23 +1,14 @@
 # etl_script/transformations.py
+import numpy as np
 import pandas as pd
 import logging
+from datetime import time
 
-logger = logging.getLogger(__name__)
+from etl_script import config
+from etl_script.metrics import instrument
+from etl_script.schemas import SCHEMAS, Transformed, validate_records
 
-# ---- Validaciones genéricas ----
-def validate_data(data, expected_keys):
-    if not isinstance(data, list):
-        logger.error("❌ Los datos recibidos no son una lista.")
-        return False
-    for item in data:
-        if not all(key in item for key in expected_keys):
-            logger.error(f"❌ Faltan claves esperadas en el dato: {item}")
-            return False
-    return True
-
-def validate_activities_hours_data(data):
-    expected_keys = ['department', 'worked_hour', 'charge_hour']
-    return validate_data(data, expected_keys)
+logger = logging.getLogger(__name__)
 
 # ---- Transformaciones comunes ----
 def convert_date_columns(df, date_columns, date_format='%d/%m/%Y'):
@@ -44,13 +35,138 @@ def convert_numeric_columns(df, numeric_columns):
             df[col] = pd.NA
     return df
 
+# ---- Horas en formato HH:MM (vectorizado) ----
+# Objetos time precalculados para cada minuto del día: evita crear uno por celda
+_TIMES_OF_DAY = np.array([time(minute // 60, minute % 60) for minute in range(24 * 60)], dtype=object)
+
+def _split_duration_minutes(series, max_minutes=None):
+    """
+    Parsea 'HH:MM' -> minutos (float, NaN si es inválido) con operaciones de columna.
+    Con max_minutes, la parte de minutos no puede superarlo.
+    """
+    parts = series.astype('string').str.split(':', n=2, expand=True)
+    if parts.shape[1] < 2:
+        return pd.Series(np.nan, index=series.index)
+
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce')
+    valid = (hours >= 0) & (hours % 1 == 0) & (minutes >= 0) & (minutes % 1 == 0)
+    if max_minutes is not None:
+        valid &= minutes <= max_minutes
+    if parts.shape[1] > 2:
+        valid &= parts[2].isna()
+    return (hours * 60 + minutes).where(valid).astype('float64')
+
+def parse_duration_minutes(values, max_minutes=None):
+    """
+    Convierte duraciones 'HH:MM' a minutos (Int64) sobre toda la columna a la vez.
+    Admite horas >= 24 (horas trabajadas acumuladas) y, como el parser anterior, minutos
+    >= 60 ('1:75' -> 135) salvo que se indique max_minutes; nulos y valores inválidos
+    quedan como <NA>.
+
+    Las horas se repiten mucho, así que solo se parsean los valores distintos
+    (pd.factorize) y el resultado se expande con los códigos.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    codes, uniques = pd.factorize(series)
+    parsed = _split_duration_minutes(pd.Series(uniques, dtype=object), max_minutes).to_numpy(dtype='float64')
+    # El código -1 (nulo) apunta al NaN agregado al final
+    lookup = np.append(parsed, np.nan)
+    return pd.Series(lookup[codes], index=series.index).astype('Int64')
+
+def parse_time_of_day(values):
+    """
+    Convierte horas 'HH:MM' a objetos datetime.time (columna tipo time en PostgreSQL).
+    Valores fuera de 00:00-23:59, nulos o inválidos quedan como None.
+    """
+    minutes = parse_duration_minutes(values, max_minutes=59)
+    valid = (minutes < 24 * 60).fillna(False).to_numpy(dtype=bool)
+    result = np.full(len(minutes), None, dtype=object)
+    result[valid] = _TIMES_OF_DAY[minutes[valid].to_numpy(dtype='int64')]
+    return pd.Series(result, index=minutes.index)
+
+# ---- Dtypes compactos (SCHEMAS[endpoint]['dtypes']) ----
+# Tipo SQL con el que se crean las columnas cuyo dtype compacto no se traduce bien:
+# una categórica de horas quedaría como TEXT y float32 como REAL.
+_SQL_TYPES = {'time': 'time', 'float32': 'double precision'}
+
+def _to_integer(series, dtype):
+    numeric = pd.to_numeric(series, errors='coerce')
+    return numeric.where(numeric % 1 == 0).astype(dtype)
+
+def _to_time_category(series):
+    """
+    Horas del día como categórica de cadenas 'HH:MM:SS' (a lo sumo 1440 valores distintos).
+    """
+    categorical = series.astype('category')
+    return categorical.cat.rename_categories([str(value) for value in categorical.cat.categories])
+
+def apply_dtypes(df, endpoint):
+    """
+    Convierte las columnas a los dtypes compactos declarados para el endpoint y registra
+    la memoria del DataFrame antes y después (memory_usage(deep=True)).
+    Deja en df.attrs['sql_dtypes'] el tipo SQL de las columnas que lo necesitan para que
+    el loader cree la tabla con el tipo correcto.
+    """
+    dtypes = SCHEMAS[endpoint].get('dtypes', {})
+    if df.empty or not dtypes:
+        return df
+
+    before = df.memory_usage(deep=True).sum()
+    sql_dtypes = {}
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype in ('Int32', 'Int64'):
+            df[col] = _to_integer(df[col], dtype)
+        elif dtype == 'float32':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        elif dtype == 'time':
+            df[col] = _to_time_category(df[col])
+        if dtype in _SQL_TYPES:
+            sql_dtypes[col] = _SQL_TYPES[dtype]
+    df.attrs['sql_dtypes'] = sql_dtypes
+    after = df.memory_usage(deep=True).sum()
+    logger.info(
+        f"🧮 [{endpoint}] Memoria del DataFrame: {before / 1024 ** 2:.2f} MB -> {after / 1024 ** 2:.2f} MB "
+        f"({len(df)} filas)."
+    )
+    return df
+
+# ---- Vencimiento de SLA ----
+# Valor que la API envía en slasexpirationdate cuando el SLA se marcó como expirado a mano
+SLA_EXPIRED_LABEL = 'SLA expirado'
+
+def add_sla_columns(df, timestamp_format='%d/%m/%Y %H:%M'):
+    """
+    Parsea 'slasexpirationdate' una sola vez y agrega:
+    - sla_expires_at: fecha de vencimiento con la zona API_TIMEZONE (NaT si no es una fecha válida
+      o no existe en esa zona),
+    - sla_expirado: True si la API marcó el SLA como expirado.
+    La columna original se conserva tal cual.
+    """
+    if 'slasexpirationdate' in df.columns:
+        raw = df['slasexpirationdate']
+        df['sla_expires_at'] = pd.to_datetime(raw, format=timestamp_format, errors='coerce').dt.tz_localize(
+            config.API_TIMEZONE, ambiguous='NaT', nonexistent='NaT'
+        )
+        df['sla_expirado'] = (raw == SLA_EXPIRED_LABEL).fillna(False).astype(bool)
+    else:
+        df['sla_expires_at'] = pd.Series(pd.NaT, index=df.index, dtype=f"datetime64[ns, {config.API_TIMEZONE}]")
+        df['sla_expirado'] = False
+    return df
+
 # ---- Transformaciones específicas ----
-def transform_generic(data, expected_keys, rename_mapping=None, date_columns=None, timestamp_columns=None, numeric_columns=None):
-    if not validate_data(data, expected_keys):
-        logger.error(f"❌ Datos inválidos para transformación.")
-        return pd.DataFrame()
-    
-    df = pd.DataFrame(data)
+# Cada transformación devuelve un Transformed: el DataFrame a cargar y, aparte, los rechazos
+# de la validación, que el loader guarda en la tabla de rechazos junto con la carga
+def transform_generic(data, endpoint, rename_mapping=None, date_columns=None, timestamp_columns=None, numeric_columns=None):
+    df, rejects = validate_records(data, endpoint)
+    if df.empty:
+        if not rejects.empty:
+            logger.error(f"❌ [{endpoint}] Ningún registro válido para transformación.")
+        return Transformed(pd.DataFrame(), rejects)
     
     if rename_mapping:
         df = df.rename(columns=rename_mapping)
@@ -63,121 +179,93 @@ def transform_generic(data, expected_keys, rename_mapping=None, date_columns=Non
     
     if numeric_columns:
         df = convert_numeric_columns(df, numeric_columns)
-    
-    return df
 
+    df = apply_dtypes(df, endpoint)
+    return Transformed(df, rejects)
+
+@instrument('transform')
 def transform_ticket_status(data):
-    expected_keys = ['status', 'description', 'action']
-    return transform_generic(
-        data,
-        expected_keys=expected_keys
-    )
+    return transform_generic(data, "listTicketStatus")
 
+@instrument('transform')
 def transform_tickets(data):
     if not data:
         logger.warning("⚠️ No hay datos de tickets para transformar.")
-        return pd.DataFrame()
+        return Transformed(pd.DataFrame())
     
     # Renombrar 'end' a 'end_date'
-    for item in data:
-        if 'end' in item:
-            item['end_date'] = item.pop('end')
-    
-    expected_keys = ['id', 'start', 'end_date', 'charge_hour', 'worked_hour', 'analysis', 'reopening', 'starttime', 'endtime', 'analysistime']
-    return transform_generic(
+    df, rejects = transform_generic(
         data,
-        expected_keys=expected_keys,
+        "showTicketsByStatus",
+        rename_mapping={'end': 'end_date'},
         date_columns=['start', 'end_date', 'analysis', 'reopening'],
         timestamp_columns=['starttime', 'endtime', 'analysistime'],
         numeric_columns=['charge_hour', 'worked_hour']
     )
+    if df.empty:
+        return Transformed(df, rejects)
+    return Transformed(add_sla_columns(df), rejects)
 
+@instrument('transform')
 def transform_tickets_per_period(data):
     if not data:
-        return pd.DataFrame()
+        return Transformed(pd.DataFrame())
     
     # Renombrar 'end' a 'end_date'
-    for item in data:
-        if 'end' in item:
-            item['end_date'] = item.pop('end')
-    
-    essential_keys = ['id', 'start', 'end_date', 'charge_hour', 'worked_hour']
-    if not validate_data(data, essential_keys):
-        logger.error("❌ Datos de tickets por período inválidos (faltan claves esenciales).")
-        return pd.DataFrame()
-    
     return transform_generic(
         data,
-        expected_keys=essential_keys + ['analysis', 'reopening', 'starttime', 'endtime', 'analysistime'],
+        "showTicketsPerPeriod",
+        rename_mapping={'end': 'end_date'},
         date_columns=['start', 'end_date', 'analysis', 'reopening'],
         timestamp_columns=['starttime', 'endtime', 'analysistime'],
         numeric_columns=['charge_hour', 'worked_hour']
     )
 
+@instrument('transform')
 def transform_opened_closed_monthly(data):
-    expected_keys = ['month', 'year', 'opened', 'closed']
-    if not validate_data(data, expected_keys):
-        logger.error("❌ Datos abiertos vs cerrados mensuales inválidos.")
-        return pd.DataFrame()
-    
-    df = pd.DataFrame(data)
-    df = convert_numeric_columns(df, ['month', 'year', 'opened', 'closed'])
-    return df
+    return transform_generic(
+        data,
+        "openedVersusClosedMonthly",
+        numeric_columns=['month', 'year', 'opened', 'closed']
+    )
 
+@instrument('transform')
 def transform_tickets_by_hour(data):
-    expected_keys = ['hour', 'amount', 'percentage']
-    if not validate_data(data, expected_keys):
-        logger.error("❌ Datos de tickets por hora inválidos.")
-        return pd.DataFrame()
-    
-    df = pd.DataFrame(data)
-    df = convert_numeric_columns(df, ['hour', 'amount', 'percentage'])
-    return df
+    return transform_generic(
+        data,
+        "ticketsByOpeningTime",
+        numeric_columns=['hour', 'amount', 'percentage']
+    )
 
+@instrument('transform')
 def transform_activities_hours_by_department(data):
-    if not validate_activities_hours_data(data):
-        logger.error("❌ Datos de actividades por departamento inválidos.")
-        return pd.DataFrame()
-    
-    df = pd.DataFrame(data)
+    df, rejects = validate_records(data, "activitiesHoursByDepartment")
+    if df.empty:
+        return Transformed(pd.DataFrame(), rejects)
 
     # Convertir HH:MM a minutos
-    def time_to_minutes(time_str):
-        try:
-            hours, minutes = map(int, time_str.split(':'))
-            return hours * 60 + minutes
-        except:
-            return None
-    
-    df['worked_minutes'] = df['worked_hour'].apply(time_to_minutes)
-    df['charge_minutes'] = df['charge_hour'].apply(time_to_minutes)
-
-    df = df.rename(columns={
-        'department': 'department',
-        'worked_minutes': 'worked_minutes',
-        'charge_minutes': 'charge_minutes'
-    })
+    df['worked_minutes'] = parse_duration_minutes(df['worked_hour'])
+    df['charge_minutes'] = parse_duration_minutes(df['charge_hour'])
+    df = apply_dtypes(df, "activitiesHoursByDepartment")
 
     # Seleccionar solo las columnas necesarias
     df = df[['department', 'worked_minutes', 'charge_minutes']]
 
-    return df
+    return Transformed(df, rejects)
 
+@instrument('transform')
 def transform_monthly_satisfaction_average(data):
     """
     Transforma los datos de satisfacción mensual en un DataFrame de Pandas.
     """
-    expected_keys = ['month', 'year', 'month_year', 'evaluation']
-    
-    if not validate_data(data, expected_keys):
-        logger.error("❌ Datos de satisfacción mensual inválidos.")
-        return pd.DataFrame()
-    
-    df = pd.DataFrame(data)
-    df = convert_numeric_columns(df, ['month', 'year', 'evaluation'])
-    return df
+    return transform_generic(
+        data,
+        "monthlySatisfactionAverage",
+        numeric_columns=['month', 'year', 'evaluation']
+    )
 
 # ---- NUEVA TRANSFORMACIÓN PARA TICKET ACTIVITIES ----
+@instrument('transform')
 def transform_ticket_activities(data):
     """
     Transforma los datos obtenidos desde el endpoint listTicketsActivities a un DataFrame.
@@ -198,20 +286,9 @@ def transform_ticket_activities(data):
       "id_ticket": "2052"
     }
     """
-    # Si data es un dict único, lo convertimos a lista para que DataFrame lo procese
-    if isinstance(data, dict):
-        data = [data]
-
-    expected_keys = [
-        "activity", "description", "id", "ticket", "agent",
-        "typeofactivity", "start", "end", "charge_hour", "worked_hour",
-        "parts", "id_ticket"
-    ]
-    if not validate_data(data, expected_keys):
-        logger.error("❌ Datos de ticket activities inválidos.")
-        return pd.DataFrame()
-
-    df = pd.DataFrame(data)
+    df, rejects = validate_records(data, "listTicketsActivities")
+    if df.empty:
+        return Transformed(pd.DataFrame(), rejects)
 
     # Renombrar 'id' a 'activity_id', 'start' a 'start_date' y 'end' a 'end_date'
     df.rename(columns={'id': 'activity_id', 'start': 'start_date', 'end': 'end_date'}, inplace=True)
@@ -219,79 +296,47 @@ def transform_ticket_activities(data):
     # Convertir columnas de fecha (dd/mm/yyyy)
     df = convert_date_columns(df, ['start_date', 'end_date'], date_format='%d/%m/%Y')
 
-    # Convertir columnas de hora (HH:MM) a tipo time, y calcular minutos
-    def parse_time(time_str):
-        try:
-            return pd.to_datetime(time_str, format='%H:%M').time()
-        except:
-            return None
-    
-    df['charge_hour'] = df['charge_hour'].apply(parse_time)
-    df['worked_hour'] = df['worked_hour'].apply(parse_time)
+    # Calcular minutos desde el texto HH:MM (admite >= 24 h) y convertir las horas a tipo time
+    df['charge_minutes'] = parse_duration_minutes(df['charge_hour'])
+    df['worked_minutes'] = parse_duration_minutes(df['worked_hour'])
 
-    df['charge_minutes'] = df['charge_hour'].apply(lambda t: t.hour * 60 + t.minute if t else None)
-    df['worked_minutes'] = df['worked_hour'].apply(lambda t: t.hour * 60 + t.minute if t else None)
+    df['charge_hour'] = parse_time_of_day(df['charge_hour'])
+    df['worked_hour'] = parse_time_of_day(df['worked_hour'])
 
-    return df
+    df = apply_dtypes(df, "listTicketsActivities")
+    return Transformed(df, rejects)
 
 # etl_script/transformations.py
 
+@instrument('transform')
 def transform_activities_hours_to_charge(data):
     """
     Transforma los datos obtenidos desde el endpoint activitiesHoursToCharge a un DataFrame.
     """
-    # 1) Validar que sea una lista (o convertir dict a lista)
-    if isinstance(data, dict):
-        data = [data]
-
-    # 2) Definir las claves esperadas
-    expected_keys = [
-        "id_ticket", "location_id", "ticket", "activity", "description",
-        "start", "end", "parts", "start_time", "end_time", "contract", "agent",
-        "location", "typeofactivity", "requester", "cost", "charge_hour"
-    ]
-
-    # 3) Validar que existan esas claves en cada item
-    if not validate_data(data, expected_keys):
-        logger.error("❌ Datos de 'activitiesHoursToCharge' inválidos.")
-        return pd.DataFrame()
-
-    # 4) Pasar a DataFrame
-    df = pd.DataFrame(data)
-
-    # 5) Renombrar columnas 'start' y 'end' -> 'start_date', 'end_date' 
+    # 1) Validar el lote contra el esquema (los registros inválidos quedan como rechazos)
+    df, rejects = validate_records(data, "activitiesHoursToCharge")
+    if df.empty:
+        return Transformed(pd.DataFrame(), rejects)
+
+    # 2) Renombrar columnas 'start' y 'end' -> 'start_date', 'end_date' 
     df.rename(columns={
         'start': 'start_date',
         'end': 'end_date'
     }, inplace=True)
 
-    # 6) Convertir columnas de fecha (formato dd/mm/yyyy)
+    # 3) Convertir columnas de fecha (formato dd/mm/yyyy)
     df = convert_date_columns(df, ['start_date', 'end_date'], date_format='%d/%m/%Y')
 
-    # 7) Parsear 'start_time' y 'end_time' como hora (HH:MM)
-    def parse_time(time_str):
-        try:
-            return pd.to_datetime(time_str, format='%H:%M').time()
-        except:
-            return None
+    # 4) Parsear 'start_time' y 'end_time' como hora (HH:MM)
+    df['start_time'] = parse_time_of_day(df['start_time'])
+    df['end_time'] = parse_time_of_day(df['end_time'])
 
-    df['start_time'] = df['start_time'].apply(parse_time)
-    df['end_time'] = df['end_time'].apply(parse_time)
-
-    # 8) Convertir 'cost' a numérico
+    # 5) Convertir 'cost' a numérico
     df['cost'] = pd.to_numeric(df['cost'], errors='coerce')
 
-    # 9) Convertir 'charge_hour' (HH:MM) y calcular 'charge_minutes'
-    def time_to_minutes(time_str):
-        if not time_str:
-            return None
-        try:
-            hh, mm = map(int, time_str.split(':'))
-            return hh * 60 + mm
-        except:
-            return None
-
-    df['charge_minutes'] = df['charge_hour'].apply(time_to_minutes)
+    # 6) Convertir 'charge_hour' (HH:MM) y calcular 'charge_minutes'
+    df['charge_minutes'] = parse_duration_minutes(df['charge_hour'])
 
-    # 10) Retornar DataFrame con las columnas relevantes
-    return df
+    # 7) Dtypes compactos y retornar DataFrame con las columnas relevantes
+    df = apply_dtypes(df, "activitiesHoursToCharge")
+    return Transformed(df, rejects)
@@ -0,0 +1,69 @@
+# tests/conftest.py
+"""
+Fixtures comunes de las pruebas.
+
+Las pruebas que usan PostgreSQL necesitan ETL_TEST_DATABASE_URI (p.ej.
+postgresql+psycopg2://postgres@localhost/etl_test) y se omiten si no está definida.
+Cada prueba trabaja en un esquema propio que se borra al terminar, así que se puede
+usar una base compartida. La API se reemplaza por benchmarks.stub_server.
+"""
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from benchmarks.stub_server import start_stub_server
+from etl_script import changes, config, resilience
+from etl_script.api_client import close_session
+
+@pytest.fixture
+def settings(monkeypatch):
+    """
+    Define variables de configuración para la prueba: settings(NOMBRE=valor, ...).
+    """
+    def apply(**values):
+        for name, value in values.items():
+            monkeypatch.setenv(name, str(value))
+        config.reset_settings()
+        resilience.reset()
+        close_session()
+
+    yield apply
+    monkeypatch.undo()
+    config.reset_settings()
+    resilience.reset()
+    close_session()
+
+@pytest.fixture
+def engine(settings):
+    uri = os.environ.get('ETL_TEST_DATABASE_URI')
+    if not uri:
+        pytest.skip("ETL_TEST_DATABASE_URI no está definida")
+    schema = f"etl_test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(uri)
+    with admin.begin() as conn:
+        conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    engine = create_engine(uri, connect_args={"options": f"-csearch_path={schema}"})
+    changes.reset()
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+        admin.dispose()
+
+@pytest.fixture
+def stub_api(settings, tmp_path):
+    """
+    API local sin caché, límite de solicitudes ni esperas entre reintentos.
+    Devuelve el StubState del servidor (payloads, set_outage, ...).
+    """
+    server, base_url = start_stub_server()
+    settings(BASE_URL=base_url, API_KEY="test", HTTP_RATE_LIMIT=0, HTTP_RETRY_WAIT_MIN=0,
+             HTTP_RETRY_WAIT_MAX=0, CACHE_TTLS="", CACHE_DIR=tmp_path / "cache")
+    try:
+        yield server.state
+    finally:
+        server.shutdown()
@@ -0,0 +1,12 @@
+# tests/test_api_client.py
+from etl_script.api_client import ENDPOINTS, fetch_many
+
+def test_fetch_many_keeps_connections_within_the_pool(settings, stub_api):
+    settings(HTTP_MAX_CONCURRENCY=3, HTTP_POOL_SIZE=3)
+
+    for _ in range(3):
+        assert len(fetch_many(ENDPOINTS)) == len(ENDPOINTS)
+
+    assert stub_api.requests == 3 * len(ENDPOINTS)
+    assert stub_api.max_active_connections <= 3
+    assert stub_api.connections <= 3
@@ -0,0 +1,52 @@
+# tests/test_daemon.py
+import threading
+import time
+
+from etl_script.daemon import Scheduler
+
+def _jobs(**runs):
+    return {name: {"run": run, "depends_on": []} for name, run in runs.items()}
+
+def _serve(scheduler):
+    thread = threading.Thread(target=scheduler.run_forever, daemon=True)
+    thread.start()
+    return thread
+
+def test_failing_job_backs_off(engine, settings):
+    settings(DAEMON_JITTER=0)
+
+    def broken(engine):
+        raise RuntimeError("API caída")
+
+    scheduler = Scheduler(engine, {"broken": 10}, jobs=_jobs(broken=broken))
+    results = scheduler.run_job("broken", {"broken"})
+    delay = scheduler.next_run["broken"] - time.monotonic()
+
+    assert results == {"broken": "failed"}
+    assert scheduler.failures["broken"] == 1
+    assert 15 < delay <= 20
+
+def test_slow_job_does_not_delay_others(engine, settings):
+    settings(DAEMON_JITTER=0)
+    release = threading.Event()
+    fast_runs = []
+
+    def slow(engine):
+        release.wait(10)
+
+    def fast(engine):
+        fast_runs.append(time.monotonic())
+
+    scheduler = Scheduler(engine, {"slow": 60, "fast": 0.05}, jobs=_jobs(slow=slow, fast=fast))
+    thread = _serve(scheduler)
+    try:
+        deadline = time.monotonic() + 5
+        while len(fast_runs) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert len(fast_runs) >= 3
+        assert "slow" in scheduler.busy()
+    finally:
+        release.set()
+        scheduler.stop()
+        thread.join(10)
+    assert not thread.is_alive()
@@ -0,0 +1,117 @@
+# tests/test_loader.py
+import uuid
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from benchmarks.payloads import records
+from etl_script.loader import replace_table
+from etl_script.main import run_jobs
+
+@pytest.fixture
+def reader_role(engine):
+    role = f"etl_test_reader_{uuid.uuid4().hex[:8]}"
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE ROLE "{role}" NOLOGIN'))
+    yield role
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP OWNED BY "{role}"'))
+        conn.execute(text(f'DROP ROLE "{role}"'))
+
+def _frame(values):
+    return pd.DataFrame({"status": values, "description": [f"estado {value}" for value in values]})
+
+def test_swap_keeps_privileges_owner_and_comment(engine, reader_role):
+    replace_table(_frame([1, 2]), "ticket_status", engine, strategy='swap')
+    with engine.begin() as conn:
+        conn.execute(text(f'GRANT SELECT ON ticket_status TO "{reader_role}"'))
+        conn.execute(text(f'GRANT UPDATE (description) ON ticket_status TO "{reader_role}"'))
+        conn.execute(text("COMMENT ON TABLE ticket_status IS 'Estados de ticket'"))
+        oid = conn.execute(text("SELECT 'ticket_status'::regclass::oid")).scalar()
+
+    assert replace_table(_frame([1, 2, 3]), "ticket_status", engine, strategy='swap')
+
+    with engine.connect() as conn:
+        # Otra tabla (otro oid): el swap ocurrió y no cayó a TRUNCATE
+        assert conn.execute(text("SELECT 'ticket_status'::regclass::oid")).scalar() != oid
+        assert conn.execute(text("SELECT count(*) FROM ticket_status")).scalar() == 3
+        assert conn.execute(
+            text("SELECT has_table_privilege(:role, 'ticket_status', 'SELECT')"), {"role": reader_role}
+        ).scalar()
+        assert conn.execute(
+            text("SELECT has_column_privilege(:role, 'ticket_status', 'description', 'UPDATE')"), {"role": reader_role}
+        ).scalar()
+        assert conn.execute(text("SELECT obj_description('ticket_status'::regclass, 'pg_class')")).scalar() == 'Estados de ticket'
+
+def test_swap_falls_back_to_truncate_with_row_security_policies(engine, reader_role):
+    replace_table(_frame([1, 2]), "ticket_status", engine, strategy='swap')
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE ticket_status ENABLE ROW LEVEL SECURITY"))
+        conn.execute(text(f'CREATE POLICY solo_abiertos ON ticket_status TO "{reader_role}" USING (status = 1)'))
+
+    assert replace_table(_frame([1, 2, 3]), "ticket_status", engine, strategy='swap')
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM ticket_status")).scalar() == 3
+        assert conn.execute(text("SELECT count(*) FROM pg_policy WHERE polrelid = 'ticket_status'::regclass")).scalar() == 1
+
+def test_upsert_keeps_rows_whose_records_were_rejected(engine, stub_api):
+    tickets = list(records("showTicketsByStatus", 3))
+    stub_api.payloads["showTicketsByStatus"] = tickets
+    assert run_jobs(engine, {"tickets_by_status"}) == {"tickets_by_status": "ok"}
+
+    # El ticket 1 sigue en la API pero esta vez llega con una fecha inválida y se rechaza
+    stub_api.payloads["showTicketsByStatus"] = [dict(tickets[0], start="31/31/2019")] + tickets[1:]
+    assert run_jobs(engine, {"tickets_by_status"}) == {"tickets_by_status": "ok"}
+
+    with engine.connect() as conn:
+        assert sorted(conn.execute(text("SELECT id FROM tickets")).scalars()) == [1, 2, 3]
+        assert conn.execute(text("SELECT count(*) FROM etl_rejects")).scalar() == 1
+
+def _periods(rows):
+    return pd.DataFrame(rows, columns=["id", "start", "ticket"]).assign(start=lambda df: pd.to_datetime(df["start"]))
+
+def test_partition_migration_keeps_indexes(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tickets_per_period (id integer PRIMARY KEY, start timestamp, ticket text)"))
+        conn.execute(text("ALTER TABLE tickets_per_period ADD CONSTRAINT tpp_id_start_key UNIQUE (id, start)"))
+        conn.execute(text("CREATE INDEX tpp_ticket_idx ON tickets_per_period (lower(ticket)) WHERE ticket IS NOT NULL"))
+        conn.execute(text("INSERT INTO tickets_per_period VALUES (1, '2024-01-05', 'a'), (2, '2024-02-05', 'b')"))
+
+    assert replace_table(_periods([(1, "2024-01-05", "a"), (2, "2024-02-05", "b")]), "tickets_per_period", engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT relkind FROM pg_class WHERE oid = 'tickets_per_period'::regclass")).scalar() == 'p'
+        indexes = dict(conn.execute(text(
+            "SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = 'tickets_per_period'::regclass"
+        )).all())
+    # La clave primaria sin la columna de partición no se admite en la tabla particionada
+    assert sorted(indexes) == ["tpp_id_start_key", "tpp_ticket_idx"]
+    assert "lower(ticket)" in indexes["tpp_ticket_idx"] and "WHERE (ticket IS NOT NULL)" in indexes["tpp_ticket_idx"]
+
+def test_partitioned_reload_clears_months_missing_from_the_load(engine):
+    replace_table(_periods([(1, "2024-01-05", "a"), (2, "2024-02-05", "b"), (3, None, "c")]), "tickets_per_period", engine)
+
+    replace_table(_periods([(1, "2024-01-05", "a"), (4, "2024-03-05", "d")]), "tickets_per_period", engine)
+
+    with engine.connect() as conn:
+        assert sorted(conn.execute(text("SELECT id FROM tickets_per_period")).scalars()) == [1, 4]
+        assert conn.execute(text('SELECT count(*) FROM "tickets_per_period_p202402"')).scalar() == 0
+
+def test_truncate_cascade_records_a_reload_of_referencing_tables(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE ticket_status (status integer PRIMARY KEY, description text)"))
+        conn.execute(text("CREATE TABLE tickets (id integer PRIMARY KEY, status integer REFERENCES ticket_status)"))
+        conn.execute(text("INSERT INTO ticket_status VALUES (1, 'estado 1')"))
+        conn.execute(text("INSERT INTO tickets VALUES (10, 1)"))
+
+    assert replace_table(_frame([1, 2]), "ticket_status", engine, cascade=True)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM tickets")).scalar() == 0
+        assert [tuple(row) for row in conn.execute(text("SELECT table_name, op FROM etl_changes"))] == [("tickets", "reload")]
+        assert conn.execute(text(
+            "SELECT count(*) FROM etl_dirty_ranges WHERE table_name = 'tickets' AND range_start IS NULL"
+        )).scalar() == 1
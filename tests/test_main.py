@@ -0,0 +1,33 @@
+# tests/test_main.py
+from sqlalchemy import text
+
+from benchmarks.payloads import records
+from etl_script.main import run_jobs
+
+SLA_JOBS = {"ticket_status", "tickets_by_status", "tickets_sla_detalle"}
+
+def test_failed_extraction_fails_the_job_and_skips_its_dependents(engine, stub_api):
+    stub_api.set_outage("listTicketStatus")
+
+    results = run_jobs(engine, SLA_JOBS)
+
+    assert results == {"ticket_status": "failed", "tickets_by_status": "skipped", "tickets_sla_detalle": "skipped"}
+    assert stub_api.endpoint_requests["showTicketsByStatus"] == 0
+
+def test_failed_load_fails_the_job(engine, stub_api):
+    stub_api.payloads["listTicketStatus"] = list(records("listTicketStatus", 10))
+    with engine.begin() as conn:
+        # Una columna de otro tipo hace fallar la carga en PostgreSQL
+        conn.execute(text("CREATE TABLE ticket_status (status integer, description text, action text)"))
+
+    results = run_jobs(engine, SLA_JOBS)
+
+    assert results["ticket_status"] == "failed"
+    assert results["tickets_by_status"] == results["tickets_sla_detalle"] == "skipped"
+
+def test_failed_ticket_stream_fails_tickets_by_status(engine, stub_api):
+    stub_api.set_outage("showTicketsByStatus")
+
+    results = run_jobs(engine, {"tickets_by_status", "tickets_sla_detalle"})
+
+    assert results == {"tickets_by_status": "failed", "tickets_sla_detalle": "skipped"}
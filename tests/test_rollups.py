@@ -0,0 +1,40 @@
+# tests/test_rollups.py
+from datetime import date
+
+from sqlalchemy import text
+
+from etl_script.loader import mark_dirty
+from etl_script.rollups import refresh_rollups
+
+def _add_activity(conn, day):
+    conn.execute(text(
+        "INSERT INTO ticket_activities (start_date, agent, typeofactivity, charge_minutes, worked_minutes) "
+        "VALUES (:day, 'ana', 'soporte', 30, 45)"
+    ), {"day": day})
+
+def _activities(conn, rollup):
+    return conn.execute(text(f"SELECT coalesce(sum(activities), 0) FROM {rollup}")).scalar()
+
+def test_refreshing_some_rollups_keeps_the_ranges_of_the_others(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE ticket_activities (start_date date, agent text, typeofactivity text, "
+            "charge_minutes integer, worked_minutes integer)"
+        ))
+        _add_activity(conn, date(2024, 1, 3))
+    refresh_rollups(engine, ["rollup_activities_agent_day", "rollup_activities_type_week"])
+
+    with engine.begin() as conn:
+        _add_activity(conn, date(2024, 1, 4))
+        mark_dirty(conn, "ticket_activities", "start_date", [(date(2024, 1, 4), date(2024, 1, 5))])
+
+    refresh_rollups(engine, ["rollup_activities_agent_day"])
+    with engine.connect() as conn:
+        assert _activities(conn, "rollup_activities_agent_day") == 2
+        assert _activities(conn, "rollup_activities_type_week") == 1
+        assert conn.execute(text("SELECT count(*) FROM etl_dirty_ranges")).scalar() == 1
+
+    refresh_rollups(engine, ["rollup_activities_type_week"])
+    with engine.connect() as conn:
+        assert _activities(conn, "rollup_activities_type_week") == 2
+        assert conn.execute(text("SELECT count(*) FROM etl_dirty_ranges")).scalar() == 0
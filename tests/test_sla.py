@@ -0,0 +1,46 @@
+# tests/test_sla.py
+from benchmarks.payloads import records
+from sqlalchemy import text
+
+from etl_script.main import run_jobs
+
+def _tickets(*expirations):
+    return [dict(ticket, slasexpirationdate=expiration)
+            for ticket, expiration in zip(records("showTicketsByStatus", len(expirations)), expirations)]
+
+def test_sla_view_follows_the_schema_and_compares_in_utc(engine, settings, stub_api):
+    settings(API_TIMEZONE="America/Santiago")
+    stub_api.payloads["showTicketsByStatus"] = _tickets("01/01/2020 10:00", "01/01/2999 10:00")
+
+    assert run_jobs(engine, {"tickets_by_status", "tickets_sla_detalle"}) == {
+        "tickets_by_status": "ok", "tickets_sla_detalle": "ok"
+    }
+
+    with engine.connect() as conn:
+        # Un TimeZone de sesión distinto no cambia el estado de la vista
+        conn.execute(text("SET TimeZone = 'Asia/Tokyo'"))
+        assert conn.execute(text("SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                                 "WHERE attrelid = 'tickets'::regclass AND attname = 'sla_expires_at'")).scalar() == 'timestamp with time zone'
+        assert conn.execute(text("SELECT sla_expires_at = '2020-01-01 13:00+00' FROM tickets ORDER BY id LIMIT 1")).scalar()
+        assert list(conn.execute(text("SELECT estado_sla FROM tickets_sla_detalle ORDER BY id")).scalars()) == [
+            "VENCIDO", "DENTRO DE SLA"
+        ]
+
+def test_naive_sla_column_is_converted_to_timestamptz(engine, settings, stub_api):
+    settings(API_TIMEZONE="America/Santiago")
+    stub_api.payloads["showTicketsByStatus"] = _tickets("01/01/2020 10:00")
+    assert run_jobs(engine, {"tickets_by_status", "tickets_sla_detalle"})["tickets_sla_detalle"] == "ok"
+    # Tabla y vista como las dejaban las versiones anteriores
+    with engine.begin() as conn:
+        conn.execute(text("DROP VIEW tickets_sla_detalle"))
+        conn.execute(text("ALTER TABLE tickets ALTER COLUMN sla_expires_at TYPE timestamp "
+                          "USING sla_expires_at AT TIME ZONE 'America/Santiago'"))
+        conn.execute(text("CREATE VIEW tickets_sla_detalle AS SELECT id, sla_expires_at FROM tickets"))
+
+    assert run_jobs(engine, {"tickets_by_status", "tickets_sla_detalle"}) == {
+        "tickets_by_status": "ok", "tickets_sla_detalle": "ok"
+    }
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT sla_expires_at = '2020-01-01 13:00+00' FROM tickets")).scalar()
+        assert conn.execute(text("SELECT estado_sla FROM tickets_sla_detalle")).scalar() == "VENCIDO"
@@ -0,0 +1,44 @@
+# tests/test_slices.py
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl_script.slices import ensure_state_table, load_slice, load_state, prune_rows, prune_state
+
+def test_rows_outside_the_slice_are_stored_as_rejects(engine):
+    ensure_state_table(engine)
+    df = pd.DataFrame({
+        "id": [1, 2, 3],
+        "start": pd.to_datetime(["2024-01-01", "2024-01-07", "2024-01-08"]),
+    })
+
+    assert load_slice(df, "tickets_per_period", engine, "tickets_per_period", "start",
+                      date(2024, 1, 1), date(2024, 1, 7))
+
+    with engine.connect() as conn:
+        assert sorted(conn.execute(text("SELECT id FROM tickets_per_period")).scalars()) == [1, 2]
+        rejects = conn.execute(text("SELECT endpoint, reason FROM etl_rejects")).fetchall()
+    assert [tuple(row) for row in rejects] == [("tickets_per_period", "range:start")]
+    assert load_state(engine, "tickets_per_period")[date(2024, 1, 1)]["rows"] == 2
+
+def test_prune_state_drops_slices_before_the_window(engine):
+    ensure_state_table(engine)
+    for slice_start, slice_end in [(date(2024, 1, 1), date(2024, 1, 7)), (date(2024, 1, 8), date(2024, 1, 14))]:
+        df = pd.DataFrame({"id": [slice_start.day], "start": [pd.Timestamp(slice_start)]})
+        load_slice(df, "tickets_per_period", engine, "tickets_per_period", "start", slice_start, slice_end)
+
+    assert prune_state(engine, "tickets_per_period", date(2024, 1, 8)) == 1
+    assert list(load_state(engine, "tickets_per_period")) == [date(2024, 1, 8)]
+
+def test_prune_rows_deletes_rows_before_the_window(engine):
+    ensure_state_table(engine)
+    for slice_start, slice_end in [(date(2024, 1, 1), date(2024, 1, 7)), (date(2024, 1, 8), date(2024, 1, 14))]:
+        df = pd.DataFrame({"id": [slice_start.day], "start": [pd.Timestamp(slice_start)]})
+        load_slice(df, "tickets_per_period", engine, "tickets_per_period", "start", slice_start, slice_end)
+
+    assert prune_rows(engine, "tickets_per_period", "start", date(2024, 1, 8)) == 1
+    assert prune_rows(engine, "tickets_per_period", "start", date(2024, 1, 8)) == 0
+
+    with engine.connect() as conn:
+        assert list(conn.execute(text("SELECT id FROM tickets_per_period")).scalars()) == [8]
@@ -0,0 +1,14 @@
+# tests/test_startup.py
+import os
+
+from benchmarks.bench_startup import BUDGET_MS, HEAVY_MODULES, SECRET_VARIABLES, measure
+
+def test_importing_main_stays_within_the_startup_budget():
+    env = {name: value for name, value in os.environ.items() if name not in SECRET_VARIABLES}
+    baseline = measure(["-c", "pass"], env)[2]
+    runs = [measure(["-c", "import etl_script.main"], env, baseline) for _ in range(3)]
+
+    heavy = sorted(name for name in runs[0][2] if name.split('.')[0] in HEAVY_MODULES)
+    assert not heavy
+    # El mejor de tres intentos: una sola corrida lenta en CI no alcanza para fallar
+    assert min(run[0] for run in runs) < BUDGET_MS
@@ -0,0 +1,49 @@
+# tests/test_transformations.py
+from datetime import time
+
+import pandas as pd
+
+from benchmarks.payloads import records
+from etl_script.schemas import Transformed
+from etl_script.transform_pool import map_batches, shutdown_pool
+from etl_script.transformations import (
+    parse_duration_minutes, parse_time_of_day, transform_activities_hours_by_department, transform_ticket_activities
+)
+
+def _batch():
+    batch = list(records("listTicketsActivities", 5))
+    batch[2] = dict(batch[2], id=None)
+    return batch
+
+def test_rejects_travel_next_to_the_frame():
+    df, rejects = transform_ticket_activities(_batch())
+
+    assert len(df) == 4
+    assert list(rejects["reason"]) == ["null:id"]
+    assert "rejects" not in df.attrs
+    assert "rejects" not in df.head(2).attrs
+
+def test_rejects_survive_the_process_pool():
+    try:
+        results = list(map_batches(transform_ticket_activities, [_batch(), _batch()], processes=1))
+    finally:
+        shutdown_pool()
+
+    assert all(isinstance(result, Transformed) for result in results)
+    assert [len(result.rejects) for result in results] == [1, 1]
+
+def test_duration_minutes_over_59_are_carried_into_hours():
+    minutes = parse_duration_minutes(["1:75", "25:30", "1:5x", None])
+
+    assert minutes.tolist() == [135, 1530, pd.NA, pd.NA]
+    # Una hora del día sí debe tener minutos 00-59
+    assert parse_time_of_day(["1:75", "01:15"]).tolist() == [None, time(1, 15)]
+
+def test_hours_by_department_uses_the_schema_dtypes():
+    df, _ = transform_activities_hours_by_department([
+        {"department": "Soporte", "worked_hour": "1:30", "charge_hour": None},
+        {"department": "Soporte", "worked_hour": "2:00", "charge_hour": "0:45"},
+    ])
+
+    assert df.dtypes.astype(str).to_dict() == {"department": "category", "worked_minutes": "Int32", "charge_minutes": "Int32"}
+    assert df["worked_minutes"].tolist() == [90, 120]